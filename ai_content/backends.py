@@ -0,0 +1,189 @@
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import openai
+import requests
+from requests.adapters import HTTPAdapter
+import ai_content.ai_config as ai_config
+
+# Which backend CommentSmellAI talks to: "azure" (default) or "local", an
+# OpenAI-compatible server such as ai_content/standin_server.py.
+LLM_BACKEND = getattr(ai_config, "LLM_BACKEND", "azure")
+LOCAL_LLM_URL = getattr(ai_config, "LOCAL_LLM_URL", "http://127.0.0.1:8089/v1")
+LOCAL_LLM_MODEL = getattr(ai_config, "LOCAL_LLM_MODEL", "standin")
+REQUEST_TIMEOUT_SECONDS = getattr(ai_config, "REQUEST_TIMEOUT_SECONDS", 30)
+# Connection pool size of the shared HTTP session (detection + speculative repair threads).
+HTTP_POOL_SIZE = getattr(ai_config, "HTTP_POOL_SIZE", 16)
+
+
+class BackendError(Exception):
+    """A model call failed and should not be retried."""
+
+
+class RetryableBackendError(BackendError):
+    """
+    A model call was throttled or failed transiently and may be retried.
+    `retry_after` is the wait in seconds the server asked for, if any.
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """Seconds to wait for a Retry-After header (delay seconds or an HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def build_http_session():
+    """
+    Create the HTTP session shared by every model call in this process.
+    Reusing one pooled session keeps TLS connections to the endpoint alive
+    between calls instead of reconnecting per thread.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class ChatBackend(ABC):
+    """
+    Interface of a chat-completion backend.
+
+    chat() returns a dict with keys:
+        content (str), prompt_tokens (int), completion_tokens (int)
+    and raises RetryableBackendError / BackendError on failure.
+    """
+    name = None
+    deployment = None
+    url = None
+
+    def __init__(self, session=None):
+        self.session = session
+
+    @abstractmethod
+    def chat(self, messages, max_tokens, temperature):
+        """Send one chat-completion request (see the class docstring)."""
+
+    def warm(self, timeout=5):
+        """
+        Open a connection to the endpoint so the first model call does not pay
+        for DNS and the TLS handshake. Failures are only logged.
+        """
+        if not self.url or self.session is None:
+            return
+        try:
+            self.session.head(self.url, timeout=timeout)
+        except requests.RequestException as e:
+            print("Could not pre-warm AI endpoint connection:", e)
+
+
+class AzureOpenAIBackend(ChatBackend):
+    """Azure OpenAI deployment configured through ai_config (openai 0.28 SDK)."""
+    name = "azure"
+
+    def __init__(self, session=None):
+        super().__init__(session)
+        openai.api_base = ai_config.GPT_40_MINI_ENDPOINT
+        openai.api_key = ai_config.GPT_40_MINI_API_KEY
+        openai.api_version = "2024-12-01-preview"
+        openai.api_type = "azure"
+        if session is not None:
+            openai.requestssession = session
+        self.deployment = ai_config.GPT_40_MINI_DEPLOYMENT
+        self.url = ai_config.GPT_40_MINI_ENDPOINT
+        if not self.deployment:
+            raise ValueError("GPT_40_MINI_DEPLOYMENT is not set. Check your configuration.")
+
+    def chat(self, messages, max_tokens, temperature):
+        try:
+            response = openai.ChatCompletion.create(
+                deployment_id=self.deployment,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                request_timeout=REQUEST_TIMEOUT_SECONDS,
+            )
+        except (openai.error.RateLimitError,
+                openai.error.ServiceUnavailableError,
+                openai.error.APIConnectionError,
+                openai.error.Timeout,
+                openai.error.APIError) as e:
+            headers = getattr(e, "headers", None) or {}
+            raise RetryableBackendError(
+                f"{e.__class__.__name__}: {e}", parse_retry_after(headers.get("Retry-After"))
+            ) from e
+        except openai.error.OpenAIError as e:
+            raise BackendError(f"{e.__class__.__name__}: {e}") from e
+        usage = response.get("usage") or {}
+        return {
+            "content": response["choices"][0]["message"]["content"],
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "completion_tokens": usage.get("completion_tokens", 0),
+        }
+
+
+class OpenAICompatibleBackend(ChatBackend):
+    """Any server implementing POST {base_url}/chat/completions, e.g. the local stand-in."""
+    name = "local"
+
+    def __init__(self, base_url=LOCAL_LLM_URL, model=LOCAL_LLM_MODEL, session=None):
+        super().__init__(session or build_http_session())
+        self.url = base_url.rstrip("/")
+        self.deployment = model
+
+    def chat(self, messages, max_tokens, temperature):
+        try:
+            response = self.session.post(
+                f"{self.url}/chat/completions",
+                json={
+                    "model": self.deployment,
+                    "messages": messages,
+                    "max_tokens": max_tokens,
+                    "temperature": temperature,
+                },
+                timeout=REQUEST_TIMEOUT_SECONDS,
+            )
+        except requests.RequestException as e:
+            raise RetryableBackendError(f"{e.__class__.__name__}: {e}") from e
+        if response.status_code == 429 or response.status_code >= 500:
+            raise RetryableBackendError(
+                f"HTTP {response.status_code}: {response.text[:200]}",
+                parse_retry_after(response.headers.get("Retry-After"))
+            )
+        if response.status_code != 200:
+            raise BackendError(f"HTTP {response.status_code}: {response.text[:200]}")
+        body = response.json()
+        usage = body.get("usage") or {}
+        return {
+            "content": body["choices"][0]["message"]["content"],
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "completion_tokens": usage.get("completion_tokens", 0),
+        }
+
+
+def create_backend(name=None, session=None):
+    """
+    Build the backend selected by `name` (default: ai_config.LLM_BACKEND).
+    """
+    name = name or LLM_BACKEND
+    if name == "azure":
+        return AzureOpenAIBackend(session=session)
+    if name == "local":
+        return OpenAICompatibleBackend(session=session)
+    raise ValueError(f"Unknown LLM backend: {name!r} (expected 'azure' or 'local')")
@@ -0,0 +1,99 @@
+"""
+Throughput benchmark of the detection/repair pipeline against any backend.
+
+Usage (fully offline, with an in-process stand-in server):
+    python -m ai_content.loadtest --start-standin --comments 500 --concurrency 16 \
+        --latency lognormal --latency-ms 300 --rate-limit-rate 0.05
+
+Against an already running server or the real deployment:
+    python -m ai_content.loadtest --backend local --url http://127.0.0.1:8089/v1
+    python -m ai_content.loadtest --backend azure --comments 20
+"""
+import argparse
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from ai_content.backends import create_backend, OpenAICompatibleBackend
+from ai_content.main import CommentSmellAI
+import ai_content.standin_server as standin_server
+import ai_content.usage as usage
+
+SAMPLE_COMMENTS = [
+    "increment the counter",
+    "TODO handle this",
+    "Returns the user id for the given session token, or null if expired.",
+    "--------------------------------",
+    "return total;",
+    "do stuff",
+    "See the retry loop in Scheduler.java for details.",
+    "This method opens the file, reads every line, strips whitespace, parses numbers and sums them.",
+]
+SAMPLE_CODE = "int total = 0;\nfor (int i = 0; i < values.length; i++) {\n    total += values[i];\n}\nreturn total;"
+
+
+def run_one(ai, index):
+    comment = f"{random.choice(SAMPLE_COMMENTS)} ({index})"
+    start = time.perf_counter()
+    label = ai.detect_comment_smell(SAMPLE_CODE, comment)
+    ai.repair_comment(SAMPLE_CODE, comment, label)
+    return time.perf_counter() - start
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the comment smell pipeline.")
+    parser.add_argument("--backend", choices=["azure", "local"], default=None)
+    parser.add_argument("--url", default=None, help="base URL of an OpenAI-compatible server")
+    parser.add_argument("--start-standin", action="store_true", help="run a stand-in server in-process")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--comments", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--record-usage", action="store_true", help="write calls to the llm_calls table")
+    standin_server.add_arguments(parser)
+    args = parser.parse_args()
+    usage.set_recording_enabled(args.record_usage)
+
+    server = None
+    if args.start_standin:
+        server = standin_server.start_server(standin_server.config_from_args(args), port=args.port)
+        args.url = args.url or f"http://127.0.0.1:{args.port}/v1"
+
+    if args.url:
+        backend = OpenAICompatibleBackend(base_url=args.url)
+    else:
+        backend = create_backend(args.backend)
+    ai = CommentSmellAI(backend)
+
+    latencies, failures = [], 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [executor.submit(run_one, ai, i) for i in range(args.comments)]
+        for future in as_completed(futures):
+            try:
+                latencies.append(future.result())
+            except Exception as e:
+                failures += 1
+                print("Comment failed:", e)
+    elapsed = time.perf_counter() - start
+
+    print(f"Backend: {backend.name} ({backend.url})")
+    print(f"Comments: {args.comments}  concurrency: {args.concurrency}  failures: {failures}")
+    print(f"Elapsed: {elapsed:.2f}s  throughput: {len(latencies) / elapsed:.1f} comments/s")
+    if latencies:
+        print("Per-comment latency (ms): p50 {:.0f}  p95 {:.0f}  p99 {:.0f}  mean {:.0f}".format(
+            percentile(latencies, 0.50) * 1000,
+            percentile(latencies, 0.95) * 1000,
+            percentile(latencies, 0.99) * 1000,
+            statistics.mean(latencies) * 1000,
+        ))
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,32 @@
 import os
-import openai
+import time
+import threading
 import ai_content.ai_config as ai_config
+from ai_content.backends import create_backend, build_http_session, RetryableBackendError
+from ai_content.usage import record_llm_call
+
+# Retries for throttled or transiently failing calls: after the Retry-After
+# the server sent, otherwise with exponential backoff.
+MAX_RETRIES = getattr(ai_config, "MAX_RETRIES", 3)
+RETRY_BACKOFF_SECONDS = getattr(ai_config, "RETRY_BACKOFF_SECONDS", 1.0)
+
+_ai_processor = None
+_ai_processor_lock = threading.Lock()
 
 class CommentSmellAI:
-    def __init__(self):
+    def __init__(self, backend=None):
         """
         How to Use This Module
         from comment_smell_ai import CommentSmellAI
         ai_processor = CommentSmellAI()
         smell_label = ai_processor.detect_comment_smell(code_segment, comment_text)
         repair_suggestion = ai_processor.repair_comment(code_segment, comment_text, smell_label)
+
+        `backend` defaults to the one selected by ai_config.LLM_BACKEND
+        (see ai_content/backends.py).
         """
-        openai.api_base = ai_config.GPT_40_MINI_ENDPOINT
-        openai.api_key = ai_config.GPT_40_MINI_API_KEY
-        openai.api_version = "2024-12-01-preview"
-        openai.api_type = "azure"
-        self.deployment_id = ai_config.GPT_40_MINI_DEPLOYMENT
-        if not self.deployment_id:
-            raise ValueError("GPT_40_MINI_DEPLOYMENT is not set. Check your configuration.")
+        self.backend = backend or create_backend()
+        self.deployment_id = self.backend.deployment
 
         # Taxonomy for classifying comment smells.
         self.taxonomy = """
@@ -33,18 +42,45 @@ Vague: Comments that lack clarity.
 Not a smell: Comments that are clear, concise, and useful.
         """
 
-    def get_chat_response(self, prompt, role="user", max_tokens=10):
+    def get_chat_response(self, prompt, role="user", max_tokens=10, purpose="detect"):
+        """
+        Send a prompt to the model and return the stripped reply.
+        Throttled or transiently failing calls are retried with exponential backoff.
+        Token usage, latency and retries are recorded in the llm_calls table.
+        """
         system_message = "Code comments should be clear, concise, and useful for maintainability."
-        response = openai.ChatCompletion.create(
-            deployment_id=self.deployment_id,
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": role, "content": prompt}
-            ],
-            temperature=0.2,
-            max_tokens=max_tokens
+        retries = 0
+        start = time.perf_counter()
+        while True:
+            try:
+                response = self.backend.chat(
+                    messages=[
+                        {"role": "system", "content": system_message},
+                        {"role": role, "content": prompt}
+                    ],
+                    temperature=0.2,
+                    max_tokens=max_tokens
+                )
+                break
+            except RetryableBackendError as e:
+                if retries >= MAX_RETRIES:
+                    raise
+                delay = e.retry_after
+                if delay is None:
+                    delay = RETRY_BACKOFF_SECONDS * (2 ** retries)
+                print(f"Model call failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                retries += 1
+
+        record_llm_call(
+            purpose=purpose,
+            deployment=self.deployment_id,
+            prompt_tokens=response["prompt_tokens"],
+            completion_tokens=response["completion_tokens"],
+            latency_ms=(time.perf_counter() - start) * 1000,
+            retries=retries,
         )
-        return response["choices"][0]["message"]["content"].strip()
+        return response["content"].strip()
 
     def detect_comment_smell(self, code, comment):
         """
@@ -72,7 +108,7 @@ Code segment:
 Comment:
 '''{comment}'''
 """
-        return self.get_chat_response(prompt, role="user")
+        return self.get_chat_response(prompt, role="user", purpose="detect")
 
     def repair_comment(self, code, comment, label, lang="java"):
         """
@@ -106,7 +142,7 @@ Original comment:
 '''{comment}'''
 """
         # Increase max_tokens as needed for repair suggestions.
-        raw = self.get_chat_response(prompt, role="user", max_tokens=100)
+        raw = self.get_chat_response(prompt, role="user", max_tokens=100, purpose="repair")
         clean = raw.strip("`'\"")
 
         # 2) Remove one leading comment marker if present
@@ -126,7 +162,7 @@ Original comment:
 
         return suggestion
 
-    def repair_comment_double_iteration(self, code, comment, label, lang="java"):
+    def repair_comment_double_iteration(self, code, comment, label, lang="java", first_suggestion=None):
         """
         For vague and misleading and too much info, we can
         Perform a two-pass repair: first generate an initial suggestion,
@@ -137,6 +173,8 @@ Original comment:
             comment (str): The original comment text.
             label (str): The detected smell label.
             lang (str): Language marker for stripping comment prefixes.
+            first_suggestion (str): Optional first-pass suggestion that was
+                already generated (e.g. speculatively) for this label.
 
         Returns:
             A string containing the twice-refined comment suggestion.
@@ -146,7 +184,10 @@ Original comment:
             return comment
 
         # First pass repair
-        suggestion = self.repair_comment(code, comment, label, lang)
+        if first_suggestion is None:
+            suggestion = self.repair_comment(code, comment, label, lang)
+        else:
+            suggestion = first_suggestion
         # If nothing came back (e.g. removal), return empty
         if not suggestion:
             return ""
@@ -161,4 +202,20 @@ Original comment:
             second_label,
             lang
         )
-        return second_suggestion
\ No newline at end of file
+        return second_suggestion
+
+
+
+def get_ai_processor():
+    """
+    Return the process-wide CommentSmellAI, creating it (and warming its HTTP
+    session) on first use. Safe to call from multiple threads.
+    """
+    global _ai_processor
+    if _ai_processor is None:
+        with _ai_processor_lock:
+            if _ai_processor is None:
+                processor = CommentSmellAI(create_backend(session=build_http_session()))
+                processor.backend.warm()
+                _ai_processor = processor
+    return _ai_processor
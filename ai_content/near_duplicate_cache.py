@@ -0,0 +1,240 @@
+import re
+import hashlib
+import threading
+import config
+import database.fingerprints as fingerprint_db
+from ai_content.usage import record_llm_call
+
+# Tunables (override in config.py).
+# Maximum Hamming distance between comment fingerprints for a label to be reused.
+# The index splits each 64-bit fingerprint into 4 bands, so distances up to 3
+# are guaranteed to be found; larger values only match near-misses that happen
+# to share a band.
+MAX_COMMENT_DISTANCE = getattr(config, "NEAR_DUP_MAX_COMMENT_DISTANCE", 3)
+# Maximum Hamming distance between the fingerprints of the code contexts.
+MAX_CODE_DISTANCE = getattr(config, "NEAR_DUP_MAX_CODE_DISTANCE", 8)
+# How many agreeing model labels a neighbor needs before its label is reused
+# (the label recorded first counts as one).
+MIN_CONFIRMATIONS = getattr(config, "NEAR_DUP_MIN_CONFIRMATIONS", 2)
+# Eviction limits for the persistent index.
+MAX_ENTRIES = getattr(config, "NEAR_DUP_MAX_ENTRIES", 50000)
+MAX_AGE_DAYS = getattr(config, "NEAR_DUP_MAX_AGE_DAYS", 90)
+# Run eviction once every N inserts.
+EVICT_EVERY = getattr(config, "NEAR_DUP_EVICT_EVERY", 100)
+ENABLED = getattr(config, "NEAR_DUP_CACHE_ENABLED", True)
+
+BITS = 64
+BAND_BITS = 16
+
+TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+|[^\sA-Za-z0-9_]")
+NUMBER_RE = re.compile(r"^\d+$")
+CODE_COMMENT_RE = re.compile(r"/\*.*?\*/|//[^\n]*|#[^\n]*", re.S)
+
+# Keywords are kept verbatim in the code fingerprint; every other identifier is
+# folded into a placeholder so that renames do not change the fingerprint.
+KEYWORDS = {
+    # Java
+    "abstract", "assert", "boolean", "break", "byte", "case", "catch", "char",
+    "class", "continue", "default", "do", "double", "else", "enum", "extends",
+    "final", "finally", "float", "for", "if", "implements", "import",
+    "instanceof", "int", "interface", "long", "new", "package", "private",
+    "protected", "public", "return", "short", "static", "super", "switch",
+    "synchronized", "this", "throw", "throws", "try", "void", "volatile",
+    "while", "null", "true", "false",
+    # Python
+    "and", "as", "async", "await", "def", "del", "elif", "except", "from",
+    "global", "in", "is", "lambda", "nonlocal", "not", "or", "pass", "raise",
+    "with", "yield", "None", "True", "False", "self",
+}
+
+
+def _to_signed(value):
+    """SQLite integers are signed 64-bit; store fingerprints in that range."""
+    return value - (1 << BITS) if value >= (1 << (BITS - 1)) else value
+
+
+def _to_unsigned(value):
+    return value + (1 << BITS) if value < 0 else value
+
+
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(features):
+    """
+    Compute a 64-bit SimHash over an iterable of (feature, weight) pairs.
+    Similar feature multisets produce fingerprints with a small Hamming distance.
+    """
+    vector = [0] * BITS
+    for feature, weight in features:
+        h = _feature_hash(feature)
+        for bit in range(BITS):
+            if h >> bit & 1:
+                vector[bit] += weight
+            else:
+                vector[bit] -= weight
+    value = 0
+    for bit in range(BITS):
+        if vector[bit] > 0:
+            value |= 1 << bit
+    return value
+
+
+def hamming_distance(a, b):
+    return bin(_to_unsigned(a) ^ _to_unsigned(b)).count("1")
+
+
+def bands_of(value):
+    """Split a 64-bit fingerprint into four 16-bit LSH bands."""
+    value = _to_unsigned(value)
+    mask = (1 << BAND_BITS) - 1
+    return tuple((value >> (i * BAND_BITS)) & mask for i in range(BITS // BAND_BITS))
+
+
+def strip_code_comments(code):
+    """Remove comments from a code segment (it contains the comment being classified)."""
+    return CODE_COMMENT_RE.sub(" ", code)
+
+
+def code_identifiers(code):
+    """
+    Map the non-keyword identifiers of a code segment to the order of their
+    first use (0 for the first identifier, 1 for the next new one, ...).
+    """
+    identifiers = {}
+    for token in TOKEN_RE.findall(code):
+        if (token[0].isalpha() or token[0] == "_") and token not in KEYWORDS:
+            identifiers.setdefault(token, len(identifiers))
+    return identifiers
+
+
+def comment_features(comment, identifiers):
+    """
+    Tokenize a comment into weighted features. Words that are identifiers in the
+    surrounding code are replaced by a placeholder numbered by where the
+    identifier first appears in the code, so "increment i" next to `i += 1`
+    and "increment j" next to `j += 1` produce the same features, but "the
+    max" and "the min" next to `max(lo, min(v, hi))` do not.
+    """
+    tokens = []
+    for token in TOKEN_RE.findall(comment):
+        if token in identifiers:
+            tokens.append(f"<id{identifiers[token]}>")
+        elif NUMBER_RE.match(token):
+            tokens.append("<num>")
+        elif token[0].isalnum() or token[0] == "_":
+            tokens.append(token.lower())
+    features = [(t, 1) for t in tokens]
+    features += [(f"{a} {b}", 2) for a, b in zip(tokens, tokens[1:])]
+    return features or [("<empty>", 1)]
+
+
+def code_features(code):
+    """Tokenize code into 3-token shingles with identifiers and literals folded."""
+    tokens = []
+    for token in TOKEN_RE.findall(code):
+        if token in KEYWORDS:
+            tokens.append(token)
+        elif token[0].isalpha() or token[0] == "_":
+            tokens.append("<id>")
+        elif NUMBER_RE.match(token):
+            tokens.append("<num>")
+        else:
+            tokens.append(token)
+    shingles = [" ".join(tokens[i:i + 3]) for i in range(max(1, len(tokens) - 2))]
+    return [(s, 1) for s in shingles if s] or [("<empty>", 1)]
+
+
+def fingerprint(code, comment):
+    """Return the signed (comment_hash, code_hash) pair for a (code, comment)."""
+    code = strip_code_comments(code)
+    identifiers = code_identifiers(code)
+    comment_hash = simhash(comment_features(comment, identifiers))
+    code_hash = simhash(code_features(code))
+    return _to_signed(comment_hash), _to_signed(code_hash)
+
+
+class NearDuplicateCache:
+    """
+    Locality-sensitive label cache over previously classified (comment, code) pairs.
+
+    How to use:
+        cache = NearDuplicateCache()
+        label = cache.lookup(code, comment)
+        if label is None:
+            label = ai_processor.detect_comment_smell(code, comment)
+            cache.record(code, comment, label)
+    """
+
+    def __init__(self,
+                 max_comment_distance=MAX_COMMENT_DISTANCE,
+                 max_code_distance=MAX_CODE_DISTANCE,
+                 min_confirmations=MIN_CONFIRMATIONS,
+                 max_entries=MAX_ENTRIES,
+                 max_age_days=MAX_AGE_DAYS,
+                 enabled=ENABLED):
+        self.max_comment_distance = max_comment_distance
+        self.max_code_distance = max_code_distance
+        self.min_confirmations = min_confirmations
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.enabled = enabled
+        self.stats = {"hits": 0, "misses": 0, "inserts": 0, "evicted": 0}
+        self._lock = threading.Lock()
+
+    def _nearest(self, comment_hash, code_hash):
+        """Return (candidate, comment_distance) for the closest stored neighbor, or (None, None)."""
+        best, best_distance = None, None
+        for candidate in fingerprint_db.find_fingerprint_candidates(bands_of(comment_hash)):
+            distance = hamming_distance(comment_hash, candidate["comment_hash"])
+            if distance > self.max_comment_distance:
+                continue
+            if hamming_distance(code_hash, candidate["code_hash"]) > self.max_code_distance:
+                continue
+            if best is None or distance < best_distance:
+                best, best_distance = candidate, distance
+        return best, best_distance
+
+    def lookup(self, code, comment):
+        """
+        Return the label of a confidently labeled near-duplicate, or None on a miss.
+        """
+        if not self.enabled:
+            return None
+        comment_hash, code_hash = fingerprint(code, comment)
+        neighbor, _ = self._nearest(comment_hash, code_hash)
+        with self._lock:
+            if neighbor is None or neighbor["confirmations"] < self.min_confirmations:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+        fingerprint_db.touch_fingerprint(neighbor["id"])
+        record_llm_call(purpose="detect", cache_hit=True)
+        return neighbor["smell_type"]
+
+    def record(self, code, comment, label):
+        """
+        Store a label produced by the model. A near-duplicate already in the index
+        is confirmed (or marked as conflicting) instead of adding a new entry.
+        """
+        if not self.enabled or not label:
+            return
+        comment_hash, code_hash = fingerprint(code, comment)
+        neighbor, _ = self._nearest(comment_hash, code_hash)
+        if neighbor is not None:
+            fingerprint_db.confirm_fingerprint(neighbor["id"], label)
+            return
+        fingerprint_db.add_fingerprint(comment_hash, code_hash, bands_of(comment_hash), label)
+        with self._lock:
+            self.stats["inserts"] += 1
+            run_eviction = self.stats["inserts"] % EVICT_EVERY == 0
+        if run_eviction:
+            self.evict()
+
+    def evict(self):
+        """Apply the size and age limits to the persistent index."""
+        deleted = fingerprint_db.evict_fingerprints(self.max_entries, self.max_age_days)
+        with self._lock:
+            self.stats["evicted"] += deleted
+        return deleted
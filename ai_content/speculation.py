@@ -0,0 +1,123 @@
+import re
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+import config
+
+# Opt-in: start repairs for likely smelly comments while detection is running.
+ENABLED = getattr(config, "SPECULATIVE_REPAIR", False)
+MAX_WORKERS = getattr(config, "SPECULATIVE_REPAIR_WORKERS", 4)
+
+# Only labels whose repair needs a model call are worth speculating on.
+SPECULATIVE_LABELS = ("Vague", "Misleading", "Too much info")
+
+VAGUE_WORDS = {
+    "stuff", "thing", "things", "something", "fix", "fixed", "hack", "handle",
+    "misc", "etc", "temp", "tmp", "whatever", "magic", "do", "this", "it",
+}
+WORD_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+CODE_LIKE_RE = re.compile(r"^(?:[a-z]+[A-Z]\w*|\w+_\w+|\w+\(\))$")
+
+
+def guess_repair_label(code, comment):
+    """
+    Cheap local heuristic used to decide whether to start a repair before the
+    model has classified the comment.
+
+    Returns:
+        One of SPECULATIVE_LABELS, or None if the comment does not look like
+        it will need a model-generated repair.
+    """
+    text = comment.strip()
+    words = WORD_RE.findall(text)
+    if len(text) > 200 or len(words) > 35 or text.count("\n") >= 3:
+        return "Too much info"
+    if not words:
+        return None
+    if text.endswith("?") or text.endswith("...") or (
+            len(words) <= 3 and any(w.lower() in VAGUE_WORDS for w in words)):
+        return "Vague"
+    # Identifier-looking words that do not appear in the code suggest the
+    # comment describes something other than what is there.
+    code_words = set(WORD_RE.findall(code))
+    for token in text.split():
+        token = token.strip(".,;:'\"`")
+        if CODE_LIKE_RE.match(token) and token.rstrip("()") not in code_words:
+            return "Misleading"
+    return None
+
+
+class SpeculativeRepairer:
+    """
+    Runs first-pass repairs concurrently with detection.
+
+    How to use:
+        speculation = speculator.start(ai_processor, code, comment, lang, enabled_smells)
+        label = ai_processor.detect_comment_smell(code, comment)
+        suggestion = speculator.resolve(speculation, label)   # None if unusable
+        # or, when no repair is needed:
+        speculator.discard(speculation)
+    """
+
+    def __init__(self, enabled=ENABLED, max_workers=MAX_WORKERS):
+        self.enabled = enabled
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self.stats = {"started": 0, "useful": 0, "wasted": 0, "cancelled": 0}
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="speculative-repair"
+                )
+            return self._executor
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def start(self, ai_processor, code, comment, lang, enabled_smells):
+        """
+        Start a speculative first-pass repair if the heuristic predicts one will
+        be needed. Returns a handle for resolve()/discard(), or None.
+        """
+        if not self.enabled:
+            return None
+        label = guess_repair_label(code, comment)
+        if label is None or label not in enabled_smells:
+            return None
+        # Run in a copy of the caller's context so usage is attributed to the same PR.
+        context = contextvars.copy_context()
+        future = self._get_executor().submit(context.run, ai_processor.repair_comment, code, comment, label, lang)
+        self._count("started")
+        return {"label": label, "future": future}
+
+    def resolve(self, speculation, label):
+        """
+        Return the speculative suggestion if it was generated for `label`,
+        otherwise discard it and return None.
+        """
+        if speculation is None:
+            return None
+        if speculation["label"] != label:
+            self.discard(speculation)
+            return None
+        try:
+            suggestion = speculation["future"].result()
+        except Exception as e:
+            print("Speculative repair failed:", e)
+            self._count("wasted")
+            return None
+        self._count("useful")
+        return suggestion
+
+    def discard(self, speculation):
+        """Drop a speculation whose result is not needed."""
+        if speculation is None:
+            return
+        if speculation["future"].cancel():
+            self._count("cancelled")
+        else:
+            self._count("wasted")
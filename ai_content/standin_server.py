@@ -0,0 +1,210 @@
+"""
+Local OpenAI-compatible stand-in for load testing without spending tokens.
+
+Usage:
+    python -m ai_content.standin_server --port 8089 --latency lognormal \
+        --latency-ms 400 --latency-jitter 0.5 --error-rate 0.01 --rate-limit-rate 0.05
+
+Serves POST /v1/chat/completions (and the Azure-style
+/openai/deployments/<name>/chat/completions path). Detection prompts get a
+deterministic label derived from the comment text; repair prompts get a
+deterministic rewrite. Point CommentSmellAI at it with
+ai_config.LLM_BACKEND = "local" and ai_config.LOCAL_LLM_URL.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LABELS = [
+    "Misleading", "Obvious", "Commented out code", "Irrelevant", "Task",
+    "Too much info", "Beautification", "Nonlocal info", "Vague", "Not a smell",
+]
+COMMENT_RE = re.compile(r"(?:Original comment|Comment):\s*'''(.*?)'''", re.S)
+
+
+class StandInConfig:
+    """Latency distribution and fault injection settings of the stand-in server."""
+
+    def __init__(self, latency="fixed", latency_ms=200.0, latency_jitter=0.25,
+                 error_rate=0.0, rate_limit_rate=0.0, retry_after=1, seed=None):
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+
+    def sample_latency(self):
+        """Return a latency in seconds drawn from the configured distribution."""
+        mean, jitter = self.latency_ms, self.latency_jitter
+        with self._lock:
+            if self.latency == "uniform":
+                value = self._random.uniform(mean * (1 - jitter), mean * (1 + jitter))
+            elif self.latency == "normal":
+                value = self._random.gauss(mean, mean * jitter)
+            elif self.latency == "lognormal":
+                # Heavy right tail, like real model latencies; median == latency_ms.
+                value = mean * self._random.lognormvariate(0, jitter)
+            else:
+                value = mean
+        return max(0.0, value) / 1000
+
+    def sample_fault(self):
+        """Return None, "rate_limit" or "error" for the next request."""
+        with self._lock:
+            self.stats["requests"] += 1
+            roll = self._random.random()
+            if roll < self.rate_limit_rate:
+                self.stats["rate_limited"] += 1
+                return "rate_limit"
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.stats["errors"] += 1
+                return "error"
+        return None
+
+
+def deterministic_label(comment):
+    """Label a comment deterministically (a few obvious rules, then a stable hash)."""
+    text = comment.strip()
+    if re.search(r"\b(TODO|FIXME|XXX)\b", text):
+        return "Task"
+    if re.fullmatch(r"[\W_]{3,}", text):
+        return "Beautification"
+    if re.search(r"[;{}]\s*$", text):
+        return "Commented out code"
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return LABELS[digest[0] % len(LABELS)]
+
+
+def deterministic_reply(messages):
+    """Build the completion text for a chat request."""
+    prompt = messages[-1]["content"] if messages else ""
+    match = COMMENT_RE.search(prompt)
+    comment = match.group(1) if match else prompt
+    if "rewrite the comment" in prompt:
+        words = comment.split()
+        return "Clarified: " + " ".join(words[:12])
+    return deterministic_label(comment)
+
+
+def make_handler(cfg):
+    class StandInHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body, headers=None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_HEAD(self):
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.split("?")[0].endswith("/chat/completions"):
+                self._send(404, {"error": {"message": "not found"}})
+                return
+
+            time.sleep(cfg.sample_latency())
+            fault = cfg.sample_fault()
+            if fault == "rate_limit":
+                self._send(429, {"error": {"message": "Rate limit reached (stand-in)", "type": "rate_limit"}},
+                           {"Retry-After": str(cfg.retry_after)})
+                return
+            if fault == "error":
+                self._send(500, {"error": {"message": "Injected server error (stand-in)", "type": "server_error"}})
+                return
+
+            messages = request.get("messages", [])
+            content = deterministic_reply(messages)
+            prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+            self._send(200, {
+                "id": "standin-" + hashlib.sha1(content.encode("utf-8")).hexdigest()[:12],
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "standin"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": max(1, len(content) // 4),
+                    "total_tokens": prompt_tokens + max(1, len(content) // 4),
+                },
+            })
+
+    return StandInHandler
+
+
+def start_server(cfg, host="127.0.0.1", port=8089):
+    """Start the stand-in in a background thread. Returns the server (call shutdown() to stop)."""
+    server = ThreadingHTTPServer((host, port), make_handler(cfg))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="llm-standin", daemon=True)
+    thread.start()
+    return server
+
+
+def add_arguments(parser):
+    parser.add_argument("--latency", choices=["fixed", "uniform", "normal", "lognormal"], default="fixed")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="mean (median for lognormal)")
+    parser.add_argument("--latency-jitter", type=float, default=0.25, help="relative spread / sigma")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of HTTP 500 responses")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of HTTP 429 responses")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def config_from_args(args):
+    return StandInConfig(
+        latency=args.latency,
+        latency_ms=args.latency_ms,
+        latency_jitter=args.latency_jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    cfg = config_from_args(args)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(cfg))
+    print(f"Stand-in LLM listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("Stand-in stats:", cfg.stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import atexit
+import contextvars
+import queue
+import threading
+from contextlib import contextmanager
+import config
+import database.llm_calls as llm_calls_db
+from ai_content import speculation
+
+# Rows are written in batches by a background thread.
+FLUSH_INTERVAL_SECONDS = getattr(config, "LLM_USAGE_FLUSH_INTERVAL", 2.0)
+BATCH_SIZE = getattr(config, "LLM_USAGE_BATCH_SIZE", 200)
+# USD per 1K tokens, used for the cost estimates on the dashboard.
+PROMPT_COST_PER_1K = getattr(config, "LLM_PROMPT_COST_PER_1K", 0.00015)
+COMPLETION_COST_PER_1K = getattr(config, "LLM_COMPLETION_COST_PER_1K", 0.0006)
+RECORDING_ENABLED = getattr(config, "LLM_USAGE_RECORDING", True)
+
+# Which repo / PR / settings the model calls of the current event belong to.
+_usage_context = contextvars.ContextVar("llm_usage_context", default={})
+# Model calls (cache hits excluded) made so far in the current usage_context.
+_call_count = contextvars.ContextVar("llm_call_count", default=None)
+_call_count_lock = threading.Lock()
+
+
+@contextmanager
+def usage_context(repo_internal_id, pr_number, double_iteration=False):
+    """
+    Attribute every LLM call made inside the `with` block to a repo and PR.
+    Threads started with contextvars.copy_context() inherit it.
+    """
+    token = _usage_context.set({
+        "repo_internal_id": repo_internal_id,
+        "pr_number": pr_number,
+        "double_iteration": bool(double_iteration),
+    })
+    count_token = _call_count.set([0])
+    try:
+        yield
+    finally:
+        _call_count.reset(count_token)
+        _usage_context.reset(token)
+
+
+def llm_calls_in_context():
+    """Number of model calls (not cache hits) made so far in the current usage_context."""
+    count = _call_count.get()
+    return count[0] if count is not None else 0
+
+
+def max_llm_calls_per_comment(double_iteration, speculative=None):
+    """
+    The most model calls the analysis of one comment can make: the
+    detection, a speculative repair (with SPECULATIVE_REPAIR) that may be
+    for another label, the repair and, with double iteration, a second
+    detection and repair. The per-event budget reserves this much before
+    each comment. A speculative repair that is cancelled in time makes no
+    call and is not counted by llm_calls_in_context, but it is still part
+    of the reservation, so the last comments of an event can be left out
+    although they would have fit.
+    """
+    if speculative is None:
+        speculative = speculation.ENABLED
+    return 2 + int(bool(speculative)) + (2 if double_iteration else 0)
+
+
+def estimate_cost(prompt_tokens, completion_tokens):
+    """Estimated USD cost for a number of prompt and completion tokens."""
+    return prompt_tokens / 1000 * PROMPT_COST_PER_1K + completion_tokens / 1000 * COMPLETION_COST_PER_1K
+
+
+class UsageWriter:
+    """Buffers LLM call records and writes them to the llm_calls table in batches."""
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL_SECONDS, batch_size=BATCH_SIZE):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="llm-usage-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, call):
+        self._ensure_started()
+        self._queue.put(call)
+
+    def _drain(self, first=None):
+        batch = [] if first is None else [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            llm_calls_db.add_llm_calls(batch)
+        except Exception as e:
+            print(f"Failed to write {len(batch)} LLM usage records:", e)
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            with self._flush_lock:
+                self._write(self._drain(first))
+
+    def flush(self):
+        """Synchronously write everything that is still queued."""
+        with self._flush_lock:
+            batch = self._drain()
+            while batch:
+                self._write(batch)
+                batch = self._drain()
+
+
+_writer = UsageWriter()
+atexit.register(_writer.flush)
+
+
+def set_recording_enabled(enabled):
+    """Turn persistence of usage records on or off (e.g. for benchmarks)."""
+    global RECORDING_ENABLED
+    RECORDING_ENABLED = enabled
+
+
+def record_llm_call(purpose, deployment=None, prompt_tokens=0, completion_tokens=0,
+                    latency_ms=0, retries=0, cache_hit=False):
+    """Queue one model call (or cache hit) for asynchronous persistence."""
+    count = _call_count.get()
+    if count is not None and not cache_hit:
+        with _call_count_lock:
+            count[0] += 1
+    if not RECORDING_ENABLED:
+        return
+    call = dict(_usage_context.get())
+    call.update({
+        "purpose": purpose,
+        "deployment": deployment,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "latency_ms": int(latency_ms),
+        "retries": retries,
+        "cache_hit": cache_hit,
+    })
+    _writer.submit(call)
+
+
+def flush():
+    _writer.flush()
@@ -0,0 +1,179 @@
+import json
+from database.connection import get_connection, transaction
+
+
+def add_analysis_run(pr_id, repo_internal_id, commit_sha, settings_version, files_total, files_skipped,
+                     files_filtered=0, bytes_avoided=0, calls_avoided=0):
+    """
+    Record one analysis of a PR event: how many changed files it saw, how
+    many were skipped because their blob was already analyzed, and how many
+    were filtered out as vendored or generated, with the bytes and calls
+    that saved.
+    Returns the ID of the new record.
+    """
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            """
+            INSERT INTO analysis_runs (
+                pr_id,
+                repo_internal_id,
+                commit_sha,
+                settings_version,
+                files_total,
+                files_skipped,
+                files_filtered,
+                bytes_avoided,
+                calls_avoided
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (pr_id, repo_internal_id, commit_sha, settings_version, files_total, files_skipped,
+             files_filtered, bytes_avoided, calls_avoided)
+        )
+        conn.commit()
+        return c.lastrowid
+
+
+def add_analysis_skips(pr_id, repo_internal_id, commit_sha, skips):
+    """
+    Record the files and comments an analysis left out because of its
+    per-event budgets, in one transaction.
+    Each skip is a dict with keys file_path, line (None for a whole file),
+    reason ('max_files', 'max_comments' or 'max_llm_calls') and priority.
+    """
+    if not skips:
+        return
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.executemany(
+            """
+            INSERT INTO analysis_skips (
+                pr_id,
+                repo_internal_id,
+                commit_sha,
+                file_path,
+                line,
+                reason,
+                priority
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (pr_id, repo_internal_id, commit_sha, skip["file_path"], skip.get("line"),
+                 skip["reason"], skip.get("priority"))
+                for skip in skips
+            ]
+        )
+        conn.commit()
+
+
+def get_skip_ratio(repo_internal_id):
+    """
+    Return the share of changed files (0.0 - 1.0) that analyses of this
+    repository skipped, or None if nothing was analyzed yet.
+    """
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT SUM(files_skipped), SUM(files_total)
+              FROM analysis_runs
+             WHERE repo_internal_id = ?
+        """, (repo_internal_id,))
+        skipped, total = c.fetchone()
+    if not total:
+        return None
+    return skipped / total
+
+
+def start_analysis_job(repo_internal_id, pr_number, head_sha, payload):
+    """
+    Start (or restart) the analysis job of a PR head and mark the unfinished
+    jobs of older heads of the same PR as superseded. Further deliveries for
+    the same head (labeled, edited, ...) do not count as attempts; only
+    resuming does (see count_analysis_job_attempt).
+    Returns the job ID.
+    """
+    with transaction() as c:
+        c.execute(
+            """
+            INSERT INTO analysis_jobs (repo_internal_id, pr_number, head_sha, payload)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(repo_internal_id, pr_number, head_sha) DO UPDATE
+               SET status     = 'running',
+                   payload    = excluded.payload,
+                   error      = NULL,
+                   updated_at = CURRENT_TIMESTAMP
+            RETURNING id
+            """,
+            (repo_internal_id, pr_number, head_sha, json.dumps(payload))
+        )
+        job_id = c.fetchone()[0]
+        c.execute(
+            """
+            UPDATE analysis_jobs
+               SET status = 'superseded', updated_at = CURRENT_TIMESTAMP
+             WHERE repo_internal_id = ? AND pr_number = ? AND id != ?
+               AND status IN ('running', 'expired', 'failed')
+            """,
+            (repo_internal_id, pr_number, job_id)
+        )
+    return job_id
+
+
+def count_analysis_job_attempt(job_id):
+    """Count one more attempt at an analysis job, before resuming it."""
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            "UPDATE analysis_jobs SET attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (job_id,)
+        )
+        conn.commit()
+
+
+def update_analysis_job(job_id, status=None, files_total=None, files_done=None, error=None):
+    """Update the progress of an analysis job; arguments left as None are kept."""
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            """
+            UPDATE analysis_jobs
+               SET status      = COALESCE(?, status),
+                   files_total = COALESCE(?, files_total),
+                   files_done  = COALESCE(?, files_done),
+                   error       = COALESCE(?, error),
+                   updated_at  = CURRENT_TIMESTAMP
+             WHERE id = ?
+            """,
+            (status, files_total, files_done, error, job_id)
+        )
+        conn.commit()
+
+
+def get_resumable_analysis_jobs(stale_seconds=300, job_id=None):
+    """
+    Return the jobs that can be resumed: expired or failed ones, and running
+    ones not updated for `stale_seconds` (their worker is presumed dead).
+    With `job_id`, only that job, whatever its status.
+    Each job is a dict with keys id, status, attempts and payload (decoded).
+    """
+    with get_connection() as conn:
+        c = conn.cursor()
+        if job_id is not None:
+            c.execute(
+                "SELECT id, status, attempts, payload FROM analysis_jobs WHERE id = ?",
+                (job_id,)
+            )
+        else:
+            c.execute(
+                """
+                SELECT id, status, attempts, payload FROM analysis_jobs
+                 WHERE status IN ('expired', 'failed')
+                    OR (status = 'running' AND updated_at < datetime('now', ?))
+                 ORDER BY updated_at
+                """,
+                (f"-{int(stale_seconds)} seconds",)
+            )
+        return [
+            {"id": row[0], "status": row[1], "attempts": row[2], "payload": json.loads(row[3])}
+            for row in c.fetchall()
+        ]
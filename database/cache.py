@@ -0,0 +1,122 @@
+"""
+In-process TTL/LRU cache for repository and settings lookups.
+
+Writers invalidate the local cache directly and bump a per-cache counter in
+the cache_versions table inside their own transaction. Every process reads
+the counters at most once per VERSION_CHECK_SECONDS and drops a cache whose
+counter moved, so all gunicorn workers see a write within about a second.
+"""
+import copy
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import config
+from database.connection import get_connection
+
+CACHE_SIZE = getattr(config, "LOOKUP_CACHE_SIZE", 1024)
+CACHE_TTL_SECONDS = getattr(config, "LOOKUP_CACHE_TTL_SECONDS", 300)
+VERSION_CHECK_SECONDS = getattr(config, "CACHE_VERSION_CHECK_SECONDS", 1.0)
+CACHE_ENABLED = getattr(config, "LOOKUP_CACHE_ENABLED", True)
+
+_versions_lock = threading.Lock()
+_versions = {}             # cache name -> last counter read from SQLite
+_versions_checked_at = 0.0
+
+
+def _read_versions():
+    """Return {cache name: version} from cache_versions, refreshed at most once per interval."""
+    global _versions_checked_at
+    now = time.monotonic()
+    with _versions_lock:
+        if now - _versions_checked_at < VERSION_CHECK_SECONDS:
+            return _versions
+        _versions_checked_at = now
+    try:
+        c = get_connection().cursor()
+        c.execute("SELECT name, version FROM cache_versions")
+        versions = dict(c.fetchall())
+        c.close()
+    except sqlite3.OperationalError:
+        # Table not created yet (migrations pending): nothing to compare to.
+        versions = {}
+    with _versions_lock:
+        _versions.clear()
+        _versions.update(versions)
+        return _versions
+
+
+def bump_cache_version(c, name):
+    """
+    Signal other processes that cache `name` is stale. `c` is the cursor of
+    the write that changed the data, so the signal commits with it.
+    """
+    c.execute("""
+        INSERT INTO cache_versions (name, version) VALUES (?, 1)
+        ON CONFLICT(name) DO UPDATE SET version = version + 1
+    """, (name,))
+
+
+class LookupCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL, cleared when the shared
+    version counter for `name` changes. Values (including None) are stored
+    as returned by the loader and handed out as deep copies.
+    """
+
+    def __init__(self, name, maxsize=CACHE_SIZE, ttl=CACHE_TTL_SECONDS):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._version = None
+        self._generation = 0            # bumped by every invalidation
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def _check_version(self):
+        version = _read_versions().get(self.name, 0)
+        if version != self._version:
+            with self._lock:
+                if self._version is not None:
+                    self._entries.clear()
+                    self._generation += 1
+                    self.stats["invalidations"] += 1
+                self._version = version
+
+    def get(self, key, loader):
+        """Return the cached value for `key`, calling loader() on a miss."""
+        if not CACHE_ENABLED:
+            return loader()
+        self._check_version()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return copy.deepcopy(entry[1])
+            self.stats["misses"] += 1
+            generation = self._generation
+        value = loader()
+        with self._lock:
+            # Don't store a value loaded before a concurrent invalidation.
+            if generation == self._generation:
+                self._entries[key] = (now + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return copy.deepcopy(value)
+
+    def invalidate(self, key=None):
+        """Drop one key (or everything) from this process's cache."""
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+repository_cache = LookupCache("repositories")
+settings_cache = LookupCache("repo_settings")
@@ -1,163 +1,87 @@
-import sqlite3
 import json
-from config import DB_PATH
-
-
-def add_comment_smell(
-    pr_id,
-    file_path,
-    commit_sha,
-    line,
-    side,
-    smell_type,
-    associated_code,
-    comment_body,
-    suggestion=None,
-    github_comment_id=None,
-    github_comment_url=None,
-    is_smell=True,
-    repair_enabled=True,
-    status="Pending"
-):
-    """
-    Insert a new comment smell into the comment_smells table,
-    storing the associated code block. If `is_smell` is True,
-    update the smell_summary and (if repair_enabled) increment
-    the smell_count in the pull_requests table.
-    Returns the ID of the new comment smell record.
-    """
-    with sqlite3.connect(DB_PATH) as conn:
-        c = conn.cursor()
-        # Insert the new comment smell with associated code
-        c.execute(
-            """
-            INSERT INTO comment_smells (
-                pr_id,
-                file_path,
-                commit_sha,
-                line,
-                side,
-                smell_type,
-                associated_code,
-                comment_body,
-                suggestion,
-                github_comment_id,
-                github_comment_url,
-                status,
-                is_current,
-                repair_enabled
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?)
-            """,
-            (
-                pr_id,
-                file_path,
-                commit_sha,
-                line,
-                side,
-                smell_type,
-                associated_code,
-                comment_body,
-                suggestion,
-                github_comment_id,
-                github_comment_url,
-                status,
-                1 if repair_enabled else 0,
-            )
-        )
-        conn.commit()
-        smell_id = c.lastrowid
+from database.connection import get_connection, transaction
+from database.content_blobs import store_blobs, content_hash
 
-        # Only count real comment smells
-        if is_smell:
-            # Update smell_summary (increment total_smells)
-            c.execute(
-                """
-                INSERT INTO smell_summary (pr_id, repo_internal_id, total_smells)
-                VALUES (
-                    ?,
-                    (SELECT repo_internal_id FROM pull_requests WHERE id = ?),
-                    1
-                )
-                ON CONFLICT(pr_id) DO UPDATE
-                  SET total_smells = total_smells + 1
-                """,
-                (pr_id, pr_id)
-            )
-            conn.commit()
-
-            # Optionally increment smell_count in pull_requests
-            if repair_enabled:
-                c.execute(
-                    """
-                    UPDATE pull_requests
-                       SET smell_count = smell_count + 1,
-                           updated_at = CURRENT_TIMESTAMP
-                     WHERE id = ?
-                    """,
-                    (pr_id,)
-                )
-                conn.commit()
 
-    return smell_id
+def smell_fingerprint(file_path, comment_body, associated_code):
+    """
+    Identify a comment across pushes: its file, its text with whitespace
+    collapsed and a hash of its code context (line endings and trailing
+    spaces ignored). Line numbers are not part of it, so a comment that only
+    moved keeps its fingerprint.
+    """
+    comment = " ".join(comment_body.split())
+    context = "\n".join(line.rstrip() for line in associated_code.splitlines())
+    return content_hash("\0".join(
+        (file_path, comment, content_hash(context.encode("utf-8")).hex())
+    ).encode("utf-8"))
 
 
-def archive_comment_smells_for_file(pr_id, file_path):
+def get_current_file_smells(repo_internal_id, pr_number, file_path):
     """
-    Archive comment smells for a specific file in a pull request
-    by setting is_current = 0. Recalculates the PR's smell_count.
+    Return [(id, fingerprint, line, comment_body_hash)] of the current smells
+    of one file of a PR, i.e. what the previous analysis of that file left
+    behind.
     """
-    with sqlite3.connect(DB_PATH) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
-        # Archive the active smells for this file
-        c.execute(
-            """
-            UPDATE comment_smells
-               SET is_current = 0
-             WHERE pr_id = ?
-               AND file_path = ?
-            """,
-            (pr_id, file_path)
-        )
-        conn.commit()
-
-        # Recalculate active smells count
         c.execute(
             """
-            UPDATE pull_requests
-               SET smell_count = (
-                   SELECT COUNT(*)
-                     FROM comment_smells
-                    WHERE pr_id = ?
-                      AND is_current = 1
-                      AND repair_enabled = 1
-               ),
-                   updated_at = CURRENT_TIMESTAMP
-             WHERE id = ?
+            SELECT s.id, s.fingerprint, s.line, s.comment_body_hash
+              FROM pull_requests pr
+              JOIN comment_smells_store s ON s.pr_id = pr.id
+             WHERE pr.repo_internal_id = ?
+               AND pr.pr_number = ?
+               AND s.file_path = ?
+               AND s.is_current = 1
+             ORDER BY s.id
             """,
-            (pr_id, pr_id)
+            (repo_internal_id, pr_number, file_path)
         )
-        conn.commit()
+        return c.fetchall()
 
 
 def delete_comment_smells_for_file(pr_id, file_path):
     """
     Delete all comment smell records for a specific file in a PR.
     """
-    with sqlite3.connect(DB_PATH) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute(
-            "DELETE FROM comment_smells WHERE pr_id = ? AND file_path = ?",
+            "DELETE FROM comment_smells_store WHERE pr_id = ? AND file_path = ?",
             (pr_id, file_path)
         )
         conn.commit()
 
 
+def get_analyzed_blob_shas(repo_internal_id, pr_number, settings_version):
+    """
+    Return {file_path: blob_sha} of the blob last analyzed for each file of
+    a PR under the given settings version.
+    """
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            """
+            SELECT f.file_path, f.blob_sha
+              FROM pull_requests pr
+              JOIN files f ON f.pr_id = pr.id
+             WHERE pr.repo_internal_id = ?
+               AND pr.pr_number = ?
+               AND f.settings_version = ?
+             ORDER BY f.id
+            """,
+            (repo_internal_id, pr_number, settings_version)
+        )
+        return dict(c.fetchall())
+
+
 def add_file_record(pr_id, repo_internal_id, file_path, blob_sha, status):
     """
     Insert a new record for a file with its metadata.
     Returns the ID of the new file record.
     """
-    with sqlite3.connect(DB_PATH) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute(
             """
@@ -180,7 +104,7 @@ def update_file_record(file_id, blob_sha=None, status=None):
     Update the file record's blob_sha and/or status.
     Also updates the updated_at timestamp.
     """
-    with sqlite3.connect(DB_PATH) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         fields = []
         params = []
@@ -197,18 +121,302 @@ def update_file_record(file_id, blob_sha=None, status=None):
         c.execute(query, params)
         conn.commit()
 
+# SET clause that queues the GitHub comment of an archived smell for deletion.
+QUEUE_GITHUB_CLEANUP = "github_cleanup = CASE WHEN github_comment_id IS NOT NULL THEN 'pending' END"
+
+
 def archive_file_smells(pr_id: int, file_path: str):
     """
-    Mark all existing smells for this PR+file as no longer current.
-    TODO delete the github comment
+    Mark all existing smells for this PR+file as no longer current and queue
+    their GitHub comments for deletion (web_ui/comment_cleanup.py).
     """
-    with sqlite3.connect(DB_PATH) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
-        c.execute("""
-            UPDATE comment_smells
-               SET is_current = 0
+        c.execute(f"""
+            UPDATE comment_smells_store
+               SET is_current = 0,
+                   {QUEUE_GITHUB_CLEANUP}
              WHERE pr_id = ?
                AND file_path = ?
                AND is_current = 1
         """, (pr_id, file_path))
-        conn.commit()
\ No newline at end of file
+        conn.commit()
+
+
+def add_pr_analysis_results(pr_id, repo_internal_id, files, smells, carried=(), vanished=()):
+    """
+    Persist the analysis of a PR event, or of one of its files, in a single
+    transaction.
+
+    Args:
+        files: list of dicts with keys file_path, blob_sha, status and
+            settings_version (of the settings the blob was analyzed with).
+        smells: list of dicts with keys file_path, commit_sha, line,
+            smell_type, associated_code, comment_body and fingerprint, and
+            optionally side (default 'RIGHT'), suggestion, github_comment_id,
+            github_comment_url, status (default 'Pending'), repair_enabled
+            (default True) and is_smell (default True).
+        carried: list of dicts with keys id, commit_sha, line, fingerprint
+            and associated_code for current smells whose comment is
+            unchanged; they are moved to the new head together with their
+            code.
+        vanished: ids of current smells whose comment is gone or changed;
+            they are archived and their GitHub comments queued for deletion.
+
+    The smell_summary total is increased by the number of real smells and
+    pull_requests.smell_count is recomputed once from the current,
+    repair-enabled rows instead of being incremented per smell.
+    Returns the number of comment smell rows inserted.
+    """
+    with transaction() as c:
+        c.executemany(
+            """
+            INSERT INTO files (
+                pr_id,
+                repo_internal_id,
+                file_path,
+                blob_sha,
+                status,
+                settings_version
+            ) VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (pr_id, repo_internal_id, f["file_path"], f["blob_sha"], f["status"], f.get("settings_version"))
+                for f in files
+            ]
+        )
+        code_hashes = store_blobs(c, [s["associated_code"] for s in smells])
+        body_hashes = store_blobs(c, [s["comment_body"] for s in smells])
+        suggestion_hashes = store_blobs(c, [s.get("suggestion") for s in smells])
+        c.executemany(
+            """
+            INSERT INTO comment_smells_store (
+                pr_id,
+                file_path,
+                commit_sha,
+                line,
+                side,
+                smell_type,
+                associated_code_hash,
+                comment_body_hash,
+                suggestion_hash,
+                github_comment_id,
+                github_comment_url,
+                status,
+                is_current,
+                repair_enabled,
+                fingerprint
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?)
+            """,
+            [
+                (
+                    pr_id,
+                    s["file_path"],
+                    s["commit_sha"],
+                    s["line"],
+                    s.get("side", "RIGHT"),
+                    s["smell_type"],
+                    code_hashes[n],
+                    body_hashes[n],
+                    suggestion_hashes[n],
+                    s.get("github_comment_id"),
+                    s.get("github_comment_url"),
+                    s.get("status", "Pending"),
+                    1 if s.get("repair_enabled", True) else 0,
+                    s.get("fingerprint"),
+                )
+                for n, s in enumerate(smells)
+            ]
+        )
+        # A remapped smell's code may have moved with it; keep it in step with the fingerprint
+        carried_code_hashes = store_blobs(c, [s.get("associated_code") for s in carried])
+        c.executemany(
+            """
+            UPDATE comment_smells_store
+               SET commit_sha = ?, line = ?, fingerprint = ?,
+                   associated_code_hash = COALESCE(?, associated_code_hash)
+             WHERE id = ?
+            """,
+            [
+                (s["commit_sha"], s["line"], s["fingerprint"], carried_code_hashes[n], s["id"])
+                for n, s in enumerate(carried)
+            ]
+        )
+        c.executemany(
+            f"""
+            UPDATE comment_smells_store
+               SET is_current = 0,
+                   {QUEUE_GITHUB_CLEANUP}
+             WHERE id = ?
+               AND is_current = 1
+            """,
+            [(smell_id,) for smell_id in vanished]
+        )
+
+        new_smells = sum(1 for s in smells if s.get("is_smell", True))
+        if new_smells:
+            c.execute(
+                """
+                INSERT INTO smell_summary (pr_id, repo_internal_id, total_smells)
+                VALUES (?, ?, ?)
+                ON CONFLICT(pr_id) DO UPDATE
+                  SET total_smells = total_smells + excluded.total_smells
+                """,
+                (pr_id, repo_internal_id, new_smells)
+            )
+
+        c.execute(
+            """
+            UPDATE pull_requests
+               SET smell_count = (
+                   SELECT COUNT(*)
+                     FROM comment_smells_store
+                    WHERE pr_id = ?
+                      AND is_current = 1
+                      AND repair_enabled = 1
+               ),
+                   updated_at = CURRENT_TIMESTAMP
+             WHERE id = ?
+            """,
+            (pr_id, pr_id)
+        )
+    return len(smells)
+
+
+# Columns the PR analysis API may return. associated_code is only sent on
+# request since it is by far the largest column.
+COMMENT_SMELL_FIELDS = (
+    "id", "file_path", "line", "side", "commit_sha", "smell_type", "comment_body",
+    "suggestion", "status", "github_comment_url", "associated_code",
+)
+DEFAULT_COMMENT_SMELL_FIELDS = tuple(f for f in COMMENT_SMELL_FIELDS if f != "associated_code")
+
+
+def get_comment_smells_page(pr_id, after=None, limit=100, fields=DEFAULT_COMMENT_SMELL_FIELDS):
+    """
+    Return one page of a PR's current, repair-enabled smells ordered by
+    file and line.
+
+    Args:
+        pr_id: Pull request ID.
+        after: (file_path, line, id) of the last row of the previous page, or None.
+        limit: Maximum number of rows.
+        fields: Columns to return (subset of COMMENT_SMELL_FIELDS); raises
+            ValueError for unknown names.
+
+    Returns:
+        (rows, next_after): a list of dicts and the cursor of the next page
+        (None when this is the last page).
+    """
+    unknown = set(fields) - set(COMMENT_SMELL_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    columns = ["file_path", "line", "id"] + [f for f in fields if f not in ("file_path", "line", "id")]
+    where = "pr_id = ? AND is_current = 1 AND repair_enabled = 1"
+    params = [pr_id]
+    if after is not None:
+        where += " AND (file_path, line, id) > (?, ?, ?)"
+        params.extend(after)
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute(f"""
+            SELECT {", ".join(columns)}
+              FROM comment_smells
+             WHERE {where}
+             ORDER BY file_path, line, id
+             LIMIT ?
+        """, (*params, limit + 1))
+        rows = [dict(zip(columns, row)) for row in c.fetchall()]
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = (rows[-1]["file_path"], rows[-1]["line"], rows[-1]["id"])
+    return [{f: row[f] for f in fields} for row in rows], next_after
+
+
+def get_comment_smell(pr_id, smell_id, fields=COMMENT_SMELL_FIELDS):
+    """
+    Return the requested columns of one smell of a PR as a dict, or None.
+    """
+    unknown = set(fields) - set(COMMENT_SMELL_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute(f"""
+            SELECT {", ".join(fields)}
+              FROM comment_smells
+             WHERE id = ?
+               AND pr_id = ?
+        """, (smell_id, pr_id))
+        row = c.fetchone()
+    return dict(zip(fields, row)) if row else None
+
+
+def get_pending_comment_cleanups(pr_id=None, limit=1000):
+    """
+    Return archived smells whose GitHub comment still has to be deleted, as
+    dicts with keys id, github_comment_id, attempts, repo_full_name and
+    installation_id. Limited to one PR if `pr_id` is given.
+    """
+    where = "s.github_cleanup = 'pending'"
+    params = ()
+    if pr_id is not None:
+        where += " AND s.pr_id = ?"
+        params = (pr_id,)
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            f"""
+            SELECT s.id, s.github_comment_id, s.github_cleanup_attempts,
+                   r.repo_full_name, r.installation_id
+              FROM comment_smells_store s
+              JOIN pull_requests pr ON pr.id = s.pr_id
+              JOIN repositories r ON r.internal_id = pr.repo_internal_id
+             WHERE {where}
+             ORDER BY s.id
+             LIMIT ?
+            """,
+            params + (limit,)
+        )
+        rows = c.fetchall()
+    return [
+        {
+            "id": row[0],
+            "github_comment_id": row[1],
+            "attempts": row[2],
+            "repo_full_name": row[3],
+            "installation_id": row[4],
+        }
+        for row in rows
+    ]
+
+
+def record_comment_cleanups(deleted, retry, failed):
+    """
+    Store the outcome of a cleanup run: ids of smells whose GitHub comment is
+    gone, ids to try again later, and ids that gave up after too many
+    attempts.
+    """
+    with transaction() as c:
+        c.executemany(
+            "UPDATE comment_smells_store SET github_cleanup = 'deleted' WHERE id = ?",
+            [(smell_id,) for smell_id in deleted]
+        )
+        c.executemany(
+            """
+            UPDATE comment_smells_store
+               SET github_cleanup_attempts = github_cleanup_attempts + 1
+             WHERE id = ?
+            """,
+            [(smell_id,) for smell_id in retry]
+        )
+        c.executemany(
+            """
+            UPDATE comment_smells_store
+               SET github_cleanup = 'failed',
+                   github_cleanup_attempts = github_cleanup_attempts + 1
+             WHERE id = ?
+            """,
+            [(smell_id,) for smell_id in failed]
+        )
@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+import config
+from config import DB_PATH
+from database.content_blobs import register_functions
+
+# Pragmas applied to every pooled connection (override in config.py).
+BUSY_TIMEOUT_MS = getattr(config, "SQLITE_BUSY_TIMEOUT_MS", 5000)
+MMAP_SIZE = getattr(config, "SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
+# Negative values are in KiB (-65536 = 64 MiB page cache per connection).
+CACHE_SIZE = getattr(config, "SQLITE_CACHE_SIZE", -65536)
+
+_local = threading.local()
+
+
+def _configure(conn):
+    c = conn.cursor()
+    # Only takes effect on a new database; database/retention.py converts
+    # existing ones so freed pages can be returned with incremental_vacuum.
+    c.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    # WAL lets dashboard reads proceed while a webhook is writing.
+    c.execute("PRAGMA journal_mode=WAL")
+    c.execute("PRAGMA synchronous=NORMAL")
+    c.execute(f"PRAGMA busy_timeout={int(BUSY_TIMEOUT_MS)}")
+    c.execute(f"PRAGMA mmap_size={int(MMAP_SIZE)}")
+    c.execute(f"PRAGMA cache_size={int(CACHE_SIZE)}")
+    c.execute("PRAGMA temp_store=MEMORY")
+    c.close()
+    # blob_text() is needed to read the comment_smells view.
+    register_functions(conn)
+
+
+def get_connection():
+    """
+    Return this thread's shared connection to DB_PATH, opening it on first use.
+
+    Use it exactly like sqlite3.connect():
+        with get_connection() as conn:
+            ...
+    The `with` block commits (or rolls back) but does not close the connection,
+    so later calls on the same thread reuse it. A new connection is opened
+    after a fork (e.g. in every gunicorn worker).
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "pid", None) == os.getpid():
+        return conn
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000)
+    _configure(conn)
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+@contextmanager
+def transaction():
+    """
+    Run the enclosed statements in a single write transaction on the pooled
+    connection. BEGIN IMMEDIATE takes the write lock up front so concurrent
+    writers wait on busy_timeout instead of failing halfway through.
+    Yields a cursor.
+    """
+    conn = get_connection()
+    if conn.in_transaction:
+        conn.commit()
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        yield c
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+    finally:
+        c.close()
+
+
+def close_connection():
+    """Close this thread's pooled connection, if any."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "pid", None) == os.getpid():
+        conn.close()
+    _local.conn = None
@@ -0,0 +1,81 @@
+"""
+Deduplicated, compressed storage for large text columns.
+
+comment_smells_store keeps only content hashes for associated_code,
+comment_body and suggestion; the text itself lives once per distinct value
+in content_blobs. The comment_smells view (migration 5 in
+database/migrations.py) decompresses it again through the blob_text() SQL
+function, which get_connection() registers on every connection.
+
+blob_text() is a Python function, not part of SQLite: any other client (the
+sqlite3 shell, DB browsers, a restored backup opened elsewhere) fails on the
+view with "no such function: blob_text". Such clients can still read
+comment_smells_store and content_blobs directly (rows with codec 'raw' hold
+plain UTF-8); Python scripts can open the database with connect() below.
+"""
+import hashlib
+import sqlite3
+import zlib
+import config
+
+# Texts shorter than this are stored uncompressed (zlib would not save space).
+COMPRESS_MIN_BYTES = getattr(config, "BLOB_COMPRESS_MIN_BYTES", 64)
+COMPRESSION_LEVEL = getattr(config, "BLOB_COMPRESSION_LEVEL", 6)
+
+
+def content_hash(data):
+    """128-bit BLAKE2b digest of the UTF-8 bytes, used as the blob key."""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def encode_blob(text):
+    """
+    Return (hash, codec, size, data) for a text value, or None for None.
+    `codec` is 'zlib' or 'raw'; `size` is the uncompressed length in bytes.
+    """
+    if text is None:
+        return None
+    raw = text.encode("utf-8")
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(raw, COMPRESSION_LEVEL)
+        if len(packed) < len(raw):
+            return content_hash(raw), "zlib", len(raw), packed
+    return content_hash(raw), "raw", len(raw), raw
+
+
+def blob_text(codec, data):
+    """Decode a content_blobs row back to text (the blob_text SQL function)."""
+    if data is None:
+        return None
+    if codec == "zlib":
+        data = zlib.decompress(data)
+    return bytes(data).decode("utf-8")
+
+
+def register_functions(conn):
+    """Make blob_text(codec, data) available to SQL on this connection."""
+    conn.create_function("blob_text", 2, blob_text, deterministic=True)
+
+
+def connect(path):
+    """
+    sqlite3.connect(path) with blob_text() registered, for scripts, backups
+    and ad-hoc queries that read the comment_smells view outside the app.
+    """
+    conn = sqlite3.connect(path)
+    register_functions(conn)
+    return conn
+
+
+def store_blobs(c, texts):
+    """
+    Store every text in content_blobs (existing content is not rewritten) and
+    return the list of their hashes, None for None values.
+    `c` is a cursor, normally inside a transaction.
+    """
+    encoded = [encode_blob(text) for text in texts]
+    c.executemany(
+        "INSERT OR IGNORE INTO content_blobs (hash, codec, size, data) VALUES (?, ?, ?, ?)",
+        {blob[0]: blob for blob in encoded if blob is not None}.values()
+    )
+    return [blob[0] if blob is not None else None for blob in encoded]
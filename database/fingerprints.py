@@ -0,0 +1,105 @@
+from database.connection import get_connection
+
+
+def find_fingerprint_candidates(bands):
+    """
+    Return every stored fingerprint that shares at least one band with `bands`.
+    `bands` is a 4-tuple of 16-bit integers taken from the comment SimHash.
+    Returns a list of dicts with the stored hashes, label and confirmation count.
+    """
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT id, comment_hash, code_hash, smell_type, confirmations
+              FROM comment_fingerprints
+             WHERE band0 = ? OR band1 = ? OR band2 = ? OR band3 = ?
+        """, tuple(bands))
+        rows = c.fetchall()
+    return [
+        {
+            "id": row[0],
+            "comment_hash": row[1],
+            "code_hash": row[2],
+            "smell_type": row[3],
+            "confirmations": row[4],
+        }
+        for row in rows
+    ]
+
+
+def add_fingerprint(comment_hash, code_hash, bands, smell_type):
+    """
+    Store a newly classified (comment, code) fingerprint.
+    Returns the ID of the new record.
+    """
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            INSERT INTO comment_fingerprints (
+                comment_hash, code_hash, band0, band1, band2, band3, smell_type
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (comment_hash, code_hash, *bands, smell_type))
+        conn.commit()
+        return c.lastrowid
+
+
+def confirm_fingerprint(fingerprint_id, smell_type):
+    """
+    Record a new model observation for an existing fingerprint.
+    A matching label increments `confirmations`; a conflicting label replaces
+    the stored one and resets `confirmations` to 0 so it is not reused until
+    it has been confirmed again.
+    """
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            UPDATE comment_fingerprints
+               SET confirmations = CASE WHEN smell_type = ?
+                                        THEN confirmations + 1
+                                        ELSE 0 END,
+                   smell_type    = ?,
+                   last_used_at  = CURRENT_TIMESTAMP
+             WHERE id = ?
+        """, (smell_type, smell_type, fingerprint_id))
+        conn.commit()
+
+
+def touch_fingerprint(fingerprint_id):
+    """Mark a fingerprint as recently used so eviction keeps it."""
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            UPDATE comment_fingerprints
+               SET last_used_at = CURRENT_TIMESTAMP
+             WHERE id = ?
+        """, (fingerprint_id,))
+        conn.commit()
+
+
+def evict_fingerprints(max_entries, max_age_days=None):
+    """
+    Evict least recently used fingerprints so that at most `max_entries` remain,
+    and (optionally) drop every entry unused for more than `max_age_days`.
+    Returns the number of deleted records.
+    """
+    with get_connection() as conn:
+        c = conn.cursor()
+        deleted = 0
+        if max_age_days is not None:
+            c.execute("""
+                DELETE FROM comment_fingerprints
+                 WHERE last_used_at < datetime('now', ?)
+            """, (f"-{int(max_age_days)} days",))
+            deleted += c.rowcount
+        c.execute("""
+            DELETE FROM comment_fingerprints
+             WHERE id IN (
+                SELECT id
+                  FROM comment_fingerprints
+                 ORDER BY last_used_at ASC, id ASC
+                 LIMIT max(0, (SELECT COUNT(*) FROM comment_fingerprints) - ?)
+             )
+        """, (max_entries,))
+        deleted += c.rowcount
+        conn.commit()
+    return deleted
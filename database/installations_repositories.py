@@ -1,12 +1,14 @@
 # installations_repositories.py
+import json
 import sqlite3
 import uuid
-from config import DB_PATH
+from database.connection import get_connection, transaction
+from database.cache import repository_cache, bump_cache_version
 
 def add_installation(installation_id):
     """Add an installation record (if not already present)."""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             c.execute("INSERT INTO installations (installation_id) VALUES (?)", (installation_id,))
             conn.commit()
@@ -15,41 +17,76 @@ def add_installation(installation_id):
 
 def remove_installation(installation_id):
     """Remove the installation and its associated repositories from the database."""
-    with sqlite3.connect(DB_PATH) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("DELETE FROM repositories WHERE installation_id = ?", (installation_id,))
         c.execute("DELETE FROM installations WHERE installation_id = ?", (installation_id,))
+        bump_cache_version(c, "repositories")
         conn.commit()
+    repository_cache.invalidate()
+
+def add_repositories(installation_id, repositories):
+    """
+    Upsert the repositories of an installation in a single transaction.
+    `repositories` is a list of (github_repo_id, repo_full_name) pairs; new
+    ones get a random internal ID, known ones keep theirs and pick up a
+    renamed full name. Returns the internal IDs in the same order.
+    """
+    repositories = [(str(github_repo_id), repo_full_name) for github_repo_id, repo_full_name in repositories]
+    with transaction() as c:
+        c.execute("INSERT OR IGNORE INTO installations (installation_id) VALUES (?)", (installation_id,))
+        c.executemany("""
+            INSERT INTO repositories (internal_id, github_repo_id, repo_full_name, installation_id)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (github_repo_id, installation_id) DO UPDATE
+               SET repo_full_name = excluded.repo_full_name
+             WHERE repo_full_name IS NOT excluded.repo_full_name
+        """, [(str(uuid.uuid4()), github_repo_id, repo_full_name, installation_id)
+              for github_repo_id, repo_full_name in repositories])
+        changed = c.rowcount > 0
+        if changed:
+            bump_cache_version(c, "repositories")
+        c.execute("""
+            SELECT github_repo_id, internal_id FROM repositories
+            WHERE installation_id = ?
+        """, (installation_id,))
+        internal_ids = dict(c.fetchall())
+    if changed:
+        # Drop cached "not found" lookups and old names.
+        repository_cache.invalidate()
+    return [internal_ids[github_repo_id] for github_repo_id, _ in repositories]
 
 def add_repository(installation_id, github_repo_id, repo_full_name):
     """
-    Generate a random internal ID for the repository and add a repository record.
-    Returns the generated internal ID.
+    Add a repository record with a random internal ID, unless the
+    (github_repo_id, installation_id) pair is already known.
+    Returns the repository's internal ID.
     """
-    internal_id = str(uuid.uuid4())
-    try:
-        with sqlite3.connect(DB_PATH) as conn:
-            c = conn.cursor()
-            c.execute("""
-                INSERT INTO repositories (internal_id, github_repo_id, repo_full_name, installation_id)
-                VALUES (?, ?, ?, ?)
-            """, (internal_id, github_repo_id, repo_full_name, installation_id))
-            conn.commit()
-    except sqlite3.IntegrityError:
-        with sqlite3.connect(DB_PATH) as conn:
-            c = conn.cursor()
-            c.execute("""
-                SELECT internal_id FROM repositories 
-                WHERE github_repo_id = ? AND installation_id = ?
-            """, (github_repo_id, installation_id))
-            row = c.fetchone()
-            if row:
-                internal_id = row[0]
-    return internal_id
+    return add_repositories(installation_id, [(github_repo_id, repo_full_name)])[0]
+
+def remove_repositories(installation_id, github_repo_ids):
+    """
+    Remove repositories from an installation in a single transaction.
+    Returns the internal IDs of the removed repositories.
+    """
+    github_repo_ids = [str(github_repo_id) for github_repo_id in github_repo_ids]
+    with transaction() as c:
+        c.execute("""
+            DELETE FROM repositories
+            WHERE installation_id = ?
+              AND github_repo_id IN (SELECT value FROM json_each(?))
+            RETURNING internal_id
+        """, (installation_id, json.dumps(github_repo_ids)))
+        removed = [row[0] for row in c.fetchall()]
+        if removed:
+            bump_cache_version(c, "repositories")
+    if removed:
+        repository_cache.invalidate()
+    return removed
 
 def get_all_repositories():
     """Retrieve all repositories from the database."""
-    with sqlite3.connect(DB_PATH) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("""
             SELECT internal_id, github_repo_id, repo_full_name, installation_id 
@@ -71,7 +108,7 @@ def get_repositories_by_internal_ids(internal_ids):
         FROM repositories 
         WHERE internal_id IN ({placeholders})
     """
-    with sqlite3.connect(DB_PATH) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute(query, internal_ids)
         rows = c.fetchall()
@@ -82,7 +119,7 @@ def get_repositories_by_internal_ids(internal_ids):
 
 def get_repositories_by_installation(installation_id):
     """Retrieve all repositories linked to a given installation."""
-    with sqlite3.connect(DB_PATH) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("""
             SELECT internal_id, github_repo_id, repo_full_name 
@@ -92,29 +129,15 @@ def get_repositories_by_installation(installation_id):
         rows = c.fetchall()
     return [{"internal_id": row[0], "github_repo_id": row[1], "repo_full_name": row[2]} for row in rows]
 
-def get_repository_by_id(repo_id):
-    """Retrieve a repository by its internal ID."""
-    with sqlite3.connect(DB_PATH) as conn:
-        c = conn.cursor()
-        c.execute("""
-            SELECT internal_id, github_repo_id, repo_full_name, installation_id 
-            FROM repositories 
-            WHERE internal_id = ?
-        """, (repo_id,))
-        row = c.fetchone()
-    if row:
-        return {"internal_id": row[0], "github_repo_id": row[1], "repo_full_name": row[2], "installation_id": row[3]}
-    return None
-
-def get_repository_by_internal_id(internal_id):
-    """Retrieve a repository record by its internal_id."""
-    with sqlite3.connect(DB_PATH) as conn:
+def _select_repository(column, value):
+    """Load one repository row by `column` ('internal_id' or 'repo_full_name')."""
+    with get_connection() as conn:
         c = conn.cursor()
-        c.execute("""
+        c.execute(f"""
             SELECT internal_id, github_repo_id, repo_full_name, installation_id 
             FROM repositories 
-            WHERE internal_id = ?
-        """, (internal_id,))
+            WHERE {column} = ?
+        """, (value,))
         row = c.fetchone()
     if row:
         return {
@@ -125,27 +148,26 @@ def get_repository_by_internal_id(internal_id):
         }
     return None
 
+def get_repository_by_id(repo_id):
+    """Retrieve a repository by its internal ID."""
+    return get_repository_by_internal_id(repo_id)
+
+def get_repository_by_internal_id(internal_id):
+    """Retrieve a repository record by its internal_id (cached)."""
+    return repository_cache.get(
+        ("internal_id", internal_id),
+        lambda: _select_repository("internal_id", internal_id)
+    )
+
 def get_repository_by_full_name(repo_full_name):
     """
-    Retrieve the repository record based on its full name.
+    Retrieve the repository record based on its full name (cached).
     Returns a dictionary with repository details if found, otherwise None.
     """
-    with sqlite3.connect(DB_PATH) as conn:
-        c = conn.cursor()
-        c.execute("""
-            SELECT internal_id, github_repo_id, repo_full_name, installation_id 
-            FROM repositories 
-            WHERE repo_full_name = ?
-        """, (repo_full_name,))
-        row = c.fetchone()
-    if row:
-        return {
-            "internal_id": row[0],
-            "github_repo_id": row[1],
-            "repo_full_name": row[2],
-            "installation_id": row[3]
-        }
-    return None
+    return repository_cache.get(
+        ("repo_full_name", repo_full_name),
+        lambda: _select_repository("repo_full_name", repo_full_name)
+    )
 
 def get_repository_id_by_full_name(repo_full_name):
     """
@@ -0,0 +1,149 @@
+from database.connection import get_connection
+
+
+def add_llm_calls(calls):
+    """
+    Insert a batch of LLM call records in a single transaction.
+    Each call is a dict with keys: repo_internal_id, pr_number, purpose,
+    deployment, prompt_tokens, completion_tokens, latency_ms, retries,
+    cache_hit, double_iteration.
+    """
+    if not calls:
+        return
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.executemany(
+            """
+            INSERT INTO llm_calls (
+                repo_internal_id,
+                pr_number,
+                purpose,
+                deployment,
+                prompt_tokens,
+                completion_tokens,
+                latency_ms,
+                retries,
+                cache_hit,
+                double_iteration
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    call.get("repo_internal_id"),
+                    call.get("pr_number"),
+                    call["purpose"],
+                    call.get("deployment"),
+                    call.get("prompt_tokens", 0),
+                    call.get("completion_tokens", 0),
+                    call.get("latency_ms", 0),
+                    call.get("retries", 0),
+                    1 if call.get("cache_hit") else 0,
+                    1 if call.get("double_iteration") else 0,
+                )
+                for call in calls
+            ]
+        )
+        conn.commit()
+
+
+def get_llm_usage_for_repo(repo_internal_id):
+    """
+    Aggregate LLM usage for a repository, split by the double_iteration setting.
+    Returns a list of dicts (one per double_iteration value that has calls).
+    """
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT double_iteration,
+                   COUNT(*)                                   AS calls,
+                   SUM(cache_hit)                             AS cache_hits,
+                   SUM(prompt_tokens)                         AS prompt_tokens,
+                   SUM(completion_tokens)                     AS completion_tokens,
+                   SUM(retries)                               AS retries,
+                   AVG(CASE WHEN cache_hit = 0 THEN latency_ms END) AS avg_latency_ms,
+                   MAX(latency_ms)                            AS max_latency_ms
+              FROM llm_calls
+             WHERE repo_internal_id = ?
+             GROUP BY double_iteration
+        """, (repo_internal_id,))
+        rows = c.fetchall()
+    return [
+        {
+            "double_iteration": bool(row[0]),
+            "calls": row[1],
+            "cache_hits": row[2] or 0,
+            "prompt_tokens": row[3] or 0,
+            "completion_tokens": row[4] or 0,
+            "retries": row[5] or 0,
+            "avg_latency_ms": round(row[6] or 0),
+            "max_latency_ms": row[7] or 0,
+        }
+        for row in rows
+    ]
+
+
+def get_llm_latency_percentile(repo_internal_id, percentile=0.95):
+    """
+    Return the given latency percentile (in ms) of non-cached model calls
+    for a repository, or None if there are no calls.
+    """
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT COUNT(*)
+              FROM llm_calls
+             WHERE repo_internal_id = ?
+               AND cache_hit = 0
+        """, (repo_internal_id,))
+        count, = c.fetchone()
+        if not count:
+            return None
+        c.execute("""
+            SELECT latency_ms
+              FROM llm_calls
+             WHERE repo_internal_id = ?
+               AND cache_hit = 0
+             ORDER BY latency_ms
+             LIMIT 1 OFFSET ?
+        """, (repo_internal_id, min(count - 1, int(count * percentile))))
+        latency, = c.fetchone()
+    return latency
+
+
+def get_llm_usage_by_pr(repo_internal_id):
+    """
+    Aggregate LLM usage per pull request of a repository, most expensive first.
+    Returns a list of dicts.
+    """
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT pr_number,
+                   COUNT(*)               AS calls,
+                   SUM(cache_hit)         AS cache_hits,
+                   SUM(prompt_tokens)     AS prompt_tokens,
+                   SUM(completion_tokens) AS completion_tokens,
+                   SUM(retries)           AS retries,
+                   SUM(latency_ms)        AS total_latency_ms,
+                   MAX(latency_ms)        AS max_latency_ms,
+                   MAX(double_iteration)  AS double_iteration
+              FROM llm_calls
+             WHERE repo_internal_id = ?
+             GROUP BY pr_number
+             ORDER BY SUM(prompt_tokens + completion_tokens) DESC
+        """, (repo_internal_id,))
+        rows = c.fetchall()
+    return [
+        {
+            "pr_number": row[0],
+            "calls": row[1],
+            "cache_hits": row[2] or 0,
+            "prompt_tokens": row[3] or 0,
+            "completion_tokens": row[4] or 0,
+            "retries": row[5] or 0,
+            "total_latency_ms": row[6] or 0,
+            "max_latency_ms": row[7] or 0,
+            "double_iteration": bool(row[8]),
+        }
+        for row in rows
+    ]
@@ -0,0 +1,840 @@
+"""
+Versioned schema migrations.
+
+Each migration is a function taking a cursor; it runs inside its own
+transaction together with the row recording it in `schema_version`.
+Append new migrations to MIGRATIONS, never edit applied ones.
+
+Usage:
+    python -m database.migrations           # apply pending migrations
+    python -m database.migrations --check   # fail if a hot query scans a table
+"""
+import hashlib
+import re
+import sys
+from database.connection import get_connection, transaction
+from database.content_blobs import store_blobs
+
+
+def _create_baseline_tables(c):
+    """Version 1: the tables init_db used to create with CREATE TABLE IF NOT EXISTS."""
+    # 1. installations table
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS installations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            installation_id TEXT UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # 2. repositories table
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS repositories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            internal_id TEXT UNIQUE,
+            github_repo_id TEXT,
+            repo_full_name TEXT,
+            installation_id TEXT,
+            UNIQUE(github_repo_id, installation_id)
+        )
+    """)
+    # 3. pull_requests table (basic metadata with smell_count)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS pull_requests (
+            id               INTEGER PRIMARY KEY AUTOINCREMENT,
+            repo_internal_id TEXT    NOT NULL,
+            pr_number        INTEGER NOT NULL,
+            title            TEXT,
+            status           TEXT,
+            created_at       TIMESTAMP,
+            updated_at       TIMESTAMP,
+            smell_count      INTEGER DEFAULT 0,
+            FOREIGN KEY (repo_internal_id) REFERENCES repositories (internal_id),
+            UNIQUE (repo_internal_id, pr_number)
+        );
+    """)
+    # 4. comment_smells table with extended location details, blob_sha, is_current flag, and repair_enabled flag
+
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS comment_smells (
+        id                    INTEGER PRIMARY KEY AUTOINCREMENT,
+        pr_id                 INTEGER NOT NULL
+                                REFERENCES pull_requests(id),
+        file_path             TEXT    NOT NULL,                     -- e.g. "src/foo/Bar.java"
+        commit_sha            TEXT    NOT NULL,                     -- PR-branch HEAD SHA
+        line                  INTEGER NOT NULL,                     -- diff line number
+        side                  TEXT    NOT NULL
+                                CHECK(side IN ('LEFT','RIGHT')),
+        smell_type            TEXT    NOT NULL
+                                CHECK(smell_type IN (
+                                    'Misleading',
+                                    'Obvious',
+                                    'Commented out code',
+                                    'Irrelevant',
+                                    'Task',
+                                    'Too much info',
+                                    'Beautification',
+                                    'Nonlocal info',
+                                    'Vague',
+                                    'Not a smell'
+                                )),
+        associated_code       TEXT    NOT NULL,                     -- the code block around the comment
+        comment_body          TEXT    NOT NULL,                     -- what you originally posted
+        suggestion            TEXT,                                  -- the “suggestion” snippet
+        github_comment_id     INTEGER UNIQUE,                       -- the GitHub comment’s id
+        github_comment_url    TEXT,                                  -- link back to GitHub UI
+        status                TEXT    NOT NULL DEFAULT 'Pending'
+                                CHECK(status IN ('Accepted','Rejected','Pending')),
+        is_current            BOOLEAN NOT NULL DEFAULT 1,            -- mark outdated comments
+        repair_enabled        BOOLEAN NOT NULL DEFAULT 1,            -- user toggle
+        created_at            DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+
+    # 5. repo_settings table
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS repo_settings (
+            repo_internal_id TEXT PRIMARY KEY,
+            create_issues BOOLEAN NOT NULL DEFAULT 1,
+            enabled_smells TEXT NOT NULL DEFAULT '[]',
+            double_iteration BOOLEAN NOT NULL DEFAULT 0,
+            FOREIGN KEY (repo_internal_id) REFERENCES repositories (internal_id)
+        )
+    """)
+    # 6. smell_summary table
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS smell_summary (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pr_id INTEGER UNIQUE,
+            repo_internal_id TEXT,
+            total_smells INTEGER DEFAULT 0,
+            FOREIGN KEY (repo_internal_id) REFERENCES repositories (internal_id)
+        )
+    """)
+    # 7. files table for storing file metadata including blob_sha (without file content)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pr_id INTEGER,
+            repo_internal_id TEXT,
+            file_path TEXT,
+            blob_sha TEXT,
+            status TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (pr_id) REFERENCES pull_requests (id),
+            FOREIGN KEY (repo_internal_id) REFERENCES repositories (internal_id)
+        )
+    """)
+    # 8. comment_fingerprints table: SimHash index of previously classified comments
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS comment_fingerprints (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            comment_hash INTEGER NOT NULL,      -- signed 64-bit SimHash of the comment
+            code_hash INTEGER NOT NULL,         -- signed 64-bit SimHash of the code context
+            band0 INTEGER NOT NULL,             -- 16-bit LSH bands of comment_hash
+            band1 INTEGER NOT NULL,
+            band2 INTEGER NOT NULL,
+            band3 INTEGER NOT NULL,
+            smell_type TEXT NOT NULL,
+            confirmations INTEGER NOT NULL DEFAULT 1,
+            last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    for band in range(4):
+        c.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_comment_fingerprints_band{band}
+                ON comment_fingerprints (band{band})
+        """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_comment_fingerprints_last_used
+            ON comment_fingerprints (last_used_at)
+    """)
+    # 9. llm_calls table: one compact row per model call (or cache hit)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS llm_calls (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            repo_internal_id TEXT,
+            pr_number INTEGER,
+            purpose TEXT NOT NULL,              -- 'detect' or 'repair'
+            deployment TEXT,
+            prompt_tokens INTEGER NOT NULL DEFAULT 0,
+            completion_tokens INTEGER NOT NULL DEFAULT 0,
+            latency_ms INTEGER NOT NULL DEFAULT 0,
+            retries INTEGER NOT NULL DEFAULT 0,
+            cache_hit BOOLEAN NOT NULL DEFAULT 0,
+            double_iteration BOOLEAN NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_llm_calls_repo_pr
+            ON llm_calls (repo_internal_id, pr_number)
+    """)
+
+
+def _add_hot_query_indexes(c):
+    """Version 2: covering indexes for the queries in HOT_QUERIES."""
+    # get_repository_by_full_name (every PR event)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_repositories_full_name
+            ON repositories (repo_full_name, internal_id, github_repo_id, installation_id)
+    """)
+    # get_repositories_by_installation / remove_installation
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_repositories_installation
+            ON repositories (installation_id)
+    """)
+    # repo_dashboard PR list, newest first
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_pull_requests_repo_created
+            ON pull_requests (repo_internal_id, created_at, pr_number, title, smell_count, status)
+    """)
+    # Dashboard counts, smell_count recalculation and the pr_analysis list
+    # (ordered by file_path, line).
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_comment_smells_pr_current
+            ON comment_smells (pr_id, is_current, repair_enabled, file_path, line, smell_type)
+    """)
+    # Dashboard smell time series
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_comment_smells_pr_created
+            ON comment_smells (pr_id, created_at, smell_type)
+    """)
+    # archive_file_smells / delete_comment_smells_for_file
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_comment_smells_pr_file
+            ON comment_smells (pr_id, file_path, is_current)
+    """)
+    # get_llm_latency_percentile
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_llm_calls_repo_latency
+            ON llm_calls (repo_internal_id, cache_hit, latency_ms)
+    """)
+
+
+# A comment_smells row contributes to the rollup row of its repository, the
+# day it was created and its smell type. Shared by the rollup triggers.
+_ROLLUP_KEY = """
+    repo_internal_id = (SELECT repo_internal_id FROM pull_requests WHERE id = {row}.pr_id)
+    AND day = date({row}.created_at)
+    AND smell_type = {row}.smell_type
+"""
+_ROLLUP_ENSURE = """
+    INSERT OR IGNORE INTO smell_rollup_daily (repo_internal_id, day, smell_type)
+    SELECT repo_internal_id, date({row}.created_at), {row}.smell_type
+      FROM pull_requests WHERE id = {row}.pr_id;
+"""
+_ROLLUP_ADD = """
+    UPDATE smell_rollup_daily
+       SET reported_count       = reported_count + {sign},
+           current_count        = current_count + {sign} * ({row}.is_current = 1),
+           current_repair_count = current_repair_count
+                                  + {sign} * ({row}.is_current = 1 AND {row}.repair_enabled = 1)
+     WHERE """ + _ROLLUP_KEY + ";"
+
+
+def _create_rollup_triggers(c, table):
+    """Create the triggers keeping smell_rollup_daily in step with `table`."""
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_comment_smells_rollup_insert
+        AFTER INSERT ON {table}
+        BEGIN
+            {_ROLLUP_ENSURE.format(row="NEW")}
+            {_ROLLUP_ADD.format(row="NEW", sign="1")}
+        END
+    """)
+    # Remove the old contribution and add the new one; when the key did not
+    # change the two cancel out on reported_count.
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_comment_smells_rollup_update
+        AFTER UPDATE OF is_current, repair_enabled, smell_type, created_at, pr_id ON {table}
+        BEGIN
+            {_ROLLUP_ADD.format(row="OLD", sign="-1")}
+            {_ROLLUP_ENSURE.format(row="NEW")}
+            {_ROLLUP_ADD.format(row="NEW", sign="1")}
+        END
+    """)
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_comment_smells_rollup_delete
+        AFTER DELETE ON {table}
+        BEGIN
+            {_ROLLUP_ADD.format(row="OLD", sign="-1")}
+        END
+    """)
+
+
+def _create_smell_rollups(c):
+    """Version 3: per-day smell rollups for the dashboard, maintained by triggers."""
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS smell_rollup_daily (
+            repo_internal_id     TEXT    NOT NULL,
+            day                  TEXT    NOT NULL,     -- date(comment_smells.created_at)
+            smell_type           TEXT    NOT NULL,
+            reported_count       INTEGER NOT NULL DEFAULT 0,
+            current_count        INTEGER NOT NULL DEFAULT 0,
+            current_repair_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (repo_internal_id, day, smell_type)
+        ) WITHOUT ROWID
+    """)
+    _create_rollup_triggers(c, "comment_smells")
+    # Backfill from the rows recorded so far.
+    c.execute("""
+        INSERT INTO smell_rollup_daily (
+            repo_internal_id, day, smell_type,
+            reported_count, current_count, current_repair_count
+        )
+        SELECT pr.repo_internal_id,
+               date(cs.created_at),
+               cs.smell_type,
+               COUNT(*),
+               SUM(cs.is_current = 1),
+               SUM(cs.is_current = 1 AND cs.repair_enabled = 1)
+          FROM comment_smells cs
+          JOIN pull_requests pr ON cs.pr_id = pr.id
+         GROUP BY pr.repo_internal_id, date(cs.created_at), cs.smell_type
+    """)
+
+
+def _add_keyset_indexes(c):
+    """Version 4: indexes matching the keyset order of the paginated list APIs."""
+    # get_pull_requests_page: ORDER BY created_at DESC, id DESC
+    c.execute("DROP INDEX IF EXISTS idx_pull_requests_repo_created")
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_pull_requests_repo_created_id
+            ON pull_requests (repo_internal_id, created_at, id, pr_number, title, smell_count, status)
+    """)
+    # get_comment_smells_page: ORDER BY file_path, line, id
+    c.execute("DROP INDEX IF EXISTS idx_comment_smells_pr_current")
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_comment_smells_pr_current_page
+            ON comment_smells (pr_id, is_current, repair_enabled, file_path, line, id)
+    """)
+
+
+# Columns copied unchanged from comment_smells into comment_smells_store.
+_SMELL_COLUMNS = (
+    "id", "pr_id", "file_path", "commit_sha", "line", "side", "smell_type",
+    "github_comment_id", "github_comment_url", "status", "is_current",
+    "repair_enabled", "created_at",
+)
+# Text columns moved to content_blobs, referenced by <name>_hash.
+_SMELL_TEXT_COLUMNS = ("associated_code", "comment_body", "suggestion")
+
+
+def _move_smell_text_to_blobs(c):
+    """
+    Version 5: store associated_code, comment_body and suggestion once per
+    distinct value, compressed, in content_blobs. comment_smells becomes a
+    view over comment_smells_store so existing SELECTs keep working; writes
+    go to comment_smells_store.
+
+    The view decodes the text with blob_text(), a Python function registered
+    by get_connection(); other SQLite clients cannot read it (see
+    database/content_blobs.py, whose connect() registers it for scripts).
+    """
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS content_blobs (
+            hash  BLOB    PRIMARY KEY,   -- BLAKE2b-128 of the UTF-8 text
+            codec TEXT    NOT NULL CHECK(codec IN ('raw', 'zlib')),
+            size  INTEGER NOT NULL,      -- uncompressed bytes
+            data  BLOB    NOT NULL
+        ) WITHOUT ROWID
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS comment_smells_store (
+            id                    INTEGER PRIMARY KEY AUTOINCREMENT,
+            pr_id                 INTEGER NOT NULL
+                                    REFERENCES pull_requests(id),
+            file_path             TEXT    NOT NULL,
+            commit_sha            TEXT    NOT NULL,
+            line                  INTEGER NOT NULL,
+            side                  TEXT    NOT NULL
+                                    CHECK(side IN ('LEFT','RIGHT')),
+            smell_type            TEXT    NOT NULL
+                                    CHECK(smell_type IN (
+                                        'Misleading',
+                                        'Obvious',
+                                        'Commented out code',
+                                        'Irrelevant',
+                                        'Task',
+                                        'Too much info',
+                                        'Beautification',
+                                        'Nonlocal info',
+                                        'Vague',
+                                        'Not a smell'
+                                    )),
+            associated_code_hash  BLOB    NOT NULL REFERENCES content_blobs(hash),
+            comment_body_hash     BLOB    NOT NULL REFERENCES content_blobs(hash),
+            suggestion_hash       BLOB             REFERENCES content_blobs(hash),
+            github_comment_id     INTEGER UNIQUE,
+            github_comment_url    TEXT,
+            status                TEXT    NOT NULL DEFAULT 'Pending'
+                                    CHECK(status IN ('Accepted','Rejected','Pending')),
+            is_current            BOOLEAN NOT NULL DEFAULT 1,
+            repair_enabled        BOOLEAN NOT NULL DEFAULT 1,
+            created_at            DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Copy the existing rows in batches, ids included. The rollup triggers
+    # are created afterwards so the copy is not counted twice.
+    read = c.connection.cursor()
+    read.execute(f"""
+        SELECT {", ".join(_SMELL_COLUMNS + _SMELL_TEXT_COLUMNS)}
+          FROM comment_smells
+         ORDER BY id
+    """)
+    columns = _SMELL_COLUMNS + tuple(f"{name}_hash" for name in _SMELL_TEXT_COLUMNS)
+    while True:
+        rows = read.fetchmany(1000)
+        if not rows:
+            break
+        width = len(_SMELL_COLUMNS)
+        hashes = [
+            store_blobs(c, [row[width + i] for row in rows])
+            for i in range(len(_SMELL_TEXT_COLUMNS))
+        ]
+        c.executemany(
+            f"""
+            INSERT INTO comment_smells_store ({", ".join(columns)})
+            VALUES ({", ".join("?" * len(columns))})
+            """,
+            [row[:width] + tuple(h[n] for h in hashes) for n, row in enumerate(rows)]
+        )
+    read.close()
+    # Keep AUTOINCREMENT from reusing ids of rows deleted before the move.
+    c.execute("DELETE FROM sqlite_sequence WHERE name = 'comment_smells_store'")
+    c.execute("""
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'comment_smells_store', seq FROM sqlite_sequence WHERE name = 'comment_smells'
+    """)
+
+    # Dropping the table also drops its indexes and rollup triggers.
+    c.execute("DROP TABLE comment_smells")
+    c.execute(f"""
+        CREATE VIEW comment_smells AS
+        SELECT {", ".join("s." + name for name in _SMELL_COLUMNS)},
+               blob_text(code.codec, code.data)       AS associated_code,
+               blob_text(body.codec, body.data)       AS comment_body,
+               blob_text(sugg.codec, sugg.data)       AS suggestion
+          FROM comment_smells_store s
+          LEFT JOIN content_blobs code ON code.hash = s.associated_code_hash
+          LEFT JOIN content_blobs body ON body.hash = s.comment_body_hash
+          LEFT JOIN content_blobs sugg ON sugg.hash = s.suggestion_hash
+    """)
+    # Let UPDATE/DELETE on the view reach the store. Text columns can only be
+    # changed through comment_smells_store (they need new content_blobs rows).
+    mutable = [name for name in _SMELL_COLUMNS if name != "id"]
+    c.execute(f"""
+        CREATE TRIGGER comment_smells_view_update
+        INSTEAD OF UPDATE ON comment_smells
+        BEGIN
+            SELECT RAISE(ABORT, 'smell text is read-only through the comment_smells view')
+             WHERE NEW.associated_code IS NOT OLD.associated_code
+                OR NEW.comment_body IS NOT OLD.comment_body
+                OR NEW.suggestion IS NOT OLD.suggestion
+                OR NEW.id IS NOT OLD.id;
+            UPDATE comment_smells_store
+               SET {", ".join(f"{name} = NEW.{name}" for name in mutable)}
+             WHERE id = OLD.id;
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER comment_smells_view_delete
+        INSTEAD OF DELETE ON comment_smells
+        BEGIN
+            DELETE FROM comment_smells_store WHERE id = OLD.id;
+        END
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_comment_smells_pr_current_page
+            ON comment_smells_store (pr_id, is_current, repair_enabled, file_path, line, id)
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_comment_smells_pr_file
+            ON comment_smells_store (pr_id, file_path, is_current)
+    """)
+    _create_rollup_triggers(c, "comment_smells_store")
+
+
+def _add_retention_policies(c):
+    """
+    Version 6: per-repo retention of archived smells (database/retention.py).
+    retention_days NULL means the RETENTION_DAYS default from config.
+    """
+    c.execute("ALTER TABLE repo_settings ADD COLUMN retention_days INTEGER")
+    c.execute("""
+        ALTER TABLE repo_settings ADD COLUMN retention_mode TEXT NOT NULL DEFAULT 'archive'
+            CHECK(retention_mode IN ('archive', 'delete', 'keep'))
+    """)
+    c.execute("""
+        ALTER TABLE smell_rollup_daily ADD COLUMN archived_count INTEGER NOT NULL DEFAULT 0
+    """)
+
+
+def _create_cache_versions(c):
+    """Version 7: counters that tell other processes a lookup cache is stale (database/cache.py)."""
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name    TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+
+def _smell_fingerprint_v8(file_path, comment_body, associated_code):
+    """
+    Frozen copy of comments_files.smell_fingerprint as of version 8, so this
+    migration keeps producing the same values if that function changes.
+    """
+    def digest(data):
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    comment = " ".join(comment_body.split())
+    context = "\n".join(line.rstrip() for line in associated_code.splitlines())
+    return digest("\0".join(
+        (file_path, comment, digest(context.encode("utf-8")).hex())
+    ).encode("utf-8"))
+
+
+def _add_smell_fingerprints(c):
+    """
+    Version 8: fingerprint of each smell's comment and code context, used to
+    carry unchanged comments forward when a PR is re-analyzed. Filled in for
+    the current smells; archived ones are never matched again.
+    """
+    c.execute("ALTER TABLE comment_smells_store ADD COLUMN fingerprint BLOB")
+    last_id = 0
+    while True:
+        c.execute("""
+            SELECT id, file_path, comment_body, associated_code
+              FROM comment_smells
+             WHERE is_current = 1
+               AND id > ?
+             ORDER BY id
+             LIMIT 1000
+        """, (last_id,))
+        rows = c.fetchall()
+        if not rows:
+            break
+        c.executemany(
+            "UPDATE comment_smells_store SET fingerprint = ? WHERE id = ?",
+            [(_smell_fingerprint_v8(path, body or "", code or ""), smell_id)
+             for smell_id, path, body, code in rows]
+        )
+        last_id = rows[-1][0]
+
+
+def _add_analysis_runs(c):
+    """
+    Version 9: skip files whose blob was already analyzed under the same
+    settings. repo_settings.settings_version is bumped by every settings
+    change, files.settings_version records the version a blob was analyzed
+    with, and analysis_runs keeps how many files each event could skip.
+    """
+    c.execute("ALTER TABLE repo_settings ADD COLUMN settings_version INTEGER NOT NULL DEFAULT 1")
+    c.execute("ALTER TABLE files ADD COLUMN settings_version INTEGER")
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_files_pr_settings_version
+            ON files (pr_id, settings_version)
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_runs (
+            id               INTEGER PRIMARY KEY AUTOINCREMENT,
+            pr_id            INTEGER NOT NULL REFERENCES pull_requests(id),
+            repo_internal_id TEXT    NOT NULL,
+            commit_sha       TEXT,
+            settings_version INTEGER NOT NULL,
+            files_total      INTEGER NOT NULL,
+            files_skipped    INTEGER NOT NULL,
+            created_at       TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_analysis_runs_repo
+            ON analysis_runs (repo_internal_id, created_at)
+    """)
+
+
+def _add_github_cleanup(c):
+    """
+    Version 10: GitHub comments of archived smells are deleted by
+    web_ui/comment_cleanup.py. github_cleanup is NULL (nothing to do),
+    'pending', 'deleted' or 'failed' (gave up after too many attempts).
+    """
+    c.execute("""
+        ALTER TABLE comment_smells_store ADD COLUMN github_cleanup TEXT
+            CHECK(github_cleanup IN ('pending', 'deleted', 'failed'))
+    """)
+    c.execute("""
+        ALTER TABLE comment_smells_store ADD COLUMN github_cleanup_attempts INTEGER NOT NULL DEFAULT 0
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_comment_smells_cleanup_pending
+            ON comment_smells_store (pr_id)
+         WHERE github_cleanup = 'pending'
+    """)
+    # Comments of smells archived before this version are still on GitHub.
+    # Only those of open PRs are queued: on closed and merged PRs they are
+    # the review history (with any replies) and are left alone.
+    c.execute("""
+        UPDATE comment_smells_store
+           SET github_cleanup = 'pending'
+         WHERE is_current = 0
+           AND github_comment_id IS NOT NULL
+           AND pr_id IN (SELECT id FROM pull_requests WHERE status IS NOT 'closed')
+    """)
+
+
+def _add_analysis_budgets(c):
+    """
+    Version 11: per-event limits on the files, comments and model calls of
+    an analysis (NULL means the config default), and analysis_skips, the
+    files and comments an event left out because of them.
+    """
+    c.execute("ALTER TABLE repo_settings ADD COLUMN max_files INTEGER")
+    c.execute("ALTER TABLE repo_settings ADD COLUMN max_comments INTEGER")
+    c.execute("ALTER TABLE repo_settings ADD COLUMN max_llm_calls INTEGER")
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_skips (
+            id               INTEGER PRIMARY KEY AUTOINCREMENT,
+            pr_id            INTEGER NOT NULL REFERENCES pull_requests(id),
+            repo_internal_id TEXT    NOT NULL,
+            commit_sha       TEXT,
+            file_path        TEXT    NOT NULL,
+            line             INTEGER,             -- NULL when the whole file was skipped
+            reason           TEXT    NOT NULL
+                               CHECK(reason IN ('max_files', 'max_comments', 'max_llm_calls')),
+            priority         REAL,
+            created_at       TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_analysis_skips_pr
+            ON analysis_skips (pr_id, created_at)
+    """)
+
+
+def _add_analysis_jobs(c):
+    """
+    Version 12: analysis_jobs, one row per analyzed PR head, so an event cut
+    short by its deadline or a crash can be resumed from its stored payload.
+    """
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_jobs (
+            id               INTEGER PRIMARY KEY AUTOINCREMENT,
+            repo_internal_id TEXT    NOT NULL,
+            pr_number        INTEGER NOT NULL,
+            head_sha         TEXT    NOT NULL,
+            payload          TEXT    NOT NULL,    -- the webhook payload, as JSON
+            status           TEXT    NOT NULL DEFAULT 'running'
+                               CHECK(status IN ('running', 'done', 'expired', 'failed', 'superseded')),
+            attempts         INTEGER NOT NULL DEFAULT 1,
+            files_total      INTEGER,
+            files_done       INTEGER NOT NULL DEFAULT 0,
+            error            TEXT,
+            started_at       TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at       TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (repo_internal_id, pr_number, head_sha)
+        )
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_analysis_jobs_status
+            ON analysis_jobs (status, updated_at)
+    """)
+
+
+def _add_file_filters(c):
+    """
+    Version 13: per-repository skip globs for vendored and generated files
+    (a JSON list, NULL for none), and what skipping them saved per event.
+    """
+    c.execute("ALTER TABLE repo_settings ADD COLUMN skip_globs TEXT")
+    c.execute("ALTER TABLE analysis_runs ADD COLUMN files_filtered INTEGER NOT NULL DEFAULT 0")
+    c.execute("ALTER TABLE analysis_runs ADD COLUMN bytes_avoided INTEGER NOT NULL DEFAULT 0")
+    c.execute("ALTER TABLE analysis_runs ADD COLUMN calls_avoided INTEGER NOT NULL DEFAULT 0")
+
+
+def _add_archived_at(c):
+    """
+    Version 14: when a smell was archived, which is what retention counts
+    from. A trigger sets it whenever is_current drops to 0, so every code
+    path that archives smells records it. Smells archived before this
+    version keep NULL, and retention falls back to their created_at.
+    """
+    c.execute("ALTER TABLE comment_smells_store ADD COLUMN archived_at TIMESTAMP")
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_comment_smells_archived_at
+        AFTER UPDATE OF is_current ON comment_smells_store
+        WHEN OLD.is_current = 1 AND NEW.is_current = 0
+        BEGIN
+            UPDATE comment_smells_store SET archived_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+        END
+    """)
+
+
+MIGRATIONS = [
+    (1, "baseline tables", _create_baseline_tables),
+    (2, "hot query indexes", _add_hot_query_indexes),
+    (3, "smell rollups", _create_smell_rollups),
+    (4, "keyset pagination indexes", _add_keyset_indexes),
+    (5, "content-addressed smell text", _move_smell_text_to_blobs),
+    (6, "retention policies", _add_retention_policies),
+    (7, "cache versions", _create_cache_versions),
+    (8, "smell fingerprints", _add_smell_fingerprints),
+    (9, "analysis runs", _add_analysis_runs),
+    (10, "github comment cleanup", _add_github_cleanup),
+    (11, "analysis budgets", _add_analysis_budgets),
+    (12, "analysis jobs", _add_analysis_jobs),
+    (13, "file filters", _add_file_filters),
+    (14, "smell archive time", _add_archived_at),
+]
+
+# Queries that run on every webhook or page view. check_hot_query_plans()
+# fails if any of them needs a full table scan.
+HOT_QUERIES = {
+    "get_repository_by_full_name": (
+        "SELECT internal_id, github_repo_id, repo_full_name, installation_id "
+        "FROM repositories WHERE repo_full_name = ?", ("o/r",)),
+    "get_repository_by_internal_id": (
+        "SELECT internal_id, github_repo_id, repo_full_name, installation_id "
+        "FROM repositories WHERE internal_id = ?", ("x",)),
+    "get_repositories_by_installation": (
+        "SELECT internal_id, github_repo_id, repo_full_name "
+        "FROM repositories WHERE installation_id = ?", ("1",)),
+    "get_repo_settings": (
+        "SELECT create_issues, enabled_smells, double_iteration, settings_version, "
+        "max_files, max_comments, max_llm_calls, skip_globs "
+        "FROM repo_settings WHERE repo_internal_id = ?", ("x",)),
+    "dashboard_total_prs": (
+        "SELECT COUNT(*) FROM pull_requests WHERE repo_internal_id = ?", ("x",)),
+    "dashboard_total_smells": (
+        "SELECT COALESCE(SUM(current_repair_count), 0) FROM smell_rollup_daily "
+        "WHERE repo_internal_id = ?", ("x",)),
+    "dashboard_most_common_smell": (
+        "SELECT smell_type, SUM(current_count) AS cnt FROM smell_rollup_daily "
+        "WHERE repo_internal_id = ? GROUP BY smell_type HAVING cnt > 0 "
+        "ORDER BY cnt DESC LIMIT 1", ("x",)),
+    "dashboard_pr_list": (
+        "SELECT pr_number, title, smell_count, created_at, status FROM pull_requests "
+        "WHERE repo_internal_id = ? ORDER BY created_at DESC", ("x",)),
+    "dashboard_smell_series": (
+        "SELECT strftime('%Y-%m-01', day) AS bucket_start, smell_type, SUM(reported_count) "
+        "FROM smell_rollup_daily WHERE repo_internal_id = ? "
+        "AND day >= COALESCE(?, '') AND day <= COALESCE(?, '9999-12-31') AND reported_count > 0 "
+        "GROUP BY bucket_start, smell_type ORDER BY bucket_start", ("x", None, None)),
+    "rollup_trigger_key": (
+        "UPDATE smell_rollup_daily SET current_count = current_count + 1 "
+        "WHERE repo_internal_id = ? AND day = ? AND smell_type = ?", ("x", "2024-01-01", "Vague")),
+    "api_pull_requests_page": (
+        "SELECT created_at, id, pr_number, title, status, smell_count FROM pull_requests "
+        "WHERE repo_internal_id = ? AND (created_at, id) < (?, ?) "
+        "ORDER BY created_at DESC, id DESC LIMIT ?", ("x", "2025-01-01", 1, 51)),
+    "api_comment_smells_page": (
+        "SELECT file_path, line, id, smell_type, comment_body, suggestion FROM comment_smells "
+        "WHERE pr_id = ? AND is_current = 1 AND repair_enabled = 1 "
+        "AND (file_path, line, id) > (?, ?, ?) ORDER BY file_path, line, id LIMIT ?",
+        (1, "a", 1, 1, 101)),
+    "api_comment_smell": (
+        "SELECT associated_code FROM comment_smells WHERE id = ? AND pr_id = ?", (1, 1)),
+    "pr_analysis_pr": (
+        "SELECT id, title, smell_count, status, created_at, updated_at FROM pull_requests "
+        "WHERE repo_internal_id = ? AND pr_number = ?", ("x", 1)),
+    "pr_analysis_smells": (
+        "SELECT id, file_path, line, smell_type, associated_code, comment_body, suggestion, "
+        "status, github_comment_url FROM comment_smells "
+        "WHERE pr_id = ? AND is_current = 1 AND repair_enabled = 1 ORDER BY file_path, line", (1,)),
+    "archive_file_smells": (
+        "UPDATE comment_smells_store SET is_current = 0 "
+        "WHERE pr_id = ? AND file_path = ? AND is_current = 1", (1, "a")),
+    "current_file_smells": (
+        "SELECT s.id, s.fingerprint, s.line, s.comment_body_hash FROM pull_requests pr "
+        "JOIN comment_smells_store s ON s.pr_id = pr.id "
+        "WHERE pr.repo_internal_id = ? AND pr.pr_number = ? AND s.file_path = ? "
+        "AND s.is_current = 1 ORDER BY s.id", ("x", 1, "a")),
+    "analyzed_blob_shas": (
+        "SELECT f.file_path, f.blob_sha FROM pull_requests pr JOIN files f ON f.pr_id = pr.id "
+        "WHERE pr.repo_internal_id = ? AND pr.pr_number = ? AND f.settings_version = ? "
+        "ORDER BY f.id", ("x", 1, 1)),
+    "pending_comment_cleanups": (
+        "SELECT s.id, s.github_comment_id, s.github_cleanup_attempts, r.repo_full_name, r.installation_id "
+        "FROM comment_smells_store s JOIN pull_requests pr ON pr.id = s.pr_id "
+        "JOIN repositories r ON r.internal_id = pr.repo_internal_id "
+        "WHERE s.github_cleanup = 'pending' AND s.pr_id = ? ORDER BY s.id LIMIT ?", (1, 1000)),
+    "recalculate_smell_count": (
+        "SELECT COUNT(*) FROM comment_smells_store "
+        "WHERE pr_id = ? AND is_current = 1 AND repair_enabled = 1", (1,)),
+    "llm_usage_by_pr": (
+        "SELECT pr_number, COUNT(*) FROM llm_calls WHERE repo_internal_id = ? "
+        "GROUP BY pr_number", ("x",)),
+    "llm_latency_percentile": (
+        "SELECT latency_ms FROM llm_calls WHERE repo_internal_id = ? AND cache_hit = 0 "
+        "ORDER BY latency_ms LIMIT 1 OFFSET ?", ("x", 0)),
+}
+
+# "SCAN <table>" (optionally "USING [COVERING] INDEX") means every row is visited.
+SCAN_RE = re.compile(r"^SCAN (?!CONSTANT ROW)")
+
+
+def get_schema_version():
+    """Return the highest applied migration version (0 for a new database)."""
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version    INTEGER PRIMARY KEY,
+                name       TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        c.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        version, = c.fetchone()
+    return version
+
+
+def migrate():
+    """
+    Apply every pending migration in order. Returns the list of applied versions.
+    """
+    current = get_schema_version()
+    applied = []
+    for version, name, apply in MIGRATIONS:
+        if version <= current:
+            continue
+        with transaction() as c:
+            apply(c)
+            c.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)", (version, name))
+        print(f"Applied schema migration {version}: {name}")
+        applied.append(version)
+    return applied
+
+
+def check_hot_query_plans():
+    """
+    Run EXPLAIN QUERY PLAN on every registered hot query.
+    Returns a list of (query name, plan detail) for each full scan found.
+    """
+    violations = []
+    with get_connection() as conn:
+        c = conn.cursor()
+        for name, (sql, params) in HOT_QUERIES.items():
+            c.execute("EXPLAIN QUERY PLAN " + sql, params)
+            for row in c.fetchall():
+                detail = row[3]
+                if SCAN_RE.match(detail):
+                    violations.append((name, detail))
+    return violations
+
+
+def main():
+    migrate()
+    if "--check" in sys.argv[1:]:
+        violations = check_hot_query_plans()
+        for name, detail in violations:
+            print(f"FULL SCAN in {name}: {detail}")
+        if violations:
+            sys.exit(1)
+        print(f"All {len(HOT_QUERIES)} hot queries use indexes.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,4 @@
-import sqlite3
-from config import DB_PATH
+from database.connection import get_connection
 
 def add_or_update_pull_request(
     repo_internal_id: str,
@@ -12,7 +11,7 @@ def add_or_update_pull_request(
     Insert a new pull_request row or update the existing one.
     Returns the local `id` (PR PK) for use in other tables.
     """
-    with sqlite3.connect(DB_PATH) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         # Upsert the PR row
         c.execute("""
@@ -35,3 +34,75 @@ def add_or_update_pull_request(
         """, (repo_internal_id, pr_number))
         pr_id, = c.fetchone()
     return pr_id
+
+
+# Columns the PR list API may return; `id` and `created_at` are always
+# selected because they form the pagination cursor.
+PULL_REQUEST_FIELDS = ("id", "pr_number", "title", "status", "smell_count", "created_at", "updated_at")
+
+
+def get_pull_request(repo_internal_id, pr_number):
+    """
+    Return the pull request row (id, title, status, smell_count, created_at,
+    updated_at) as a dict, or None if it is not recorded.
+    """
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT id, title, smell_count, status, created_at, updated_at
+              FROM pull_requests
+             WHERE repo_internal_id = ?
+               AND pr_number        = ?
+        """, (repo_internal_id, pr_number))
+        row = c.fetchone()
+    if row is None:
+        return None
+    return {
+        "id": row[0],
+        "title": row[1],
+        "smell_count": row[2],
+        "status": row[3],
+        "created_at": row[4],
+        "updated_at": row[5],
+    }
+
+
+def get_pull_requests_page(repo_internal_id, after=None, limit=50, fields=PULL_REQUEST_FIELDS):
+    """
+    Return one page of a repository's pull requests, newest first.
+
+    Args:
+        repo_internal_id: Repository internal ID.
+        after: (created_at, id) of the last row of the previous page, or None.
+        limit: Maximum number of rows.
+        fields: Columns to return (subset of PULL_REQUEST_FIELDS); raises
+            ValueError for unknown names.
+
+    Returns:
+        (rows, next_after): a list of dicts and the cursor of the next page
+        (None when this is the last page).
+    """
+    unknown = set(fields) - set(PULL_REQUEST_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    columns = ["created_at", "id"] + [f for f in fields if f not in ("created_at", "id")]
+    where = "repo_internal_id = ?"
+    params = [repo_internal_id]
+    if after is not None:
+        where += " AND (created_at, id) < (?, ?)"
+        params.extend(after)
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute(f"""
+            SELECT {", ".join(columns)}
+              FROM pull_requests
+             WHERE {where}
+             ORDER BY created_at DESC, id DESC
+             LIMIT ?
+        """, (*params, limit + 1))
+        rows = [dict(zip(columns, row)) for row in c.fetchall()]
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = (rows[-1]["created_at"], rows[-1]["id"])
+    return [{f: row[f] for f in fields} for row in rows], next_after
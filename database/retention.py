@@ -0,0 +1,301 @@
+"""
+Retention and compaction of archived (is_current = 0) comment smells.
+
+For every repository, smells archived longer ago than its retention period
+are removed from comment_smells_store in batches. Smells whose GitHub
+comment is still to be deleted (github_cleanup 'pending') are kept until
+web_ui/comment_cleanup.py has dealt with them. Their counts are first folded
+into smell_rollup_daily (archived_count), so the dashboard history is kept.
+Depending on the repository's retention_mode the rows are
+    archive  exported to RETENTION_ARCHIVE_DIR/<repo>/smells-<time>.jsonl.gz, then deleted
+    delete   deleted
+    keep     left alone
+Afterwards unreferenced content_blobs are dropped and the freed pages are
+returned to the filesystem with an incremental VACUUM.
+
+Run it periodically (e.g. a daily cron job):
+    python -m database.retention
+    python -m database.retention --repo REPO_INTERNAL_ID --dry-run
+    python -m database.retention --set-policy REPO_INTERNAL_ID --days 30 --mode delete
+"""
+import argparse
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+import config
+from config import DB_PATH
+from database.connection import get_connection, transaction
+from database.settings import get_retention_policies, set_retention_policy, RETENTION_MODES
+
+ARCHIVE_DIR = getattr(config, "RETENTION_ARCHIVE_DIR", "archives")
+BATCH_SIZE = getattr(config, "RETENTION_BATCH_SIZE", 5000)
+
+EXPORT_COLUMNS = (
+    "id", "pr_id", "file_path", "commit_sha", "line", "side", "smell_type",
+    "associated_code", "comment_body", "suggestion", "github_comment_id",
+    "github_comment_url", "status", "repair_enabled", "created_at",
+)
+
+
+def _database_bytes():
+    """Size of the database file plus its WAL on disk."""
+    total = 0
+    for suffix in ("", "-wal"):
+        try:
+            total += os.path.getsize(DB_PATH + suffix)
+        except OSError:
+            pass
+    return total
+
+
+def _best_of(c, sql, params_list, runs=3):
+    """Best wall time (ms) of running `sql` once for every params tuple."""
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        for params in params_list:
+            c.execute(sql, params).fetchall()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def time_history_queries(repo_ids):
+    """
+    Time the queries whose cost grows with archived history: the per-type
+    history aggregate of each repository and the per-file lookups used when
+    a file is re-analyzed. Returns {query name: milliseconds}.
+    """
+    c = get_connection().cursor()
+    pairs = c.execute(f"""
+        SELECT DISTINCT s.pr_id, s.file_path
+          FROM comment_smells_store s
+          JOIN pull_requests pr ON s.pr_id = pr.id
+         WHERE pr.repo_internal_id IN ({", ".join("?" * len(repo_ids))})
+         LIMIT 200
+    """, repo_ids).fetchall()
+    timings = {
+        "history_by_type": _best_of(c, """
+            SELECT s.smell_type, COUNT(*)
+              FROM comment_smells_store s
+              JOIN pull_requests pr ON s.pr_id = pr.id
+             WHERE pr.repo_internal_id = ?
+             GROUP BY s.smell_type
+        """, [(repo_id,) for repo_id in repo_ids]),
+        "file_smells_lookup": _best_of(c, """
+            SELECT COUNT(*)
+              FROM comment_smells_store
+             WHERE pr_id = ?
+               AND file_path = ?
+        """, pairs),
+    }
+    c.close()
+    return timings
+
+
+def _select_batch(c, repo_internal_id, cutoff, limit):
+    """Fill the temp table retention_batch with up to `limit` expired row ids."""
+    c.execute("CREATE TEMP TABLE IF NOT EXISTS retention_batch (id INTEGER PRIMARY KEY)")
+    c.execute("DELETE FROM retention_batch")
+    c.execute("""
+        INSERT INTO retention_batch (id)
+        SELECT s.id
+          FROM pull_requests pr
+          JOIN comment_smells_store s ON s.pr_id = pr.id
+         WHERE pr.repo_internal_id = ?
+           AND s.is_current = 0
+           AND COALESCE(s.archived_at, s.created_at) < ?
+           AND (s.github_cleanup IS NULL OR s.github_cleanup IN ('deleted', 'failed'))
+         LIMIT ?
+    """, (repo_internal_id, cutoff, limit))
+    return c.rowcount
+
+
+def compact_repository(policy, dry_run=False, batch_size=BATCH_SIZE, archive_dir=ARCHIVE_DIR):
+    """
+    Remove the archived smells of one repository that are past its retention
+    period. Returns a dict with the number of rows removed and the export
+    file (or None).
+    """
+    repo_id = policy["repo_internal_id"]
+    result = {"repo_internal_id": repo_id, "rows": 0, "export_file": None}
+    if policy["retention_mode"] == "keep":
+        return result
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=policy["retention_days"])).strftime("%Y-%m-%d %H:%M:%S")
+
+    if dry_run:
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute("""
+                SELECT COUNT(*)
+                  FROM pull_requests pr
+                  JOIN comment_smells_store s ON s.pr_id = pr.id
+                 WHERE pr.repo_internal_id = ?
+                   AND s.is_current = 0
+                   AND COALESCE(s.archived_at, s.created_at) < ?
+                   AND (s.github_cleanup IS NULL OR s.github_cleanup IN ('deleted', 'failed'))
+            """, (repo_id, cutoff))
+            result["rows"], = c.fetchone()
+        return result
+
+    export = None
+    try:
+        while True:
+            # Each batch is its own short write transaction so webhooks are
+            # not blocked for the whole run. The export is written before the
+            # delete commits: a crash can duplicate lines, never lose rows.
+            with transaction() as c:
+                if not _select_batch(c, repo_id, cutoff, batch_size):
+                    break
+                if policy["retention_mode"] == "archive":
+                    if export is None:
+                        os.makedirs(os.path.join(archive_dir, repo_id), exist_ok=True)
+                        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+                        result["export_file"] = os.path.join(archive_dir, repo_id, f"smells-{stamp}.jsonl.gz")
+                        export = gzip.open(result["export_file"], "at", encoding="utf-8")
+                    c.execute(f"""
+                        SELECT {", ".join(EXPORT_COLUMNS)}
+                          FROM comment_smells
+                         WHERE id IN (SELECT id FROM retention_batch)
+                    """)
+                    for row in c.fetchall():
+                        export.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=str) + "\n")
+                    export.flush()
+
+                # Fold the rows into the rollups: the delete trigger lowers
+                # reported_count, so add them back as archived.
+                c.execute("""
+                    SELECT date(created_at), smell_type, COUNT(*)
+                      FROM comment_smells_store
+                     WHERE id IN (SELECT id FROM retention_batch)
+                     GROUP BY date(created_at), smell_type
+                """)
+                folded = c.fetchall()
+                c.execute("DELETE FROM comment_smells_store WHERE id IN (SELECT id FROM retention_batch)")
+                result["rows"] += c.rowcount
+                c.executemany("""
+                    UPDATE smell_rollup_daily
+                       SET reported_count = reported_count + ?,
+                           archived_count = archived_count + ?
+                     WHERE repo_internal_id = ?
+                       AND day = ?
+                       AND smell_type = ?
+                """, [(count, count, repo_id, day, smell_type) for day, smell_type, count in folded])
+    finally:
+        if export is not None:
+            export.close()
+    return result
+
+
+def collect_orphan_blobs():
+    """Delete content_blobs no longer referenced by any smell. Returns the count."""
+    with transaction() as c:
+        c.execute("""
+            DELETE FROM content_blobs
+             WHERE hash NOT IN (SELECT associated_code_hash FROM comment_smells_store)
+               AND hash NOT IN (SELECT comment_body_hash FROM comment_smells_store)
+               AND hash NOT IN (SELECT suggestion_hash FROM comment_smells_store
+                                 WHERE suggestion_hash IS NOT NULL)
+        """)
+        return c.rowcount
+
+
+def vacuum():
+    """
+    Return free pages to the filesystem. The first run switches the database
+    to auto_vacuum=INCREMENTAL, which needs one full VACUUM; later runs only
+    do an incremental one. Returns True if a full VACUUM was needed.
+    """
+    conn = get_connection()
+    if conn.in_transaction:
+        conn.commit()
+    full = conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2
+    if full:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    else:
+        # The sqlite3 module steps a row-less PRAGMA only once, and each step
+        # of incremental_vacuum frees a single page, so repeat it per page.
+        # A fresh cursor per call so no statement is left active at COMMIT.
+        free_pages, = conn.execute("PRAGMA freelist_count").fetchone()
+        conn.execute("BEGIN IMMEDIATE")
+        for _ in range(free_pages):
+            conn.execute("PRAGMA incremental_vacuum")
+        conn.commit()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return full
+
+
+def run_compaction(repo_internal_id=None, dry_run=False, benchmark=True):
+    """
+    Apply the retention policies (of one repository, or all) and print a
+    report of the rows removed, the disk space reclaimed and the timing of
+    the history queries before and after. Returns the report dict.
+    """
+    policies = get_retention_policies()
+    if repo_internal_id is not None:
+        policies = [p for p in policies if p["repo_internal_id"] == repo_internal_id]
+    repo_ids = [p["repo_internal_id"] for p in policies]
+    report = {"repositories": [], "blobs": 0, "full_vacuum": False}
+
+    conn = get_connection()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    report["bytes_before"] = _database_bytes()
+    report["timings_before"] = time_history_queries(repo_ids) if benchmark and repo_ids else {}
+
+    for policy in policies:
+        result = compact_repository(policy, dry_run=dry_run)
+        result["retention_days"] = policy["retention_days"]
+        result["retention_mode"] = policy["retention_mode"]
+        report["repositories"].append(result)
+
+    if not dry_run:
+        report["blobs"] = collect_orphan_blobs()
+        report["full_vacuum"] = vacuum()
+    report["bytes_after"] = _database_bytes()
+    report["timings_after"] = time_history_queries(repo_ids) if benchmark and repo_ids else {}
+
+    verb = "Would remove" if dry_run else "Removed"
+    for result in report["repositories"]:
+        line = (f"{result['repo_internal_id']}: {verb} {result['rows']} archived smells "
+                f"(mode {result['retention_mode']}, older than {result['retention_days']} days)")
+        if result["export_file"]:
+            line += f" -> {result['export_file']}"
+        print(line)
+    if not dry_run:
+        print(f"Dropped {report['blobs']} unreferenced content blobs"
+              + (" (converted to incremental auto_vacuum with a full VACUUM)" if report["full_vacuum"] else ""))
+    reclaimed = report["bytes_before"] - report["bytes_after"]
+    print(f"Database size: {report['bytes_before'] / 1e6:.2f} MB -> {report['bytes_after'] / 1e6:.2f} MB "
+          f"(reclaimed {reclaimed / 1e6:.2f} MB)")
+    for name, before in report["timings_before"].items():
+        after = report["timings_after"][name]
+        print(f"{name}: {before:.2f} ms -> {after:.2f} ms")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact archived comment smells.")
+    parser.add_argument("--repo", default=None, help="only compact this repository")
+    parser.add_argument("--dry-run", action="store_true", help="only count what would be removed")
+    parser.add_argument("--no-benchmark", action="store_true", help="skip timing the history queries")
+    parser.add_argument("--set-policy", metavar="REPO_INTERNAL_ID", default=None,
+                        help="set the retention policy of a repository instead of compacting")
+    parser.add_argument("--days", type=int, default=None, help="retention period for --set-policy")
+    parser.add_argument("--mode", choices=RETENTION_MODES, default="archive", help="retention mode for --set-policy")
+    args = parser.parse_args()
+
+    from database.database import init_db
+    init_db()
+    if args.set_policy:
+        set_retention_policy(args.set_policy, args.days, args.mode)
+        print(f"Retention policy of {args.set_policy}: {args.mode}, "
+              f"{args.days if args.days is not None else 'default'} days")
+        return
+    run_compaction(args.repo, dry_run=args.dry_run, benchmark=not args.no_benchmark)
+
+
+if __name__ == "__main__":
+    main()
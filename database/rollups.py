@@ -0,0 +1,151 @@
+"""
+Per-day smell rollups used by the repository dashboard.
+
+smell_rollup_daily holds one row per (repo, day, smell_type) and is kept up
+to date by triggers on comment_smells_store (created by migration 3 on
+comment_smells and moved by migration 5, which turned comment_smells into a
+view over comment_smells_store and content_blobs; see
+database/migrations.py):
+    reported_count        every smell row created that day (current or archived)
+    current_count         rows that are still is_current = 1
+    current_repair_count  rows that are is_current = 1 and repair_enabled = 1
+    archived_count        rows deleted by the retention job (database/retention.py),
+                          still included in reported_count
+
+Usage:
+    python -m database.rollups --rebuild [--repo REPO_INTERNAL_ID]
+"""
+import argparse
+from database.connection import get_connection, transaction
+
+REBUILD_SQL = """
+    INSERT INTO smell_rollup_daily (
+        repo_internal_id, day, smell_type,
+        reported_count, current_count, current_repair_count
+    )
+    SELECT pr.repo_internal_id,
+           date(cs.created_at),
+           cs.smell_type,
+           COUNT(*),
+           SUM(cs.is_current = 1),
+           SUM(cs.is_current = 1 AND cs.repair_enabled = 1)
+      FROM comment_smells_store cs
+      JOIN pull_requests pr ON cs.pr_id = pr.id
+     WHERE {where}
+     GROUP BY pr.repo_internal_id, date(cs.created_at), cs.smell_type
+    ON CONFLICT (repo_internal_id, day, smell_type) DO UPDATE
+       SET reported_count       = reported_count + excluded.reported_count,
+           current_count        = excluded.current_count,
+           current_repair_count = excluded.current_repair_count
+"""
+
+
+def rebuild_rollups(c, repo_internal_id=None):
+    """
+    Recompute smell_rollup_daily from comment_smells_store (for one repo, or
+    all). Counts of rows removed by the retention job (archived_count) are
+    kept. `c` is a cursor inside a transaction.
+    """
+    if repo_internal_id is None:
+        where, params = "1", ()
+    else:
+        where, params = "pr.repo_internal_id = ?", (repo_internal_id,)
+    c.execute(f"""
+        UPDATE smell_rollup_daily
+           SET reported_count = archived_count,
+               current_count = 0,
+               current_repair_count = 0
+         WHERE {where.replace("pr.", "")}
+    """, params)
+    c.execute(REBUILD_SQL.format(where=where), params)
+    c.execute(f"""
+        DELETE FROM smell_rollup_daily
+         WHERE {where.replace("pr.", "")}
+           AND reported_count = 0
+           AND current_count = 0
+    """, params)
+
+
+def get_smell_totals(repo_internal_id):
+    """
+    Return (total_smells, most_common_smell) for the dashboard cards:
+    current repair-enabled smells, and the most frequent current smell type.
+    """
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT COALESCE(SUM(current_repair_count), 0)
+              FROM smell_rollup_daily
+             WHERE repo_internal_id = ?
+        """, (repo_internal_id,))
+        total_smells, = c.fetchone()
+        c.execute("""
+            SELECT smell_type, SUM(current_count) AS cnt
+              FROM smell_rollup_daily
+             WHERE repo_internal_id = ?
+             GROUP BY smell_type
+            HAVING cnt > 0
+             ORDER BY cnt DESC
+             LIMIT 1
+        """, (repo_internal_id,))
+        row = c.fetchone()
+    return total_smells, (row[0] if row else None)
+
+
+# SQL expressions mapping a rollup day to the first day of its bucket.
+BUCKET_EXPRESSIONS = {
+    "day": "day",
+    "week": "date(day, '-6 days', 'weekday 1')",    # Monday on or before `day`
+    "month": "strftime('%Y-%m-01', day)",
+}
+
+
+def get_smell_series(repo_internal_id, start=None, end=None, bucket="day"):
+    """
+    Return reported smell counts per bucket and smell type for a repository.
+
+    Args:
+        repo_internal_id: Repository internal ID.
+        start, end: Optional inclusive bounds as 'YYYY-MM-DD' strings.
+        bucket: 'day', 'week' (starting Monday) or 'month'.
+
+    Returns:
+        [{"date": first day of the bucket, "smell_type": str, "count": int}, ...]
+        ordered by date.
+    """
+    bucket_expr = BUCKET_EXPRESSIONS[bucket]
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute(f"""
+            SELECT {bucket_expr} AS bucket_start, smell_type, SUM(reported_count)
+              FROM smell_rollup_daily
+             WHERE repo_internal_id = ?
+               AND day >= COALESCE(?, '')
+               AND day <= COALESCE(?, '9999-12-31')
+               AND reported_count > 0
+             GROUP BY bucket_start, smell_type
+             ORDER BY bucket_start
+        """, (repo_internal_id, start, end))
+        rows = c.fetchall()
+    return [{"date": row[0], "smell_type": row[1], "count": row[2]} for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the dashboard rollup tables.")
+    parser.add_argument("--rebuild", action="store_true", help="recompute rollups from comment_smells_store")
+    parser.add_argument("--repo", default=None, help="only rebuild this repository")
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.print_help()
+        return
+    from database.database import init_db
+    init_db()
+    with transaction() as c:
+        rebuild_rollups(c, args.repo)
+        c.execute("SELECT COUNT(*) FROM smell_rollup_daily")
+        rows, = c.fetchone()
+    print(f"Rebuilt smell rollups ({rows} rows).")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,33 @@
-import sqlite3
-from config import DB_PATH
+from database.connection import get_connection
+from database.cache import settings_cache, bump_cache_version
 import json
+import config
+
+DEFAULT_ENABLED_SMELLS = ["Misleading", "Obvious", "Commented out code", "Irrelevant", "Task", "Too much info", "Beautification", "Nonlocal info", "Vague"]
+# Archived smells older than this many days are compacted (see database/retention.py).
+DEFAULT_RETENTION_DAYS = getattr(config, "RETENTION_DAYS", 90)
+RETENTION_MODES = ("archive", "delete", "keep")
+# Per-event analysis budgets used when a repository has not set its own.
+DEFAULT_MAX_FILES = getattr(config, "MAX_FILES_PER_EVENT", 100)
+DEFAULT_MAX_COMMENTS = getattr(config, "MAX_COMMENTS_PER_EVENT", 200)
+DEFAULT_MAX_LLM_CALLS = getattr(config, "MAX_LLM_CALLS_PER_EVENT", 600)
 
 def get_repo_settings(repo_internal_id):
     """
-    Fetch repo settings, with sensible defaults.
-    Returns dict: { create_issues: bool, enabled_smells: list, double_iteration: bool }
+    Fetch repo settings, with sensible defaults (cached).
+    Returns dict: { create_issues: bool, enabled_smells: list, double_iteration: bool,
+                    settings_version: int, max_files: int, max_comments: int,
+                    max_llm_calls: int, skip_globs: list }
     """
-    with sqlite3.connect(DB_PATH) as conn:
+    return settings_cache.get(repo_internal_id, lambda: _load_repo_settings(repo_internal_id))
+
+def _load_repo_settings(repo_internal_id):
+    """Read repo settings from the database (see get_repo_settings)."""
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("""
-            SELECT create_issues, enabled_smells, double_iteration
+            SELECT create_issues, enabled_smells, double_iteration, settings_version,
+                   max_files, max_comments, max_llm_calls, skip_globs
               FROM repo_settings
              WHERE repo_internal_id = ?
         """, (repo_internal_id,))
@@ -19,25 +36,42 @@ def get_repo_settings(repo_internal_id):
     if not row:
         return {
             "create_issues": True,
-            "enabled_smells": ["Misleading", "Obvious", "Commented out code", "Irrelevant", "Task", "Too much info", "Beautification", "Nonlocal info", "Vague"],
-            "double_iteration": False
+            "enabled_smells": list(DEFAULT_ENABLED_SMELLS),
+            "double_iteration": False,
+            "settings_version": 0,
+            "max_files": DEFAULT_MAX_FILES,
+            "max_comments": DEFAULT_MAX_COMMENTS,
+            "max_llm_calls": DEFAULT_MAX_LLM_CALLS,
+            "skip_globs": []
         }
 
-    create_issues, enabled_json, double_it = row
+    create_issues, enabled_json, double_it, settings_version, max_files, max_comments, max_llm_calls, skip_globs = row
     return {
         "create_issues": bool(create_issues),
         "enabled_smells": json.loads(enabled_json),
-        "double_iteration": bool(double_it)
+        "double_iteration": bool(double_it),
+        "settings_version": settings_version,
+        "max_files": max_files if max_files is not None else DEFAULT_MAX_FILES,
+        "max_comments": max_comments if max_comments is not None else DEFAULT_MAX_COMMENTS,
+        "max_llm_calls": max_llm_calls if max_llm_calls is not None else DEFAULT_MAX_LLM_CALLS,
+        "skip_globs": json.loads(skip_globs) if skip_globs else []
     }
 
-def update_repo_settings(repo_internal_id, create_issues, enabled_smells, double_iteration=False):
+def update_repo_settings(repo_internal_id, create_issues, enabled_smells, double_iteration=False,
+                         max_files=None, max_comments=None, max_llm_calls=None, skip_globs=None):
     """
     Update the repository settings for a given repository.
     'create_issues' is a boolean.
     'enabled_smells' is a list of strings.
+    'max_files', 'max_comments' and 'max_llm_calls' limit a single PR event;
+    None means the config default.
+    'skip_globs' is a list of globs for files to skip as vendored or
+    generated (see web_ui/file_filters.py), in addition to the defaults.
+    Bumps settings_version, so files analyzed under the old settings are
+    analyzed again.
     """
     settings_json = json.dumps(enabled_smells)
-    with sqlite3.connect(DB_PATH) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute(
             """
@@ -45,13 +79,82 @@ def update_repo_settings(repo_internal_id, create_issues, enabled_smells, double
                 repo_internal_id,
                 create_issues,
                 enabled_smells,
-                double_iteration
-            ) VALUES (?, ?, ?, ?)
+                double_iteration,
+                max_files,
+                max_comments,
+                max_llm_calls,
+                skip_globs
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ON CONFLICT(repo_internal_id) DO UPDATE SET
               create_issues = excluded.create_issues,
               enabled_smells = excluded.enabled_smells,
-              double_iteration = excluded.double_iteration
+              double_iteration = excluded.double_iteration,
+              max_files = excluded.max_files,
+              max_comments = excluded.max_comments,
+              max_llm_calls = excluded.max_llm_calls,
+              skip_globs = excluded.skip_globs,
+              settings_version = repo_settings.settings_version + 1
+            """,
+            (repo_internal_id, 1 if create_issues else 0, settings_json, 1 if double_iteration else 0,
+             max_files, max_comments, max_llm_calls, json.dumps(skip_globs) if skip_globs else None)
+        )
+        bump_cache_version(c, "repo_settings")
+        conn.commit()
+    settings_cache.invalidate(repo_internal_id)
+
+
+def get_retention_policies():
+    """
+    Return the retention policy of every repository as a list of dicts:
+    { repo_internal_id, repo_full_name, retention_days, retention_mode }.
+    Repositories without settings get the defaults.
+    """
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT r.internal_id, r.repo_full_name, s.retention_days, s.retention_mode
+              FROM repositories r
+              LEFT JOIN repo_settings s ON s.repo_internal_id = r.internal_id
+        """)
+        rows = c.fetchall()
+    return [
+        {
+            "repo_internal_id": row[0],
+            "repo_full_name": row[1],
+            "retention_days": row[2] if row[2] is not None else DEFAULT_RETENTION_DAYS,
+            "retention_mode": row[3] or "archive",
+        }
+        for row in rows
+    ]
+
+
+def set_retention_policy(repo_internal_id, retention_days=None, retention_mode="archive"):
+    """
+    Set how long archived smells of a repository are kept, and what happens
+    to them afterwards: 'archive' (export to a compressed file, then delete),
+    'delete', or 'keep'. retention_days None means DEFAULT_RETENTION_DAYS.
+    A row created here keeps settings_version 0, the version of the default
+    analysis settings, so analyzed files are not analyzed again.
+    """
+    if retention_mode not in RETENTION_MODES:
+        raise ValueError(f"retention_mode must be one of {', '.join(RETENTION_MODES)}")
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            """
+            INSERT INTO repo_settings (
+                repo_internal_id,
+                enabled_smells,
+                retention_days,
+                retention_mode,
+                settings_version
+            ) VALUES (?, ?, ?, ?, 0)
+            ON CONFLICT(repo_internal_id) DO UPDATE SET
+              retention_days = excluded.retention_days,
+              retention_mode = excluded.retention_mode
             """,
-            (repo_internal_id, 1 if create_issues else 0, settings_json, 1 if double_iteration else 0)
+            (repo_internal_id, json.dumps(DEFAULT_ENABLED_SMELLS), retention_days, retention_mode)
         )
-        conn.commit()
\ No newline at end of file
+        bump_cache_version(c, "repo_settings")
+        conn.commit()
+    settings_cache.invalidate(repo_internal_id)
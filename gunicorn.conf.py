@@ -0,0 +1,14 @@
+# Gunicorn picks this file up automatically from the working directory.
+import os
+
+
+def post_worker_init(worker):
+    """Create the AI client once per worker, before it accepts requests."""
+    if os.environ.get("SMELL_SOLVER_WARM_AI", "1") != "1":
+        return
+    try:
+        from ai_content.main import get_ai_processor
+        get_ai_processor()
+        worker.log.info("AI client warmed up")
+    except Exception as e:
+        worker.log.warning("Could not warm up AI client: %s", e)
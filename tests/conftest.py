@@ -0,0 +1,82 @@
+import os
+import sys
+import types
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config.py and ai_content/ai_config.py hold secrets and are not in the
+# repository; the tests only need their names to exist.
+try:
+    import config  # noqa: F401
+except ImportError:
+    config = types.ModuleType("config")
+    config.DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "unused.db")
+    config.GITHUB_APP_ID = 1
+    config.GITHUB_PRIVATE_KEY = ""
+    config.NGROK_PORT = 5000
+    sys.modules["config"] = config
+try:
+    import ai_content.ai_config  # noqa: F401
+except ImportError:
+    import ai_content
+    ai_config = types.ModuleType("ai_content.ai_config")
+    ai_config.GPT_40_MINI_ENDPOINT = ""
+    ai_config.GPT_40_MINI_API_KEY = ""
+    ai_config.GPT_40_MINI_DEPLOYMENT = ""
+    sys.modules["ai_content.ai_config"] = ai_config
+    ai_content.ai_config = ai_config
+
+import database.connection as connection
+from database.comments_files import smell_fingerprint
+from database.migrations import migrate
+from ai_content.usage import set_recording_enabled
+
+# Usage records are written by a background thread whose connection would
+# outlive each test's database.
+set_recording_enabled(False)
+
+
+@pytest.fixture
+def empty_db(tmp_path, monkeypatch):
+    """Point the pooled connection at a new, empty database file."""
+    connection.close_connection()
+    monkeypatch.setattr(connection, "DB_PATH", str(tmp_path / "smells.db"))
+    yield str(tmp_path / "smells.db")
+    connection.close_connection()
+
+
+@pytest.fixture
+def db(empty_db):
+    """A new database with every migration applied."""
+    migrate()
+    return empty_db
+
+
+def add_pull_request(repo_internal_id, pr_number, status="open", created_at="2025-01-01 00:00:00"):
+    """Insert a pull request (and its repository, if new); returns its id."""
+    with connection.transaction() as c:
+        c.execute(
+            "INSERT OR IGNORE INTO repositories (internal_id, repo_full_name, installation_id) VALUES (?, ?, '1')",
+            (repo_internal_id, f"owner/{repo_internal_id}")
+        )
+        c.execute(
+            "INSERT INTO pull_requests (repo_internal_id, pr_number, title, status, created_at) VALUES (?, ?, ?, ?, ?)",
+            (repo_internal_id, pr_number, f"PR {pr_number}", status, created_at)
+        )
+        return c.lastrowid
+
+
+def smell_record(file_path, line, comment_body="// comment", associated_code="code();", **fields):
+    """A smells entry for add_pr_analysis_results."""
+    record = {
+        "file_path": file_path,
+        "commit_sha": "head",
+        "line": line,
+        "smell_type": "Obvious",
+        "associated_code": associated_code,
+        "comment_body": comment_body,
+        "fingerprint": smell_fingerprint(file_path, comment_body, associated_code),
+    }
+    record.update(fields)
+    return record
@@ -0,0 +1,52 @@
+from ai_content.usage import max_llm_calls_per_comment
+from web_ui.file_utils import comment_priority, parse_added_lines
+
+PATCH = """\
+@@ -1,4 +1,5 @@
+ class A {
+-  int x;
++  // the counter
++  int count;
+
+\\ No newline at end of file
+@@ -10,2 +11,3 @@
+ void f() {
++  // TODO handle overflow
+ }"""
+
+
+def _comment(line, text, end=None):
+    return {"computed_start_line": line, "computed_end_line": end or line, "comment": text}
+
+
+def test_added_lines_are_the_plus_lines_of_the_new_file():
+    assert parse_added_lines(PATCH) == {2, 3, 12}
+    assert parse_added_lines(None) == set()
+
+
+def test_comments_on_added_lines_rank_first():
+    added = parse_added_lines(PATCH)
+    comments = [
+        _comment(11, "// unchanged context comment that is rather long but was not touched at all"),
+        _comment(2, "// the counter"),
+        _comment(12, "// TODO handle overflow"),
+        _comment(20, "// TODO outside the change"),
+    ]
+    ranked = sorted(comments, key=lambda comment: comment_priority(comment, added), reverse=True)
+    assert [comment["computed_start_line"] for comment in ranked] == [12, 2, 20, 11]
+
+
+def test_a_multiline_comment_counts_if_any_of_its_lines_was_added():
+    added = parse_added_lines(PATCH)
+    assert comment_priority(_comment(1, "/* a */", end=2), added) >= 10
+    assert comment_priority(_comment(4, "/* a */", end=5), added) < 10
+
+
+def test_length_bonus_is_capped():
+    assert comment_priority(_comment(1, "x" * 10000), set()) == 3
+
+
+def test_calls_reserved_per_comment():
+    assert max_llm_calls_per_comment(False, speculative=False) == 2
+    assert max_llm_calls_per_comment(False, speculative=True) == 3
+    assert max_llm_calls_per_comment(True, speculative=True) == 5
@@ -0,0 +1,70 @@
+from web_ui.github_utils import patches_from_diff_lines
+
+DIFF = """\
+diff --git a/src/A.java b/src/A.java
+index 1111111..2222222 100644
+--- a/src/A.java
++++ b/src/A.java
+@@ -1,2 +1,3 @@
+ class A {
++  // added
+ }
+diff --git a/src/Gone.java b/src/Gone.java
+deleted file mode 100644
+index 3333333..0000000
+--- a/src/Gone.java
++++ /dev/null
+@@ -1 +0,0 @@
+-class Gone {}
+diff --git a/src/New.java b/src/New.java
+new file mode 100644
+index 0000000..4444444
+--- /dev/null
++++ b/src/New.java
+@@ -0,0 +1 @@
++class New {}
+\\ No newline at end of file
+diff --git a/src/Other.java b/src/Other.java
+index 5555555..6666666 100644
+--- a/src/Other.java
++++ b/src/Other.java
+@@ -1 +1 @@
+-class Other {}
++class Other { }
+"""
+
+
+def test_patches_of_the_requested_files():
+    patches = patches_from_diff_lines(DIFF.splitlines(), ["src/A.java", "src/Gone.java", "src/New.java"])
+    assert patches == {
+        "src/A.java": "@@ -1,2 +1,3 @@\n class A {\n+  // added\n }",
+        "src/Gone.java": "@@ -1 +0,0 @@\n-class Gone {}",
+        "src/New.java": "@@ -0,0 +1 @@\n+class New {}\n\\ No newline at end of file",
+    }
+
+
+def test_other_files_are_not_kept():
+    assert patches_from_diff_lines(DIFF.splitlines(), ["src/Other.java"]) == {
+        "src/Other.java": "@@ -1 +1 @@\n-class Other {}\n+class Other { }",
+    }
+
+
+def test_reading_stops_after_the_last_requested_file():
+    read = []
+
+    def lines():
+        for line in DIFF.splitlines():
+            read.append(line)
+            yield line
+
+    patches_from_diff_lines(lines(), ["src/A.java"])
+    assert read[-1] == "diff --git a/src/Gone.java b/src/Gone.java"
+
+
+def test_files_without_hunks_have_no_patch():
+    diff = [
+        "diff --git a/bin.png b/bin.png",
+        "index 1111111..2222222 100644",
+        "Binary files a/bin.png and b/bin.png differ",
+    ]
+    assert patches_from_diff_lines(diff, ["bin.png"]) == {}
@@ -0,0 +1,71 @@
+import shutil
+import subprocess
+import pytest
+from web_ui.git_mirror import GitMirror
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+
+def _git(repo, *args):
+    return subprocess.run(
+        ["git", "-C", str(repo), "-c", "user.name=t", "-c", "user.email=t@example.com", *args],
+        capture_output=True, check=True, text=True
+    ).stdout.strip()
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    """A GitMirror over a local repository with a base commit and a PR head."""
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    _git(repo, "init", "--quiet")
+    (repo / "Keep.java").write_text("class Keep {}\n")
+    (repo / "Gone.java").write_text("class Gone {}\n")
+    (repo / "Edit.java").write_text("class Edit {\n}\n")
+    (repo / "Old name.java").write_text("class Moved {\n  int a;\n  int b;\n  int c;\n}\n")
+    _git(repo, "add", "-A")
+    _git(repo, "commit", "--quiet", "-m", "base")
+    base = _git(repo, "rev-parse", "HEAD")
+
+    (repo / "Gone.java").unlink()
+    (repo / "Edit.java").write_text("class Edit {\n  // new comment\n}\n")
+    (repo / "Old name.java").rename(repo / "New name.java")
+    (repo / "Added.java").write_text("class Added {}\n")
+    _git(repo, "add", "-A")
+    _git(repo, "commit", "--quiet", "-m", "head")
+    head = _git(repo, "rev-parse", "HEAD")
+
+    git_mirror = GitMirror("owner/repo")
+    git_mirror.git_dir = str(repo / ".git")
+    yield git_mirror, repo, base, head
+    if git_mirror._cat_file is not None:
+        git_mirror._cat_file.close()
+
+
+def test_changed_files_match_the_compare_api(mirror):
+    git_mirror, repo, base, head = mirror
+    files = {file["filename"]: file for file in git_mirror.changed_files(base, head)}
+    assert set(files) == {"Added.java", "Edit.java", "Gone.java", "New name.java"}
+    assert {name: file["status"] for name, file in files.items()} == {
+        "Added.java": "added",
+        "Edit.java": "modified",
+        "Gone.java": "removed",
+        "New name.java": "renamed",
+    }
+    assert files["New name.java"]["previous_filename"] == "Old name.java"
+    assert files["Edit.java"]["sha"] == _git(repo, "rev-parse", f"{head}:Edit.java")
+    # A removed file keeps the sha of its last blob
+    assert files["Gone.java"]["sha"] == _git(repo, "rev-parse", f"{base}:Gone.java")
+    assert all(file["diff_base"] == base for file in files.values())
+
+
+def test_patches_and_blobs(mirror):
+    git_mirror, repo, base, head = mirror
+    files = git_mirror.changed_files(base, head)
+    git_mirror.add_patches(base, head, files)
+    patches = {file["filename"]: file["patch"] for file in files}
+    assert patches["Edit.java"] == "@@ -1,2 +1,3 @@\n class Edit {\n+  // new comment\n }"
+    assert patches["Gone.java"] == "@@ -1 +0,0 @@\n-class Gone {}"
+    assert patches["New name.java"] is None  # renamed without changes
+    assert git_mirror.blob(f"{head}:Edit.java") == b"class Edit {\n  // new comment\n}\n"
+    assert git_mirror.blob(f"{head}:Gone.java") is None
@@ -0,0 +1,72 @@
+import difflib
+from database.comments_files import smell_fingerprint
+from database.content_blobs import content_hash
+from web_ui.github_event_handler import reconcile_comments
+from web_ui.line_mapping import LineMap
+
+
+def _patch(old, new, context=3):
+    """The compare API "patch" of a file: the unified diff without file headers."""
+    return "\n".join(list(difflib.unified_diff(old, new, lineterm="", n=context))[2:])
+
+
+def test_lines_follow_insertions_deletions_and_rewrites():
+    old = [f"line {i}" for i in range(1, 41)]
+    new = old[:4] + ["added 1", "added 2"] + old[4:9] + old[10:20] + ["rewritten"] + old[21:]
+    line_map = LineMap(_patch(old, new))
+    for number, text in enumerate(old, 1):
+        expected = new.index(text) + 1 if text in new else None
+        assert line_map.map_line(number) == expected, number
+
+
+def test_empty_sides_of_a_hunk():
+    inserted = LineMap("@@ -5,0 +6,3 @@\n+a\n+b\n+c")
+    assert (inserted.map_line(5), inserted.map_line(6)) == (5, 9)
+    deleted = LineMap("@@ -6,2 +5,0 @@\n-a\n-b")
+    assert (deleted.map_line(5), deleted.map_line(6), deleted.map_line(8)) == (5, None, 6)
+
+
+def test_unknown_patch_maps_nothing():
+    assert LineMap(None).map_line(3) is None
+    assert LineMap("").map_line(3) == 3
+
+
+def _comment(line, text, code):
+    return {"computed_start_line": line, "comment": text, "associated_code": code}
+
+
+def _stored(smell_id, line, text, code):
+    return (smell_id, smell_fingerprint("A.java", text, code), line, content_hash(text.encode("utf-8")))
+
+
+def test_unchanged_comments_are_carried_with_their_new_line():
+    previous = [_stored(1, 3, "// keep", "a();")]
+    new_comments, carried, vanished = reconcile_comments(previous, "A.java", [_comment(5, "// keep", "a();")])
+    assert new_comments == []
+    assert carried == [(1, 5, smell_fingerprint("A.java", "// keep", "a();"), "a();")]
+    assert vanished == []
+
+
+def test_changed_code_is_carried_by_line_only_with_a_line_map():
+    previous = [_stored(1, 3, "// keep", "a();")]
+    comments = [_comment(5, "// keep", "b();")]
+    new_comments, carried, vanished = reconcile_comments(previous, "A.java", comments)
+    assert (len(new_comments), carried, vanished) == (1, [], [1])
+
+    line_map = LineMap("@@ -0,0 +1,2 @@\n+x\n+y")
+    comments = [_comment(5, "// keep", "b();")]
+    new_comments, carried, vanished = reconcile_comments(previous, "A.java", comments, line_map)
+    # The carried smell takes the fingerprint and code of the new head
+    assert carried == [(1, 5, smell_fingerprint("A.java", "// keep", "b();"), "b();")]
+    assert (new_comments, vanished) == ([], [])
+
+
+def test_rewritten_comments_vanish():
+    previous = [_stored(1, 3, "// old text", "a();"), _stored(2, 7, "// gone", "c();")]
+    line_map = LineMap("@@ -3 +3 @@\n-// old text\n+// new text")
+    new_comments, carried, vanished = reconcile_comments(
+        previous, "A.java", [_comment(3, "// new text", "a();")], line_map
+    )
+    assert [comment["comment"] for comment in new_comments] == ["// new text"]
+    assert carried == []
+    assert sorted(vanished) == [1, 2]
@@ -0,0 +1,120 @@
+from database.connection import get_connection, transaction
+from database.comments_files import smell_fingerprint
+from database.migrations import MIGRATIONS, _create_baseline_tables, check_hot_query_plans, get_schema_version, migrate
+
+LONG_CODE = "int total = 0;\n" * 20 + "// add the values\nfor (int v : values) total += v;\n"
+
+# (pr, is_current, github_comment_id, smell_type, associated_code, comment_body, suggestion)
+SMELLS = [
+    ("open", 1, 101, "Obvious", LONG_CODE, "// add the values", "for (int v : values) total += v;"),
+    ("open", 0, 102, "Vague", LONG_CODE, "// stuff", None),
+    ("open", 1, None, "Task", "x++;", "// TODO  remove", None),
+    ("closed", 0, 103, "Obvious", "y++;", "// increment y", "y++;"),
+]
+
+
+def _create_legacy_database():
+    """The database init_db created before versioned migrations, with some history."""
+    with transaction() as c:
+        _create_baseline_tables(c)
+        c.execute("INSERT INTO repositories (internal_id, repo_full_name, installation_id) VALUES ('r', 'o/r', '1')")
+        c.execute("INSERT INTO pull_requests (id, repo_internal_id, pr_number, status, created_at) "
+                  "VALUES (1, 'r', 1, 'open', '2025-01-01')")
+        c.execute("INSERT INTO pull_requests (id, repo_internal_id, pr_number, status, created_at) "
+                  "VALUES (2, 'r', 2, 'closed', '2025-01-01')")
+        c.executemany(
+            """
+            INSERT INTO comment_smells (
+                pr_id, file_path, commit_sha, line, side, is_current, github_comment_id,
+                smell_type, associated_code, comment_body, suggestion, created_at
+            ) VALUES (?, 'src/A.java', 'h1', ?, 'RIGHT', ?, ?, ?, ?, ?, ?, '2025-01-02 10:00:00')
+            """,
+            [(1 if pr == "open" else 2, n + 1, *rest) for n, (pr, *rest) in enumerate(SMELLS)]
+        )
+
+
+def _smells():
+    with get_connection() as conn:
+        return conn.execute("""
+            SELECT v.id, v.is_current, v.smell_type, v.associated_code, v.comment_body,
+                   v.suggestion, s.fingerprint, s.github_cleanup
+              FROM comment_smells v
+              JOIN comment_smells_store s ON s.id = v.id
+             ORDER BY v.id
+        """).fetchall()
+
+
+def test_migrates_a_legacy_database(empty_db):
+    _create_legacy_database()
+
+    assert migrate() == [version for version, _, _ in MIGRATIONS]
+    assert get_schema_version() == MIGRATIONS[-1][0]
+    assert migrate() == []
+
+    rows = _smells()
+    assert [row[2:6] for row in rows] == [tuple(smell[3:]) for smell in SMELLS]
+
+
+def test_smell_text_is_stored_once_per_value(empty_db):
+    _create_legacy_database()
+    migrate()
+    with get_connection() as conn:
+        codecs = dict(conn.execute("SELECT codec, COUNT(*) FROM content_blobs GROUP BY codec").fetchall())
+    distinct = {text for smell in SMELLS for text in smell[4:] if text is not None}
+    assert sum(codecs.values()) == len(distinct)
+    assert codecs["zlib"] == 1  # only LONG_CODE is worth compressing
+
+
+def test_fingerprints_are_backfilled_for_current_smells(empty_db):
+    _create_legacy_database()
+    migrate()
+    for smell_id, is_current, _, code, body, _, fingerprint, _ in _smells():
+        if is_current:
+            assert fingerprint == smell_fingerprint("src/A.java", body, code)
+        else:
+            assert fingerprint is None
+
+
+def test_cleanup_backfill_only_queues_open_pull_requests(empty_db):
+    _create_legacy_database()
+    migrate()
+    assert [row[7] for row in _smells()] == [None, "pending", None, None]
+
+
+def test_rollups_are_backfilled_and_kept_in_step(empty_db):
+    _create_legacy_database()
+    migrate()
+    totals = "SELECT SUM(reported_count), SUM(current_count) FROM smell_rollup_daily WHERE repo_internal_id = 'r'"
+    with get_connection() as conn:
+        assert conn.execute(totals).fetchone() == (4, 2)
+        conn.execute("UPDATE comment_smells_store SET is_current = 0 WHERE id = 1")
+        assert conn.execute(totals).fetchone() == (4, 1)
+
+
+def test_archiving_records_archived_at(empty_db):
+    _create_legacy_database()
+    migrate()
+    with get_connection() as conn:
+        conn.execute("UPDATE comment_smells_store SET is_current = 0 WHERE id = 1")
+        archived = dict(conn.execute("SELECT id, archived_at FROM comment_smells_store").fetchall())
+    assert archived[1] is not None
+    assert archived[2] is None  # archived before version 14
+
+
+def test_new_smell_ids_follow_the_legacy_ones(empty_db):
+    _create_legacy_database()
+    with get_connection() as conn:
+        conn.execute("DELETE FROM comment_smells WHERE id = 4")
+    migrate()
+    with transaction() as c:
+        c.execute("""
+            INSERT INTO comment_smells_store (
+                pr_id, file_path, commit_sha, line, side, smell_type,
+                associated_code_hash, comment_body_hash
+            ) VALUES (1, 'src/A.java', 'h2', 9, 'RIGHT', 'Vague', x'00', x'00')
+        """)
+        assert c.lastrowid == 5
+
+
+def test_hot_queries_use_indexes(db):
+    assert check_hot_query_plans() == []
@@ -0,0 +1,65 @@
+import ai_content.near_duplicate_cache as near_duplicate_cache
+from ai_content.near_duplicate_cache import (
+    BAND_BITS, BITS, NearDuplicateCache, _to_signed, _to_unsigned, bands_of, fingerprint, hamming_distance, simhash
+)
+
+
+def test_simhash_is_deterministic_and_fits_sqlite():
+    features = [("increment", 1), ("counter", 1), ("increment counter", 2)]
+    value = simhash(features)
+    assert value == simhash(list(reversed(features)))
+    assert 0 <= value < 1 << BITS
+    assert -(1 << (BITS - 1)) <= _to_signed(value) < 1 << (BITS - 1)
+    assert _to_unsigned(_to_signed(value)) == value
+
+
+def test_similar_features_are_close():
+    words = [(f"word{i}", 1) for i in range(40)]
+    near = simhash(words[:-1] + [("other", 1)])
+    far = simhash([(f"else{i}", 1) for i in range(40)])
+    assert hamming_distance(simhash(words), near) < hamming_distance(simhash(words), far)
+
+
+def test_hamming_distance_accepts_signed_values():
+    assert hamming_distance(_to_signed(1 << 63), 0) == 1
+    assert hamming_distance(-1, 0) == BITS
+
+
+def test_bands_cover_the_fingerprint():
+    value = _to_signed(0x0123456789ABCDEF)
+    bands = bands_of(value)
+    assert len(bands) == BITS // BAND_BITS
+    assert sum(band << (i * BAND_BITS) for i, band in enumerate(bands)) == _to_unsigned(value)
+
+
+def test_one_flipped_bit_keeps_three_bands():
+    value = 0x0123456789ABCDEF
+    shared = [a == b for a, b in zip(bands_of(value), bands_of(value ^ (1 << 40)))]
+    assert shared.count(True) == 3
+
+
+def test_identifier_names_do_not_change_the_fingerprint():
+    assert fingerprint("i += 1; // increment i", "increment i") == fingerprint("j += 1; // increment j", "increment j")
+    assert fingerprint("x = max(lo, min(v, hi));", "the max") != fingerprint("x = max(lo, min(v, hi));", "the min")
+
+
+def test_labels_are_reused_after_enough_confirmations(db, monkeypatch):
+    monkeypatch.setattr(near_duplicate_cache, "record_llm_call", lambda **kwargs: None)
+    cache = NearDuplicateCache(min_confirmations=2, enabled=True)
+    code, comment = "count += 1;", "increment count"
+    cache.record(code, comment, "Obvious")
+    assert cache.lookup(code, comment) is None
+    cache.record("total += 1;", "increment total", "Obvious")
+    assert cache.lookup(code, comment) == "Obvious"
+    assert cache.stats["inserts"] == 1
+
+
+def test_conflicting_label_resets_confirmations(db, monkeypatch):
+    monkeypatch.setattr(near_duplicate_cache, "record_llm_call", lambda **kwargs: None)
+    cache = NearDuplicateCache(min_confirmations=1, enabled=True)
+    code, comment = "count += 1;", "increment count"
+    cache.record(code, comment, "Obvious")
+    cache.record(code, comment, "Vague")
+    assert cache.lookup(code, comment) is None
+    cache.record(code, comment, "Vague")
+    assert cache.lookup(code, comment) == "Vague"
@@ -0,0 +1,53 @@
+import pytest
+from conftest import add_pull_request, smell_record
+from database.comments_files import add_pr_analysis_results, get_comment_smells_page
+from database.pull_requests import get_pull_requests_page
+
+
+def _all_pages(get_page, limit):
+    rows, after, pages = [], None, 0
+    while True:
+        page, after = get_page(after, limit)
+        rows += page
+        pages += 1
+        if after is None:
+            return rows, pages
+
+
+def test_pull_requests_newest_first_across_equal_timestamps(db):
+    for number in range(1, 8):
+        # Three PRs share each timestamp, so pages must break ties by id
+        add_pull_request("r", number, created_at=f"2025-01-0{(number + 2) // 3} 00:00:00")
+    add_pull_request("other", 1)
+
+    rows, pages = _all_pages(lambda after, limit: get_pull_requests_page("r", after, limit), 2)
+    assert pages == 4
+    assert [row["pr_number"] for row in rows] == [7, 6, 5, 4, 3, 2, 1]
+
+
+def test_pull_request_fields(db):
+    add_pull_request("r", 1)
+    rows, after = get_pull_requests_page("r", fields=("pr_number", "status"))
+    assert (rows, after) == ([{"pr_number": 1, "status": "open"}], None)
+    with pytest.raises(ValueError):
+        get_pull_requests_page("r", fields=("pr_number", "secret"))
+
+
+def test_comment_smells_by_file_and_line(db):
+    pr_id = add_pull_request("r", 1)
+    smells = [
+        smell_record("b.py", 1),
+        smell_record("a.py", 9),
+        smell_record("a.py", 2),
+        smell_record("a.py", 2, comment_body="// second on the line"),
+        smell_record("a.py", 5, repair_enabled=False),
+    ]
+    add_pr_analysis_results(pr_id, "r", [], smells)
+
+    rows, pages = _all_pages(lambda after, limit: get_comment_smells_page(pr_id, after, limit), 2)
+    assert pages == 2
+    assert [(row["file_path"], row["line"]) for row in rows] == [("a.py", 2), ("a.py", 2), ("a.py", 9), ("b.py", 1)]
+    assert "associated_code" not in rows[0]
+
+    rows, _ = get_comment_smells_page(pr_id, limit=1, fields=("id", "associated_code"))
+    assert rows[0]["associated_code"] == "code();"
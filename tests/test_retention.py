@@ -0,0 +1,74 @@
+import gzip
+import json
+import database.retention as retention
+from conftest import add_pull_request, smell_record
+from database.comments_files import add_pr_analysis_results
+from database.connection import get_connection, transaction
+from database.retention import collect_orphan_blobs, compact_repository
+
+
+def _policy(mode="archive", days=30):
+    return {"repo_internal_id": "r", "repo_full_name": "owner/r", "retention_days": days, "retention_mode": mode}
+
+
+def _history():
+    """Five expired archived smells, plus three that must be kept."""
+    pr_id = add_pull_request("r", 1)
+    smells = [smell_record("a.py", line, comment_body=f"// expired {line}") for line in range(1, 6)]
+    smells += [
+        smell_record("a.py", 10, comment_body="// cleanup pending"),
+        smell_record("a.py", 11, comment_body="// archived recently"),
+        smell_record("a.py", 12, comment_body="// current"),
+    ]
+    add_pr_analysis_results(pr_id, "r", [], smells)
+    with transaction() as c:
+        c.execute("UPDATE comment_smells_store SET is_current = 0 WHERE line <> 12")
+        c.execute("UPDATE comment_smells_store SET archived_at = '2000-01-01 00:00:00' WHERE line <= 10")
+        c.execute("UPDATE comment_smells_store SET github_cleanup = 'pending' WHERE line = 10")
+
+
+def _remaining_bodies():
+    with get_connection() as conn:
+        return [row[0] for row in conn.execute("SELECT comment_body FROM comment_smells ORDER BY line")]
+
+
+def test_expired_smells_are_exported_and_deleted_in_batches(db, tmp_path, monkeypatch):
+    _history()
+    batches = []
+    select_batch = retention._select_batch
+    monkeypatch.setattr(retention, "_select_batch", lambda *args: batches.append(select_batch(*args)) or batches[-1])
+
+    result = compact_repository(_policy(), batch_size=2, archive_dir=str(tmp_path / "archives"))
+
+    assert result["rows"] == 5
+    assert batches == [2, 2, 1, 0]
+    assert _remaining_bodies() == ["// cleanup pending", "// archived recently", "// current"]
+    with gzip.open(result["export_file"], "rt", encoding="utf-8") as export:
+        exported = [json.loads(line) for line in export]
+    assert sorted(row["comment_body"] for row in exported) == [f"// expired {line}" for line in range(1, 6)]
+
+
+def test_deleted_smells_stay_in_the_history(db, tmp_path):
+    _history()
+    history = "SELECT SUM(reported_count), SUM(archived_count) FROM smell_rollup_daily WHERE repo_internal_id = 'r'"
+    with get_connection() as conn:
+        assert conn.execute(history).fetchone() == (8, 0)
+    compact_repository(_policy("delete"), archive_dir=str(tmp_path / "archives"))
+    with get_connection() as conn:
+        assert conn.execute(history).fetchone() == (8, 5)
+    assert not (tmp_path / "archives").exists()
+
+
+def test_dry_run_and_keep_change_nothing(db, tmp_path):
+    _history()
+    assert compact_repository(_policy(), dry_run=True, archive_dir=str(tmp_path / "archives"))["rows"] == 5
+    assert compact_repository(_policy("keep"), archive_dir=str(tmp_path / "archives"))["rows"] == 0
+    assert len(_remaining_bodies()) == 8
+
+
+def test_orphan_blobs_are_collected(db, tmp_path):
+    _history()
+    compact_repository(_policy("delete"), archive_dir=str(tmp_path / "archives"))
+    # The five expired comment bodies; their shared code blob is still used
+    assert collect_orphan_blobs() == 5
+    assert collect_orphan_blobs() == 0
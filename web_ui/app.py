@@ -1,10 +1,6 @@
-import time
-from flask import Flask, render_template, request, session, redirect, url_for, flash, jsonify
+from flask import Flask
 import config
-from pyngrok import ngrok
 import database.database as database
-from web_ui.utils import start_ngrok, get_jwt, get_installation_access_token
-from web_ui.github_event_handler import process_installation_event
 from web_ui.routes.main_routes import main_bp
 from web_ui.routes.github_routes import github_bp
 from web_ui.routes.repo_routes import repo_bp
@@ -21,5 +17,7 @@ app.register_blueprint(github_bp)
 app.register_blueprint(repo_bp)
 
 if __name__ == '__main__':
+    # ngrok is only needed for local development.
+    from web_ui.utils import start_ngrok
     public_url = start_ngrok()
     app.run(port=config.NGROK_PORT, debug=True, use_reloader=False)
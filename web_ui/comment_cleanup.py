@@ -0,0 +1,146 @@
+"""
+Delete the GitHub review comments of archived smells.
+
+When a push supersedes a suggestion, its smell is archived with
+github_cleanup = 'pending'. cleanup_comments() deletes those comments with a
+few concurrent requests, spaced by a shared pacer that also stops every
+worker while GitHub reports a rate limit. A comment that is already gone
+(404) counts as deleted, so a run can be repeated safely; comments that
+could not be deleted stay pending for the next run until they have failed
+GITHUB_CLEANUP_MAX_ATTEMPTS times.
+
+process_pr_event cleans up after every analysis. Leftovers (e.g. after a
+rate limit) can be retried from a cron job:
+    python -m web_ui.comment_cleanup
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import config
+from database.database import get_pending_comment_cleanups, record_comment_cleanups
+from web_ui.github_utils import get_installation_access_token
+
+ENABLED = getattr(config, "GITHUB_CLEANUP_ENABLED", True)
+MAX_WORKERS = getattr(config, "GITHUB_CLEANUP_WORKERS", 4)
+# Minimum time between two DELETE requests, across all workers.
+MIN_INTERVAL_SECONDS = getattr(config, "GITHUB_CLEANUP_MIN_INTERVAL_SECONDS", 0.25)
+MAX_ATTEMPTS = getattr(config, "GITHUB_CLEANUP_MAX_ATTEMPTS", 5)
+# Longer rate-limit waits are not sat out; the comments stay pending instead.
+MAX_RATE_LIMIT_WAIT_SECONDS = getattr(config, "GITHUB_CLEANUP_MAX_RATE_LIMIT_WAIT_SECONDS", 60)
+
+
+class Pacer:
+    """Hands out request slots at least `interval` seconds apart to all threads."""
+
+    def __init__(self, interval=MIN_INTERVAL_SECONDS):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_at)
+            self._next_at = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def pause(self, seconds):
+        """Give out no slot for the next `seconds` (after a rate-limit response)."""
+        with self._lock:
+            self._next_at = max(self._next_at, time.monotonic() + seconds)
+
+
+def _rate_limit_wait(response):
+    """Seconds GitHub asks us to wait, or None if `response` is not a rate limit."""
+    if response.status_code not in (403, 429):
+        return None
+    if "Retry-After" in response.headers:
+        return float(response.headers["Retry-After"])
+    if response.headers.get("X-RateLimit-Remaining") == "0":
+        return max(0.0, float(response.headers.get("X-RateLimit-Reset", 0)) - time.time())
+    return None
+
+
+def delete_review_comment(repo_full_name, token, comment_id, pacer):
+    """
+    Delete one pull request review comment.
+    Returns True if it is gone (deleted now or before), False if it should
+    be retried later.
+    """
+    url = f"https://api.github.com/repos/{repo_full_name}/pulls/comments/{comment_id}"
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/vnd.github+json"
+    }
+    while True:
+        pacer.wait()
+        try:
+            response = requests.delete(url, headers=headers, timeout=30)
+        except requests.RequestException as e:
+            print(f"Deleting comment {comment_id} failed: {e}")
+            return False
+        if response.status_code in (204, 404):
+            return True
+        wait = _rate_limit_wait(response)
+        if wait is None or wait > MAX_RATE_LIMIT_WAIT_SECONDS:
+            print(f"Deleting comment {comment_id} failed: {response.status_code}")
+            return False
+        print(f"GitHub rate limit reached, pausing comment cleanup for {wait:.0f}s")
+        pacer.pause(wait)
+
+
+def cleanup_comments(pr_id=None, max_workers=MAX_WORKERS):
+    """
+    Delete the GitHub comments of archived smells (of one PR, or all).
+    Returns a dict with the number of comments deleted, left for a retry and
+    given up on.
+    """
+    result = {"deleted": 0, "retry": 0, "failed": 0}
+    pending = get_pending_comment_cleanups(pr_id)
+    if not ENABLED or not pending:
+        return result
+
+    tokens = {}
+    for cleanup in pending:
+        if cleanup["installation_id"] not in tokens:
+            tokens[cleanup["installation_id"]] = get_installation_access_token(cleanup["installation_id"])
+    pacer = Pacer()
+
+    def delete(cleanup):
+        token = tokens[cleanup["installation_id"]]
+        return token is not None and delete_review_comment(
+            cleanup["repo_full_name"], token, cleanup["github_comment_id"], pacer
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="comment-cleanup") as executor:
+        outcomes = list(executor.map(delete, pending))
+
+    deleted, retry, failed = [], [], []
+    for cleanup, gone in zip(pending, outcomes):
+        if gone:
+            deleted.append(cleanup["id"])
+        elif cleanup["attempts"] + 1 >= MAX_ATTEMPTS:
+            failed.append(cleanup["id"])
+        else:
+            retry.append(cleanup["id"])
+    record_comment_cleanups(deleted, retry, failed)
+    result.update(deleted=len(deleted), retry=len(retry), failed=len(failed))
+    return result
+
+
+def main():
+    from database.database import init_db
+    init_db()
+    while True:
+        result = cleanup_comments()
+        print(f"Deleted {result['deleted']} outdated review comments, "
+              f"{result['retry']} left for a retry, {result['failed']} given up")
+        # Keep going while whole batches are being deleted.
+        if not result["deleted"] or result["retry"] or result["failed"]:
+            break
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Skip vendored and generated files before their content is fetched.
+
+A changed file is skipped when
+  1. its path matches a skip glob: DEFAULT_SKIP_GLOBS, then the globs of the
+     repository settings (a glob starting with "!" keeps matching files
+     again; the last matching glob wins),
+  2. the repository's root .gitattributes marks it linguist-generated or
+     linguist-vendored, or
+  3. its first SNIFF_LINES lines carry a generated-code marker such as "DO NOT EDIT".
+     They are read from the compare patch when its first hunk starts at
+     line 1. With SNIFF_RAW_FILES, other files get a ranged request for their
+     first kilobyte; those requests are subtracted from the calls avoided.
+
+Glob syntax: a glob ending in "/" matches a directory at any depth
+("vendor/"); a glob without "/" matches the file name ("*_pb2.py"); any
+other glob matches the whole path ("src/main/gen/*"). A leading "/"
+anchors a glob at the repository root ("/gen/" is only the top-level gen
+directory). "*" also matches "/".
+"""
+import re
+from fnmatch import fnmatchcase
+import requests
+import config
+from web_ui.github_utils import get_installation_access_token
+from web_ui.line_mapping import HUNK_HEADER
+
+DEFAULT_SKIP_GLOBS = getattr(config, "DEFAULT_SKIP_GLOBS", [
+    "vendor/",
+    "third_party/",
+    "node_modules/",
+    "generated/",
+    "generated-sources/",
+    "gen-java/",          # Thrift
+    "gen-py/",            # Thrift
+    "migrations/",
+    "*_pb2.py",           # protobuf
+    "*_pb2_grpc.py",
+    "*_pb2.pyi",
+    "*OuterClass.java",   # protobuf
+    "*Grpc.java",
+])
+# Bytes read from the start of a file when the patch does not show its header.
+SNIFF_BYTES = getattr(config, "GENERATED_SNIFF_BYTES", 1024)
+# Only this many first lines are searched for a marker.
+SNIFF_LINES = getattr(config, "GENERATED_SNIFF_LINES", 10)
+# Whether to make that request at all (one small request per such file,
+# which is more than it saves unless generated files are common).
+SNIFF_RAW_FILES = getattr(config, "GENERATED_SNIFF_RAW_FILES", False)
+GENERATED_MARKER_RE = re.compile(
+    r"DO NOT EDIT|@generated|auto-?generated|automatically generated|"
+    r"generated by the protocol buffer compiler|Autogenerated by Thrift",
+    re.IGNORECASE
+)
+# Looks like a comment line in Java or Python.
+COMMENT_LINE_RE = re.compile(r'^\s*(//|/\*|\*|#|"""|\'\'\')')
+
+
+def glob_matches(path, glob):
+    """Whether `path` matches `glob` (see the module docstring for the syntax)."""
+    anchored = glob.startswith("/")
+    glob = glob.lstrip("/")
+    if glob.endswith("/"):
+        return fnmatchcase(path, glob + "*") or (not anchored and fnmatchcase(path, "*/" + glob + "*"))
+    if "/" not in glob and not anchored:
+        return fnmatchcase(path.rsplit("/", 1)[-1], glob)
+    return fnmatchcase(path, glob)
+
+
+def matches_skip_globs(path, globs):
+    """Apply `globs` in order; the last one matching `path` decides."""
+    skip = False
+    for glob in globs:
+        negated = glob.startswith("!")
+        if glob_matches(path, glob[1:] if negated else glob):
+            skip = not negated
+    return skip
+
+
+def path_skip_reason(path, skip_globs, attribute_globs):
+    """
+    Why `path` is skipped as vendored or generated by its path alone: "glob"
+    (DEFAULT_SKIP_GLOBS and the repository's globs, `skip_globs`) or
+    ".gitattributes" (`attribute_globs`, see gitattributes_skip_globs);
+    None if it is not. The skip globs decide first, so a .gitattributes
+    negation does not bring back a file they skip.
+    """
+    if matches_skip_globs(path, skip_globs):
+        return "glob"
+    if matches_skip_globs(path, attribute_globs):
+        return ".gitattributes"
+    return None
+
+
+def parse_gitattributes(text):
+    """
+    Return the [(pattern, generated)] rules of a .gitattributes file for the
+    linguist-generated and linguist-vendored attributes, in file order.
+    """
+    rules = []
+    for line in text.splitlines():
+        fields = line.split()
+        if not fields or fields[0].startswith("#"):
+            continue
+        pattern = fields[0]
+        for attribute in fields[1:]:
+            name, _, value = attribute.partition("=")
+            unset = name.startswith(("-", "!"))
+            if name.lstrip("-!") not in ("linguist-generated", "linguist-vendored"):
+                continue
+            rules.append((pattern, not unset and value.lower() not in ("false", "0")))
+    return rules
+
+
+def _gitattributes_glob(pattern):
+    """
+    Translate a .gitattributes pattern to the glob syntax above. As in git,
+    a pattern with a "/" (other than a leading "**/") is relative to the
+    root; one without matches at any depth.
+    """
+    if pattern.startswith("**/"):
+        pattern = pattern[3:]
+    elif "/" in pattern:
+        pattern = "/" + pattern.lstrip("/")
+    return pattern[:-2] if pattern.endswith("/**") else pattern
+
+
+def gitattributes_skip_globs(text):
+    """Skip globs (see matches_skip_globs) for the rules of a .gitattributes file."""
+    return [
+        _gitattributes_glob(pattern) if generated else "!" + _gitattributes_glob(pattern)
+        for pattern, generated in parse_gitattributes(text)
+    ]
+
+
+def has_generated_marker(text):
+    """Whether the first SNIFF_LINES lines of `text` carry a generated-code marker."""
+    return GENERATED_MARKER_RE.search("\n".join(text.splitlines()[:SNIFF_LINES])) is not None
+
+
+def patch_header(patch):
+    """The first lines of the new file, if the patch's first hunk starts at line 1."""
+    lines = (patch or "").splitlines()
+    match = HUNK_HEADER.match(lines[0]) if lines else None
+    if match is None or int(match.group(3)) != 1:
+        return None
+    header = []
+    for line in lines[1:]:
+        if line.startswith("@@"):
+            break
+        if not line.startswith(("-", "\\")):
+            header.append(line[1:])
+    return "\n".join(header)
+
+
+def estimate_model_calls(patch):
+    """At least one model call per added comment line of the patch."""
+    return sum(
+        1 for line in (patch or "").splitlines()
+        if line.startswith("+") and not line.startswith("+++") and COMMENT_LINE_RE.match(line[1:])
+    )
+
+
+class GeneratedFileFilter:
+    """
+    Decides per changed file (a compare API entry) whether it is vendored or
+    generated, and keeps a report of what skipping those files saved:
+    files, bytes (the file size when known, else the patch size) and calls
+    (one content fetch plus the estimated model calls per file).
+    """
+
+    def __init__(self, payload, skip_globs=()):
+        self.repo_full_name = payload["repository"]["full_name"]
+        self.head_sha = payload["pull_request"]["head"]["sha"]
+        self.installation_id = payload["installation"]["id"]
+        self.globs = list(DEFAULT_SKIP_GLOBS) + list(skip_globs or [])
+        self._token = None
+        self._attribute_globs = None
+        self.report = {"files": 0, "bytes": 0, "calls": 0, "paths": []}
+
+    def _headers(self, accept):
+        if self._token is None:
+            self._token = get_installation_access_token(self.installation_id)
+        return {"Authorization": f"Bearer {self._token}", "Accept": accept}
+
+    def attribute_globs(self):
+        """Skip globs from the root .gitattributes at the head commit (fetched once)."""
+        if self._attribute_globs is None:
+            self._attribute_globs = []
+            url = f"https://api.github.com/repos/{self.repo_full_name}/contents/.gitattributes"
+            try:
+                response = requests.get(url, headers=self._headers("application/vnd.github.raw"),
+                                        params={"ref": self.head_sha}, timeout=30)
+            except requests.RequestException as e:
+                print("Could not read .gitattributes:", e)
+                return self._attribute_globs
+            if response.status_code == 200:
+                self._attribute_globs = gitattributes_skip_globs(response.text)
+        return self._attribute_globs
+
+    def sniff_header(self, file):
+        """
+        Return (header text, file size or None). The header comes from the
+        patch when possible, otherwise from a ranged read of the raw file.
+        """
+        header = patch_header(file.get("patch"))
+        if header is not None or not SNIFF_RAW_FILES or not file.get("raw_url"):
+            return header, None
+        headers = self._headers("application/vnd.github.raw")
+        headers["Range"] = f"bytes=0-{SNIFF_BYTES - 1}"
+        try:
+            response = requests.get(file["raw_url"], headers=headers, timeout=30)
+        except requests.RequestException as e:
+            print(f"Could not read the header of {file['filename']}: {e}")
+            return None, None
+        self.report["calls"] -= 1
+        if response.status_code not in (200, 206):
+            return None, None
+        size = response.headers.get("Content-Range", "").rpartition("/")[2]
+        return response.content[:SNIFF_BYTES].decode("utf-8", "replace"), int(size) if size.isdigit() else None
+
+    def skips(self, file):
+        """Whether `file` should be skipped; skipped files are added to the report."""
+        path = file["filename"]
+        size = None
+        reason = path_skip_reason(path, self.globs, self.attribute_globs())
+        if reason is None:
+            header, size = self.sniff_header(file)
+            if header is None or not has_generated_marker(header):
+                return False
+            reason = "generated header"
+        self.report["files"] += 1
+        self.report["bytes"] += size if size is not None else len(file.get("patch") or "")
+        self.report["calls"] += 1 + estimate_model_calls(file.get("patch"))
+        self.report["paths"].append((path, reason))
+        return True
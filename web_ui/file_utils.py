@@ -312,6 +312,53 @@ def parse_patch_ranges(patch):
                 ranges.append((new_start, new_end))
     return ranges
 
+def parse_added_lines(patch):
+    """
+    Return the set of line numbers (in the new file) that a patch adds or
+    rewrites, i.e. its '+' lines.
+    """
+    added = set()
+    new_line = None
+    hunk_regex = re.compile(r'@@ -\d+(?:,\d+)? \+(\d+)(?:,\d+)? @@')
+    for line in (patch or "").splitlines():
+        match = hunk_regex.match(line)
+        if match:
+            new_line = int(match.group(1))
+        elif new_line is None or line.startswith(("-", "\\")):
+            continue
+        else:
+            if line.startswith("+"):
+                added.add(new_line)
+            new_line += 1
+    return added
+
+TASK_MARKER_RE = re.compile(r'\b(?:TODO|FIXME|XXX|HACK)\b', re.IGNORECASE)
+
+def comment_priority(comment_entry, added_lines):
+    """
+    Cheap score used to choose which comments to analyze when an event has
+    more comments than its budget. Comments on added or rewritten lines rank
+    above comments that are only in the context window of a change; task
+    markers and long comments rank higher.
+
+    Args:
+        comment_entry: comment with computed_start_line, computed_end_line and comment.
+        added_lines: set of added line numbers of the file (parse_added_lines).
+
+    Returns:
+        A float, higher means more worth analyzing.
+    """
+    text = comment_entry["comment"]
+    start = comment_entry.get("computed_start_line") or 0
+    end = comment_entry.get("computed_end_line") or start
+    score = 0.0
+    if any(line in added_lines for line in range(start, end + 1)):
+        score += 10
+    if TASK_MARKER_RE.search(text):
+        score += 5
+    score += min(len(text) / 100, 3)
+    return score
+
 def filter_comments_by_diff_intersection(diff_patch, comments, file_content, context_lines=CONTEXT_LINES):
     # TODO check this function. i didnt do any testing on it.
     """
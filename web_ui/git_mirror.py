@@ -0,0 +1,247 @@
+"""
+Serve changed files from a local mirror clone instead of the REST API.
+
+With GIT_MIRROR_ENABLED, every repository gets a bare mirror clone under
+GIT_MIRROR_DIR. An event fetches into it only when the mirror lacks one of
+its commits (an incremental fetch of the new objects). The changed files
+and their patches come from `git diff`, and blob contents from one
+persistent `git cat-file --batch` process per mirror.
+
+GIT_MIRROR_REMOTE_URL is where mirrors are cloned from. Besides GitHub it
+can be a local path, e.g. "/srv/git/{repo_full_name}.git", which needs no
+network or installation token.
+
+If the mirror still lacks a commit after fetching (e.g. the "before" of a
+force-push, which no ref points to any more), the event falls back to the
+REST API.
+"""
+import base64
+import fcntl
+import os
+import subprocess
+import threading
+import config
+from web_ui.github_utils import (
+    get_installation_access_token, get_base_and_head_sha, patches_from_diff_lines, iter_api_changed_files
+)
+
+MIRROR_DIR = getattr(config, "GIT_MIRROR_DIR", "mirrors")
+REMOTE_URL = getattr(config, "GIT_MIRROR_REMOTE_URL", "https://github.com/{repo_full_name}.git")
+
+# git diff --raw status letters -> compare API file status
+STATUSES = {
+    "A": "added",
+    "M": "modified",
+    "D": "removed",
+    "R": "renamed",
+    "C": "copied",
+    "T": "changed",
+}
+
+
+class CatFileBatch:
+    """A `git cat-file --batch` process that reads objects one request at a time."""
+
+    def __init__(self, git_dir):
+        self.process = subprocess.Popen(
+            ["git", "--git-dir", git_dir, "cat-file", "--batch"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE
+        )
+        self._lock = threading.Lock()
+
+    def read(self, name):
+        """Return the contents of object `name` (a sha or "rev:path"), or None if it is missing."""
+        with self._lock:
+            self.process.stdin.write(name.encode() + b"\n")
+            self.process.stdin.flush()
+            header = self.process.stdout.readline().split()
+            if not header:
+                raise RuntimeError("git cat-file exited")
+            if len(header) != 3:
+                return None  # "<name> missing" or "<name> ambiguous"
+            data = self.process.stdout.read(int(header[2]))
+            self.process.stdout.read(1)  # newline after the contents
+            return data
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+class GitMirror:
+    """The bare mirror clone of one repository."""
+
+    def __init__(self, repo_full_name):
+        self.repo_full_name = repo_full_name
+        self.git_dir = os.path.join(MIRROR_DIR, repo_full_name + ".git")
+        self.url = REMOTE_URL.format(repo_full_name=repo_full_name)
+        self._cat_file = None
+        self._lock = threading.Lock()
+        # Commits a fetch did not bring; fetching again for them is pointless.
+        self._unfetchable = set()
+
+    def _git_command(self, *args):
+        return ["git", "-c", "core.quotePath=false"] + list(args)
+
+    def _git_env(self, token=None):
+        """
+        The environment of a git command. The token goes in the environment
+        (as config), where other users cannot read it as they can argv.
+        """
+        if token is None:
+            return None
+        credentials = base64.b64encode(f"x-access-token:{token}".encode()).decode()
+        return dict(
+            os.environ,
+            GIT_CONFIG_COUNT="1",
+            GIT_CONFIG_KEY_0="http.extraHeader",
+            GIT_CONFIG_VALUE_0=f"Authorization: Basic {credentials}"
+        )
+
+    def _git(self, *args, token=None, check=True):
+        return subprocess.run(
+            self._git_command("--git-dir", self.git_dir, *args),
+            capture_output=True, check=check, env=self._git_env(token)
+        )
+
+    def has_commit(self, sha):
+        return self._git("cat-file", "-e", f"{sha}^{{commit}}", check=False).returncode == 0
+
+    def update(self, shas=(), installation_id=None):
+        """
+        Clone the mirror if it does not exist yet, or fetch into it if it
+        lacks one of the commits `shas`. A file lock keeps processes from
+        updating the same mirror at once. GitHub is accessed with an
+        installation token of `installation_id`.
+        Returns whether the mirror has all of `shas` afterwards.
+        """
+        shas = [sha for sha in shas if sha]
+        token = None
+        if self.url.startswith("https://") and installation_id is not None:
+            token = get_installation_access_token(installation_id)
+        os.makedirs(os.path.dirname(self.git_dir), exist_ok=True)
+        with self._lock, open(self.git_dir + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not os.path.isdir(self.git_dir):
+                print(f"Cloning mirror of {self.repo_full_name}")
+                subprocess.run(
+                    self._git_command("clone", "--mirror", "--quiet", self.url, self.git_dir),
+                    capture_output=True, check=True, env=self._git_env(token)
+                )
+            missing = [sha for sha in shas if not self.has_commit(sha)]
+            if missing and not self._unfetchable.issuperset(missing):
+                self._git("fetch", "--quiet", "--prune", "origin", token=token)
+                missing = [sha for sha in missing if not self.has_commit(sha)]
+                self._unfetchable.update(missing)
+            return not missing
+
+    def blob(self, name):
+        """Contents of a blob, by sha or "rev:path"; None if it is missing."""
+        if self._cat_file is None:
+            self._cat_file = CatFileBatch(self.git_dir)
+        return self._cat_file.read(name)
+
+    def changed_files(self, base_sha, head_sha):
+        """
+        Files changed between the merge base of `base_sha` and `head_sha`, and
+        `head_sha` (what the compare API lists), as dicts with the compare API
+        keys filename, previous_filename, status and sha, without patches.
+        """
+        output = self._git("diff", "--raw", "-z", "-M", "--no-abbrev", f"{base_sha}...{head_sha}").stdout
+        fields = output.decode("utf-8", "replace").split("\0")
+        files = []
+        i = 0
+        while i < len(fields) - 1:
+            _, _, old_sha, new_sha, status = fields[i].lstrip(":").split(" ")
+            paths = fields[i + 1:i + (3 if status[0] in "RC" else 2)]
+            i += 1 + len(paths)
+            file = {
+                "filename": paths[-1],
+                "status": STATUSES.get(status[0], "modified"),
+                "sha": old_sha if status[0] == "D" else new_sha,
+                "diff_base": base_sha,
+            }
+            if len(paths) == 2:
+                file["previous_filename"] = paths[0]
+            files.append(file)
+        return files
+
+    def add_patches(self, base_sha, head_sha, changed_files):
+        """Set the "patch" of each file from a streamed `git diff`."""
+        if not changed_files:
+            return
+        paths = []
+        for file in changed_files:
+            paths.append(file["filename"])
+            if "previous_filename" in file:
+                paths.append(file["previous_filename"])
+        process = subprocess.Popen(
+            self._git_command(
+                "--git-dir", self.git_dir, "diff", "-M", "--no-color", "--no-ext-diff",
+                "--src-prefix=a/", "--dst-prefix=b/", f"{base_sha}...{head_sha}", "--", *paths
+            ),
+            stdout=subprocess.PIPE
+        )
+        lines = (line.decode("utf-8", "replace").rstrip("\n") for line in process.stdout)
+        patches = patches_from_diff_lines(lines, [file["filename"] for file in changed_files])
+        process.stdout.close()
+        process.wait()
+        for file in changed_files:
+            file["patch"] = patches.get(file["filename"])
+
+
+_mirrors = {}
+_mirrors_lock = threading.Lock()
+
+
+def get_mirror(repo_full_name):
+    """The GitMirror of a repository, shared by the threads of this process."""
+    with _mirrors_lock:
+        if repo_full_name not in _mirrors:
+            _mirrors[repo_full_name] = GitMirror(repo_full_name)
+        return _mirrors[repo_full_name]
+
+
+def add_content_to_files(mirror, changed_files):
+    """
+    Like github_utils.add_content_to_files, reading the blobs from the
+    mirror. Removed files get content None without a read.
+    """
+    for file in changed_files:
+        if file["status"] == "removed":
+            file["content"] = None
+            continue
+        data = mirror.blob(file["sha"])
+        if data is None:
+            print(f"Failed to read content for {file['filename']} from the mirror")
+        file["content"] = data.decode("utf-8", "replace") if data is not None else None
+
+
+def iter_changed_files(payload, file_filter=None, budget_filter=None):
+    """
+    Like github_utils.iter_changed_files, served from the repository's
+    mirror. Yields all changed files as a single page, or the pages of the
+    REST API if the mirror lacks one of the commits. Removed files are kept
+    with content None, so the handler archives their smells.
+    """
+    base_sha, head_sha = get_base_and_head_sha(payload)
+    mirror = get_mirror(payload["repository"]["full_name"])
+    if not mirror.update((base_sha, head_sha), str(payload["installation"]["id"])):
+        print(f"Mirror of {mirror.repo_full_name} lacks {base_sha}...{head_sha}; using the API")
+        yield from iter_api_changed_files(payload, file_filter, budget_filter)
+        return
+
+    files = mirror.changed_files(base_sha, head_sha)
+    # only keep python and java files
+    files = [file for file in files if file["filename"].endswith(('.java', '.py'))]
+    # Patches first, so file_filter sees the same data as with the API
+    mirror.add_patches(base_sha, head_sha, files)
+    # Like add_missing_patches: without a patch the changed lines are unknown
+    files = [file for file in files if file.get("patch") is not None or file["status"] == "removed"]
+    if file_filter is not None:
+        files = [file for file in files if file_filter(file)]
+    if budget_filter is not None:
+        files = [file for file in files if budget_filter(file)]
+    add_content_to_files(mirror, files)
+    yield files
@@ -3,8 +3,91 @@ import database.database as database
 import web_ui.utils as utils
 import json
 import subprocess
-from web_ui.file_utils import add_context_to_comments, filter_comments_by_diff_intersection, replace_comment_block
+import time
+import config
+from web_ui.file_utils import add_context_to_comments, filter_comments_by_diff_intersection, replace_comment_block, parse_added_lines, comment_priority
+from web_ui.line_mapping import LineMap
+from web_ui.comment_cleanup import cleanup_comments
+from web_ui.file_filters import GeneratedFileFilter
+from database.content_blobs import content_hash
 from database.database import *
+from ai_content.near_duplicate_cache import NearDuplicateCache
+from ai_content.speculation import SpeculativeRepairer
+from ai_content.usage import usage_context, llm_calls_in_context, max_llm_calls_per_comment
+
+# Seconds a webhook may spend analyzing before it answers and leaves the rest
+# to a resume in a background thread (None: no deadline, the webhook
+# analyzes the whole event).
+ANALYSIS_DEADLINE_SECONDS = getattr(config, "ANALYSIS_DEADLINE_SECONDS", None)
+
+# Reuses labels of near-duplicate comments instead of asking the model again.
+near_duplicate_cache = NearDuplicateCache()
+# Optionally starts repairs in parallel with detection (config.SPECULATIVE_REPAIR).
+speculator = SpeculativeRepairer()
+
+def reconcile_comments(previous, file_path, comments, line_map=None):
+    """
+    Match the comments of a file against the smells stored for it at the
+    previous head.
+
+    A stored smell is still valid if a comment has the same fingerprint, or,
+    when `line_map` (the diff from the previous head) is given, if its line
+    was not touched and the comment now at the mapped line has the same
+    text: its GitHub suggestion still applies even though the surrounding
+    code moved or changed.
+
+    Args:
+        previous: [(id, fingerprint, line, comment_body_hash)] of the file's
+            current smells.
+        file_path: path of the file.
+        comments: every comment of the file, with associated code.
+        line_map: optional web_ui.line_mapping.LineMap from the previous head.
+
+    Returns:
+        (new_comments, carried, vanished): the comments without a still
+        valid stored smell (each tagged with its fingerprint),
+        [(id, computed_start_line, fingerprint, associated_code)] of stored
+        smells that are still valid, and the ids of stored smells whose
+        comment is gone or changed.
+    """
+    unmatched = {}
+    for smell_id, fingerprint, line, body_hash in previous:
+        unmatched.setdefault(fingerprint, []).append((smell_id, line, body_hash))
+    new_comments = []
+    carried = []
+    for comment_entry in comments:
+        fingerprint = smell_fingerprint(file_path, comment_entry["comment"], comment_entry["associated_code"])
+        comment_entry["fingerprint"] = fingerprint
+        if unmatched.get(fingerprint) and comment_entry.get("computed_start_line") is not None:
+            smell_id, _, _ = unmatched[fingerprint].pop(0)
+            carried.append((smell_id, comment_entry["computed_start_line"], fingerprint,
+                            comment_entry["associated_code"]))
+        else:
+            new_comments.append(comment_entry)
+
+    vanished = []
+    remapped_lines = set()
+    by_line = {
+        comment_entry["computed_start_line"]: comment_entry
+        for comment_entry in new_comments
+        if line_map is not None and comment_entry.get("computed_start_line") is not None
+    }
+    for smells in unmatched.values():
+        for smell_id, line, body_hash in smells:
+            comment_entry = by_line.get(line_map.map_line(line)) if by_line else None
+            if comment_entry is not None and content_hash(comment_entry["comment"].encode("utf-8")) == body_hash:
+                new_line = comment_entry["computed_start_line"]
+                del by_line[new_line]
+                remapped_lines.add(new_line)
+                carried.append((smell_id, new_line, comment_entry["fingerprint"],
+                                comment_entry["associated_code"]))
+            else:
+                vanished.append(smell_id)
+    new_comments = [
+        comment_entry for comment_entry in new_comments
+        if comment_entry.get("computed_start_line") not in remapped_lines
+    ]
+    return new_comments, carried, vanished
 
 def process_installation_event(payload):
     """
@@ -24,15 +107,13 @@ def process_installation_event(payload):
         return jsonify({"message": "Installation deleted"}), 200
 
     repositories = payload.get("repositories", [])
-    database.add_installation(installation_id)
-
-    internal_ids = []
-    for repo in repositories:
-        repo_full_name = repo["full_name"]
-        github_repo_id = str(repo["id"])
-        internal_id = database.add_repository(installation_id, github_repo_id, repo_full_name)
-        internal_ids.append(internal_id)
-        print(f"✅ App installed on {repo_full_name} (GitHub Repo ID: {github_repo_id}, Internal ID: {internal_id}, Installation ID: {installation_id})")
+    # One transaction for the whole installation, however many repositories it has.
+    internal_ids = database.add_repositories(
+        installation_id,
+        [(repo["id"], repo["full_name"]) for repo in repositories]
+    )
+    for repo, internal_id in zip(repositories, internal_ids):
+        print(f"✅ App installed on {repo['full_name']} (GitHub Repo ID: {repo['id']}, Internal ID: {internal_id}, Installation ID: {installation_id})")
 
     session["installation_id"] = installation_id # TODO check if this is correct
     session["internal_repo_ids"] = internal_ids
@@ -45,13 +126,163 @@ def process_installation_event(payload):
         "repositories": internal_ids
     }), 200
 
-def process_pr_event(payload):
+def process_installation_repositories_event(payload):
+    """
+    Processes installation_repositories events: repositories added to or
+    removed from an existing installation, without a reinstall.
+    """
+    action = payload.get("action")
+    installation_id = str(payload["installation"]["id"])
+
+    added = payload.get("repositories_added", [])
+    added_ids = database.add_repositories(
+        installation_id,
+        [(repo["id"], repo["full_name"]) for repo in added]
+    ) if added else []
+    for repo, internal_id in zip(added, added_ids):
+        print(f"✅ App added to {repo['full_name']} (GitHub Repo ID: {repo['id']}, Internal ID: {internal_id}, Installation ID: {installation_id})")
+
+    removed = payload.get("repositories_removed", [])
+    removed_ids = database.remove_repositories(
+        installation_id,
+        [repo["id"] for repo in removed]
+    ) if removed else []
+    for repo in removed:
+        print(f"❌ App removed from {repo['full_name']} (GitHub Repo ID: {repo['id']}, Installation ID: {installation_id})")
+
+    return jsonify({
+        "message": f"Installation repositories {action}",
+        "installation_id": installation_id,
+        "added": added_ids,
+        "removed": removed_ids
+    }), 200
+
+def analyze_comment(ai_processor, payload, settings, file, comment_entry, post_to_github=True):
+    """
+    Classify one comment and, if it is an enabled smell, generate a repair
+    and (if `post_to_github`) post it to the PR. The results are stored on
+    `comment_entry`.
+    """
+    enabled_smells = set(settings["enabled_smells"])
+    comment_block = comment_entry["comment"]
+    associated_code = comment_entry["associated_code"]
+
+    smell_label = near_duplicate_cache.lookup(associated_code, comment_block)
+    speculation = None
+    if smell_label is None:
+        speculation = speculator.start(ai_processor, associated_code, comment_block, file["comments_metadata"]["lang"], enabled_smells)
+        smell_label = ai_processor.detect_comment_smell(associated_code, comment_block)
+        near_duplicate_cache.record(associated_code, comment_block, smell_label)
+    # TODO what if smell_label is not in smells list
+    comment_entry["smell_label"] = smell_label
+    # TODO create issue if label is task
+    if(smell_label not in enabled_smells):
+        speculator.discard(speculation)
+        comment_entry["repair_enabled"] = False 
+        comment_entry["repair_suggestion"] = None
+    else:
+
+        if(smell_label == "Not a smell"):
+            speculator.discard(speculation)
+            comment_entry["repair_enabled"] = False 
+            comment_entry["repair_suggestion"] = None
+        else: 
+            #! REPAIR CODE GOES HERE
+            comment_entry["repair_enabled"] = True
+            first_suggestion = speculator.resolve(speculation, smell_label)
+        
+            # check double iteration
+            if settings["double_iteration"]==1:
+                repair_suggestion = ai_processor.repair_comment_double_iteration(associated_code, comment_block, smell_label, file["comments_metadata"]["lang"], first_suggestion)
+            elif first_suggestion is not None:
+                repair_suggestion = first_suggestion
+            else:
+                repair_suggestion = ai_processor.repair_comment(associated_code, comment_block, smell_label, file["comments_metadata"]["lang"])
+            
+            comment_entry["repair_suggestion"] = repair_suggestion
+    
+            # change content for the line range
+            comment_entry["new_comment_block"] = replace_comment_block(file["content"], comment_entry, file["comments_metadata"]["lang"])
+
+            # now we have computed_start_line, computed_end_line, new_comment_block for each comment
+            if post_to_github:
+                response = utils.post_suggestions_to_github(payload, file["filename"], comment_entry)
+                comment_entry["github_response"] = response
+
+def file_analysis_records(commit_sha, settings, file, complete):
+    """
+    Turn the analysis of one file into the (files, smells, carried,
+    vanished) arguments of add_pr_analysis_results. The files record that
+    marks its blob as analyzed (the resume checkpoint) is only included if
+    the file is `complete`.
+    """
+    file_path = file["filename"]
+    file_records = []
+    if complete:
+        file_records.append({
+            "file_path": file_path,
+            # A removed file has no blob at the head; if it comes back it is analyzed again
+            "blob_sha":  None if file["status"] == "removed" else file["sha"],
+            "status":    file["status"],
+            "settings_version": settings["settings_version"],
+        })
+    smell_records = []
+    for comment_entry in file["comments"]:
+        if "smell_label" not in comment_entry:
+            continue  # not analyzed (budget or deadline)
+        # Only posted suggestions have a GitHub response
+        response   = comment_entry.get("github_response") or {}
+        smell_type = comment_entry["smell_label"]
+        smell_records.append({
+            "file_path":          file_path,
+            "commit_sha":         commit_sha,
+            "line":               comment_entry["computed_start_line"],
+            "side":               "RIGHT",
+            "smell_type":         smell_type,
+            "associated_code":    comment_entry["associated_code"],
+            "comment_body":       comment_entry["comment"],
+            "suggestion":         comment_entry.get("repair_suggestion", None),
+            "github_comment_id":  response.get("id"),
+            "github_comment_url": response.get("html_url"),
+            "is_smell":           smell_type != "Not a smell",
+            "repair_enabled":     comment_entry.get("repair_enabled", True),
+            "status":             "Pending",
+            "fingerprint":        comment_entry["fingerprint"],
+        })
+    carried = [
+        {"id": smell_id, "commit_sha": commit_sha, "line": line,
+         "fingerprint": fingerprint, "associated_code": code}
+        for smell_id, line, fingerprint, code in file["carried"]
+    ]
+    return file_records, smell_records, carried, file["vanished"]
+
+def persist_file_results(pr_id, repo_internal_id, commit_sha, settings, file, complete):
+    """
+    Write the analysis of one file in a single transaction: its analyzed
+    comments, carried forward and archived smells and, if `complete`, the
+    files record of its blob.
+    """
+    add_pr_analysis_results(pr_id, repo_internal_id, *file_analysis_records(commit_sha, settings, file, complete))
+
+def analyze_pull_request(payload, deadline_seconds=ANALYSIS_DEADLINE_SECONDS):
+    """
+    Analyze the changed files of a pull_request event, posting suggestions
+    and saving the results of each file as soon as the file is done.
+
+    If the event takes longer than `deadline_seconds` (None for no limit),
+    no new comment is started; the job is left 'expired' and resuming it
+    (process_pr_event does so in the background, see web_ui/resume_analysis.py)
+    continues with the files that are not done yet, as does the next event
+    for the same head. A crash leaves the
+    job 'running' or 'failed' with the same effect.
+
+    Returns a dict with the job id, its status ('done' or 'expired') and the
+    number of files analyzed out of the files that needed it.
+    """
+    started = time.monotonic()
     # TODO consider closed and open and others
     installation_id = str(payload["installation"]["id"])
-    owner = str(payload["repository"]["owner"]["login"])
-    repo = str(payload["repository"]["name"])
     repo_full_name = str(payload["repository"]["full_name"])
-    pr_number = str(payload["number"])
     github_repo_id   = payload["repository"]["id"]
 
     repo_internal_id = get_repository_id_by_full_name(repo_full_name)  
@@ -63,69 +294,13 @@ def process_pr_event(payload):
         )
 
     print(f"Processing PR event for {repo_full_name} (Internal ID: {repo_internal_id})")
-    from ai_content.main import CommentSmellAI
-    ai_processor = CommentSmellAI()
-
+    from ai_content.main import get_ai_processor
+    ai_processor = get_ai_processor()
 
     # GET SETTINGS
     settings = get_repo_settings(repo_internal_id)
-    enabled_smells = set(settings["enabled_smells"])
 
-    changed_files = utils.get_changed_files(payload) 
-    for file in changed_files:
-        print(f"Processing file: {file['filename']}")
-        comments = utils.extract_comments(file)
-        file["comments_metadata"] = comments["metadata"]
-        comments = add_context_to_comments(comments, file["content"], file["comments_metadata"]["lang"])
-        comments = filter_comments_by_diff_intersection(file["patch"], comments, file["content"])
-        file["comments"] = comments
-        
-        # TODO i probably should handle previous comments here 
-        # TODO remove method level comments for java. python is already handled
-        for comment_entry in comments:
-            comment_block = comment_entry["comment"]
-            associated_code = comment_entry["associated_code"]
-
-            smell_label = ai_processor.detect_comment_smell(associated_code, comment_block) 
-            # TODO what if smell_label is not in smells list
-            comment_entry["smell_label"] = smell_label
-            # TODO create issue if label is task
-            if(smell_label not in enabled_smells):
-                comment_entry["repair_enabled"] = False 
-                comment_entry["repair_suggestion"] = None
-            else:
-
-                if(smell_label == "Not a smell"):
-                    comment_entry["repair_enabled"] = False 
-                    comment_entry["repair_suggestion"] = None
-                else: 
-                    #! REPAIR CODE GOES HERE
-                    comment_entry["repair_enabled"] = True
-                    
-                    # check double iteration
-                    if settings["double_iteration"]==1:
-                        repair_suggestion = ai_processor.repair_comment_double_iteration(associated_code, comment_block, smell_label, file["comments_metadata"]["lang"])
-                    else:
-                        repair_suggestion = ai_processor.repair_comment(associated_code, comment_block, smell_label, file["comments_metadata"]["lang"])
-                        
-                    comment_entry["repair_suggestion"] = repair_suggestion
-                
-                    # change content for the line range
-                    comment_entry["new_comment_block"] = replace_comment_block(file["content"], comment_entry, file["comments_metadata"]["lang"])
-
-                    # now we have computed_start_line, computed_end_line, new_comment_block for each comment
-                    response = utils.post_suggestions_to_github(payload, file["filename"], comment_entry)
-                    comment_entry["github_response"] = response
-            
-    # # load changed files from the json
-    # with open("payloads/changed_files.json", "r") as f:
-    #     changed_files = json.load(f)
-            
-    with open("payloads/changed_files.json", "w") as f:
-        json.dump(changed_files, f, indent=4)
-       
-    # DATABASE STUFF 
-    # 1) Upsert the PR and get your local ID
+    # Upsert the PR first so every file can be saved as soon as it is done
     pr_id = add_or_update_pull_request(
         repo_internal_id = repo_internal_id,
         pr_number        = int(payload["number"]),
@@ -133,59 +308,188 @@ def process_pr_event(payload):
         status           = payload["action"],               # e.g. "opened", "synchronize", "closed"
         created_at       = payload["pull_request"]["created_at"]
     )
+    commit_sha = payload["pull_request"]["head"]["sha"]
+    job_id = start_analysis_job(repo_internal_id, int(payload["number"]), commit_sha, payload)
 
-    # 3) Inside your loop over changed_files:
-    for file in changed_files:
-        # assign exactly the vars your helper needs:
-        file_path = file["filename"]
-        blob_sha  = file["sha"]
-        status    = file["status"]
-        # now call the helper with those variables:
-        file_id = add_file_record(pr_id, repo_internal_id, file_path, blob_sha, status)
+    def past_deadline():
+        return deadline_seconds is not None and time.monotonic() - started > deadline_seconds
 
-    commit_sha = payload["pull_request"]["head"]["sha"]
-    for file in changed_files:
-        file_path  = file["filename"]
-        for comment_entry in file["comments"]:
-            # 1) Post the suggestion
-            response = comment_entry["github_response"] 
-            
-            github_id  = response["id"]
-            github_url = response["html_url"]
-            
-            # 3) Prepare your own fields
-            pr_id         = pr_id                            # from your earlier upsert
-            line          = comment_entry["computed_start_line"]
-            smell_type    = comment_entry["smell_label"]
-            comment_body  = comment_entry["comment"]
-            suggestion    = comment_entry.get("repair_suggestion", None)
-            repair_flag   = comment_entry.get("repair_enabled", True)
-            is_smell        = (smell_type != "Not a smell")        #! or however you flag non-smells
-            associated_code = comment_entry["associated_code"]
-
-            add_comment_smell(
-                        pr_id=pr_id,
-                        file_path=file_path,
-                        commit_sha=commit_sha,
-                        line=line,
-                        side="RIGHT",
-                        smell_type=smell_type,
-                        associated_code=associated_code,
-                        comment_body=comment_body,
-                        suggestion=suggestion,
-                        github_comment_id=github_id,
-                        github_comment_url=github_url,
-                        is_smell=is_smell,
-                        repair_enabled=repair_flag,
-                        status="Pending"
+    try:
+        # Attribute every model call below to this repo / PR in the llm_calls table.
+        with usage_context(repo_internal_id, int(payload["number"]), settings["double_iteration"]):
+            # Files whose blob was already analyzed for this PR under the same
+            # settings (including by an interrupted run of this event) are
+            # dropped before their content is even fetched.
+            analyzed_blobs = get_analyzed_blob_shas(repo_internal_id, int(payload["number"]), settings["settings_version"])
+            skipped_files = []
+            # Files, comments and model calls beyond the per-event budgets are
+            # left out and recorded in analysis_skips.
+            budget_skips = []
+            accepted_files = []
+            # Vendored and generated files are dropped as well, before they
+            # count against the file budget.
+            generated_filter = GeneratedFileFilter(payload, settings["skip_globs"])
+            def needs_analysis(file):
+                # A removed file has nothing to analyze, but its smells must
+                # be archived whatever blob it had.
+                if file["status"] == "removed":
+                    return True
+                if analyzed_blobs.get(file["filename"]) == file["sha"]:
+                    skipped_files.append(file["filename"])
+                    return False
+                return not generated_filter.skips(file)
+            # Applied after missing patches are recovered, so files dropped
+            # for lack of a patch do not use up the budget.
+            def within_budget(file):
+                if file["status"] == "removed":
+                    return True
+                if len(accepted_files) >= settings["max_files"]:
+                    budget_skips.append({"file_path": file["filename"], "reason": "max_files"})
+                    return False
+                accepted_files.append(file["filename"])
+                return True
+            # 1) Collect the comments that need analysis from every file, a
+            #    page of changed files at a time
+            changed_files = []
+            candidates = []
+            for page in utils.iter_changed_files(payload, file_filter=needs_analysis, budget_filter=within_budget):
+                for file in page:
+                    print(f"Processing file: {file['filename']}")
+                    if file["status"] == "removed" or file.get("content") == "":
+                        # Removed or empty: no comments, so the file's smells are archived
+                        comments = []
+                    elif file.get("content") is None:
+                        print(f"Could not read {file['filename']}; it is analyzed at the next event")
+                        continue
+                    else:
+                        comments = utils.extract_comments(file)
+                        if comments is None:
+                            print(f"Could not extract the comments of {file['filename']}; it is analyzed at the next event")
+                            continue
+                        file["comments_metadata"] = comments["metadata"]
+                        comments = add_context_to_comments(comments, file["content"], file["comments_metadata"]["lang"])
+                    # Comments analyzed at a previous head are carried forward as they are;
+                    # only new or modified ones go through the model and GitHub.
+                    comments, file["carried"], file["vanished"] = reconcile_comments(
+                        get_current_file_smells(repo_internal_id, int(payload["number"]), file["filename"]),
+                        file["filename"],
+                        comments,
+                        # On a push the patch is usually the diff from the previous head.
+                        LineMap(file.get("patch"))
+                        if payload["action"] == "synchronize" and file.get("diff_base") == payload.get("before")
+                        else None
                     )
+                    if comments:
+                        comments = filter_comments_by_diff_intersection(file["patch"], comments, file["content"])
+                    file["comments"] = comments
+                    if file["carried"] or file["vanished"]:
+                        print(f"Carried forward {len(file['carried'])} comments, archived {len(file['vanished'])}")
+                    added_lines = parse_added_lines(file["patch"]) if comments else set()
+                    for comment_entry in comments:
+                        comment_entry["priority"] = comment_priority(comment_entry, added_lines)
+                        candidates.append((file, comment_entry))
+                    changed_files.append(file)
+
+            if skipped_files:
+                print(f"Skipping {len(skipped_files)} files analyzed at an earlier push: {', '.join(skipped_files)}")
+            filtered = generated_filter.report
+            if filtered["files"]:
+                print(f"Skipping {filtered['files']} vendored/generated files "
+                      f"({filtered['bytes']} bytes, {filtered['calls']} fetches and model calls avoided): "
+                      + ", ".join(f"{path} ({reason})" for path, reason in filtered["paths"]))
+            update_analysis_job(job_id, files_total=len(changed_files))
+
+            # 2) Pick the highest ranked comments within the comment budget
+            candidates.sort(key=lambda candidate: candidate[1]["priority"], reverse=True)
+            for file, comment_entry in candidates[settings["max_comments"]:]:
+                file["budget_limited"] = True
+                budget_skips.append({"file_path": file["filename"], "line": comment_entry["computed_start_line"],
+                                     "reason": "max_comments", "priority": comment_entry["priority"]})
+            selected = {}
+            for file, comment_entry in candidates[:settings["max_comments"]]:
+                selected.setdefault(file["filename"], []).append(comment_entry)
+
+            # 3) Analyze file by file (best ranked first) and save each file when it is done
+            ordered_files = sorted(changed_files, key=lambda file: file["filename"] not in selected)
+            ordered_files.sort(key=lambda file: -max((c["priority"] for c in selected.get(file["filename"], [])), default=0))
+            files_done = 0
+            # A budget below the cost of one comment (saved before it was
+            # validated) would leave every file incomplete forever.
+            per_comment = max_llm_calls_per_comment(settings["double_iteration"], speculator.enabled)
+            max_llm_calls = max(settings["max_llm_calls"], per_comment)
+            expired = False
+            # TODO remove method level comments for java. python is already handled
+            for file in ordered_files:
+                for comment_entry in selected.get(file["filename"], []):
+                    if past_deadline():
+                        expired = True
+                        break
+                    # Reserve what the comment can cost at most before starting it
+                    if llm_calls_in_context() + per_comment > max_llm_calls:
+                        file["budget_limited"] = True
+                        budget_skips.append({"file_path": file["filename"], "line": comment_entry["computed_start_line"],
+                                             "reason": "max_llm_calls", "priority": comment_entry["priority"]})
+                        continue
+                    analyze_comment(ai_processor, payload, settings, file, comment_entry)
+                # A file with comments left out is analyzed again next time.
+                complete = not expired and not file.get("budget_limited")
+                persist_file_results(pr_id, repo_internal_id, commit_sha, settings, file, complete)
+                if expired:
+                    break
+                files_done += 1
+                update_analysis_job(job_id, files_done=files_done)
+
+        add_analysis_skips(pr_id, repo_internal_id, commit_sha, budget_skips)
+        if budget_skips:
+            print(f"Analysis budget reached: skipped {len(budget_skips)} files/comments "
+                  f"(max {settings['max_files']} files, {settings['max_comments']} comments, "
+                  f"{max_llm_calls} model calls)")
+    except Exception as e:
+        update_analysis_job(job_id, status="failed", error=repr(e))
+        raise
+
+    with open("payloads/changed_files.json", "w") as f:
+        json.dump(changed_files, f, indent=4, default=str)
+
+    # Delete the GitHub comments of suggestions this push superseded. Best
+    # effort: whatever is left stays pending for the next run.
+    try:
+        cleanup = cleanup_comments(pr_id)
+        if any(cleanup.values()):
+            print(f"Comment cleanup: {cleanup['deleted']} deleted, {cleanup['retry']} to retry, {cleanup['failed']} failed")
+    except Exception as e:
+        print("Comment cleanup failed:", e)
 
+    files_total = len(changed_files) + len(skipped_files) + filtered["files"]
+    add_analysis_run(pr_id, repo_internal_id, commit_sha, settings["settings_version"], files_total, len(skipped_files),
+                     filtered["files"], filtered["bytes"], filtered["calls"])
+    if files_total:
+        print(f"Skipped {len(skipped_files)}/{files_total} changed files ({len(skipped_files) / files_total:.0%})")
+
+    status = "expired" if expired else "done"
+    update_analysis_job(job_id, status=status)
+    if expired:
+        print(f"Deadline of {deadline_seconds}s reached after {files_done}/{len(changed_files)} files")
     print(f"Pull request event processed for {repo_full_name} (Internal ID: {repo_internal_id})")
-    
+    if speculator.enabled:
+        print("Speculative repair stats:", speculator.stats)
+    return {"job_id": job_id, "status": status, "files_done": files_done, "files_total": len(changed_files)}
+
+def process_pr_event(payload):
+    owner = str(payload["repository"]["owner"]["login"])
+    repo = str(payload["repository"]["name"])
+    pr_number = str(payload["number"])
+
+    result = analyze_pull_request(payload)
+    if result["status"] == "expired":
+        # Imported here: resume_analysis itself imports this module.
+        from web_ui.resume_analysis import resume_in_background
+        resume_in_background(result["job_id"])
+
     return jsonify({
         "message": "Pull request event processed",
         "owner": owner,
         "repo_name": repo,
         "number": pr_number,
+        "status": result["status"],
     }), 200
-    
\ No newline at end of file
@@ -5,6 +5,15 @@ import json
 import config
 import jwt
 
+# "paginated": list the files of a PR from the pull request files endpoint,
+# page by page (GitHub serves up to 3000 files); "compare": one compare
+# request per event (at most COMPARE_FILE_LIMIT files).
+CHANGED_FILES_MODE = getattr(config, "CHANGED_FILES_MODE", "paginated")
+FILES_PER_PAGE = getattr(config, "CHANGED_FILES_PER_PAGE", 100)
+COMPARE_FILE_LIMIT = 300
+# Read changed files from a local mirror clone (see web_ui/git_mirror.py).
+GIT_MIRROR_ENABLED = getattr(config, "GIT_MIRROR_ENABLED", False)
+
 def get_jwt():
     """Generates a JWT for GitHub App authentication."""
     now = int(time.time())
@@ -39,12 +48,18 @@ def add_content_to_files(token, changed_files):
     }
     
     for file in changed_files:
+        if file.get("status") == "removed":
+            # Nothing to read at the head
+            file["content"] = None
+            continue
         contents_url = file.get("contents_url")
         if contents_url:
             response = requests.get(contents_url, headers=headers)
             if response.status_code == 200:
-                file_content = response.json().get("content")
-                decoded_content = base64.b64decode(file_content).decode('utf-8') if file_content else None
+                body = response.json()
+                # An empty file is "" (base64); a file too large for this API has no content
+                file_content = body.get("content") if body.get("encoding") == "base64" else None
+                decoded_content = base64.b64decode(file_content).decode('utf-8') if file_content is not None else None
                 file["content"] = decoded_content
             else:
                 print(f"Failed to fetch content for {file['filename']}: {response.status_code}")
@@ -65,52 +80,201 @@ def get_base_and_head_sha(payload):
             return pr["base"]["sha"], pr["head"]["sha"]
     return None, None
     
-def get_changed_files(payload):
-
-    def get_compare_url(payload):
-        """
-        Generate a GitHub compare URL from the webhook payload.
-        For "synchronize" events, it uses the 'before' and 'after' fields.
-        For "opened" or "reopened" events, it uses the 'base' and 'head' fields
-        within the pull_request object.
-        """
-        # Try to determine if it's a "synchronize" or "opened"/"reopened" payload
-        base_sha, head_sha = get_base_and_head_sha(payload)
-        repo_full_name = payload["repository"]["full_name"]
-        
-        if repo_full_name and base_sha and head_sha:
-            return f"https://api.github.com/repos/{repo_full_name}/compare/{base_sha}...{head_sha}"
-        else:
-            return None
+def get_compare_url(payload):
+    """
+    Generate a GitHub compare URL from the webhook payload.
+    For "synchronize" events, it uses the 'before' and 'after' fields.
+    For "opened" or "reopened" events, it uses the 'base' and 'head' fields
+    within the pull_request object.
+    """
+    # Try to determine if it's a "synchronize" or "opened"/"reopened" payload
+    base_sha, head_sha = get_base_and_head_sha(payload)
+    repo_full_name = payload["repository"]["full_name"]
+    
+    if repo_full_name and base_sha and head_sha:
+        return f"https://api.github.com/repos/{repo_full_name}/compare/{base_sha}...{head_sha}"
+    else:
+        return None
 
-    installation_id = str(payload["installation"]["id"])
-    owner = str(payload["repository"]["owner"]["login"])
-    repo = str(payload["repository"]["name"])
-    pr_number = str(payload["number"])
+def iter_pull_request_file_pages(payload, token, skip=()):
+    """
+    Yield the changed files of the PR (against its base) one page at a time
+    from the pull request files endpoint, leaving out filenames in `skip`.
+    """
+    url = f"https://api.github.com/repos/{payload['repository']['full_name']}/pulls/{payload['number']}/files"
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/vnd.github+json"
+    }
+    base_sha = payload["pull_request"]["base"]["sha"]
+    params = {"per_page": FILES_PER_PAGE, "page": 1}
+    while url:
+        response = requests.get(url, headers=headers, params=params)
+        data = response.json()
+        if response.status_code != 200:
+            print("Error retrieving changed files:", data)
+            return
+        for file in data:
+            file["diff_base"] = base_sha
+        yield [file for file in data if file["filename"] not in skip]
+        # The next link already carries the query parameters.
+        url, params = response.links.get("next", {}).get("url"), None
 
-    """Retrieve the list of changed files in a pull request."""
-    token = get_installation_access_token(installation_id)
-    if not token:
-        return None
+def iter_changed_file_pages(payload, token):
+    """
+    Yield the changed files of a PR event, page by page, as returned by GitHub.
+    Each file gets "diff_base", the commit its patch is relative to.
+
+    A push is compared with the previous head (one compare request, which
+    GitHub cuts at COMPARE_FILE_LIMIT files); in "paginated" mode the files
+    beyond that are listed from the pull request files endpoint, with
+    patches against the PR base. Other events use the pull request files
+    endpoint in "paginated" mode and one compare request in "compare" mode.
+    """
+    is_push = "before" in payload and "after" in payload
+    if CHANGED_FILES_MODE == "paginated" and not is_push:
+        yield from iter_pull_request_file_pages(payload, token)
+        return
 
-    url = get_compare_url(payload)
     headers = {
         "Authorization": f"Bearer {token}",
         "Accept": "application/vnd.github+json"
     }
-    response = requests.get(url, headers=headers)
+    response = requests.get(get_compare_url(payload), headers=headers)
+    data = response.json()
     #save response as json
     with open("payloads/response.json", "w") as f:
-        json.dump(response.json(), f, indent=4)
-    if response.status_code == 200:
-        files = response.json().get("files", [])  # Extract the 'files' key from the response
+        json.dump(data, f, indent=4)
+    if response.status_code != 200:
+        print("Error retrieving changed files:", data)
+        return
+    files = data.get("files", [])  # Extract the 'files' key from the response
+    base_sha, _ = get_base_and_head_sha(payload)
+    for file in files:
+        file["diff_base"] = base_sha
+    yield files
+
+    if len(files) >= COMPARE_FILE_LIMIT and CHANGED_FILES_MODE == "paginated":
+        print(f"Compare listed only {len(files)} files; listing the rest from the pull request")
+        yield from iter_pull_request_file_pages(payload, token, {file["filename"] for file in files})
+
+def patches_from_diff_lines(lines, paths):
+    """
+    Split the lines of a unified diff (as produced by git diff) and return
+    {path: patch} for the files in `paths`, in the format of the API's
+    "patch" field (hunks only). Lines of other files are not kept, and
+    reading stops once every requested file has been seen.
+    """
+    patches = {}
+    wanted = set(paths)
+    current = old_path = None
+    in_header = False
+    for line in lines:
+        if line.startswith("diff --git "):
+            if current is not None:
+                wanted.discard(current)
+                if not wanted:
+                    break
+            current, in_header = None, True
+        elif in_header:
+            # "--- a/path", "+++ b/path", mode and index lines up to the first hunk
+            if line.startswith("--- "):
+                old_path = line[6:] if line.startswith("--- a/") else None
+            elif line.startswith("+++ "):
+                # A removed file is "+++ /dev/null" and keeps its old path
+                path = line[6:] if line.startswith("+++ b/") else old_path
+                current = path if path in wanted else None
+            elif line.startswith("@@"):
+                in_header = False
+                if current is not None:
+                    patches[current] = line
+        elif current is not None:
+            patches[current] += "\n" + line
+    return patches
+
+def read_patches_from_diff(url, token, paths):
+    """
+    Stream the unified diff at `url` and return {path: patch} for the files
+    in `paths` (see patches_from_diff_lines).
+    """
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/vnd.github.diff"
+    }
+    with requests.get(url, headers=headers, stream=True) as response:
+        if response.status_code != 200:
+            print(f"Failed to fetch the diff: {response.status_code}")
+            return {}
+        return patches_from_diff_lines(response.iter_lines(decode_unicode=True), paths)
+
+def add_missing_patches(payload, token, changed_files):
+    """
+    GitHub leaves out the patch of large diffs. Read the patches of such
+    files from the raw diff; files whose patch cannot be found either are
+    dropped, since their changed lines are unknown.
+    Returns the files that have a patch.
+    """
+    missing = {}
+    for file in changed_files:
+        if file.get("patch") is None and file["status"] != "removed":
+            missing.setdefault(file["diff_base"], []).append(file)
+    if not missing:
+        return changed_files
+
+    _, head_sha = get_base_and_head_sha(payload)
+    repo_full_name = payload["repository"]["full_name"]
+    for diff_base, files in missing.items():
+        url = f"https://api.github.com/repos/{repo_full_name}/compare/{diff_base}...{head_sha}"
+        patches = read_patches_from_diff(url, token, [file["filename"] for file in files])
+        for file in files:
+            file["patch"] = patches.get(file["filename"])
+            if file["patch"] is None:
+                print(f"No patch for {file['filename']}; skipping it")
+    return [file for file in changed_files if file.get("patch") is not None or file["status"] == "removed"]
+
+def iter_changed_files(payload, file_filter=None, budget_filter=None):
+    """
+    Yield the changed Java and Python files of a PR event with their content,
+    one page at a time, so each page is processed before the next is fetched.
+    If `file_filter` is given, only files for which file_filter(file) is true
+    are kept, before their content is fetched. `budget_filter` works the same
+    way, but only sees files that have a patch (e.g. to count them against a
+    budget). Removed files are kept, with content None.
+    With GIT_MIRROR_ENABLED the files come from the local mirror instead.
+    """
+    if GIT_MIRROR_ENABLED:
+        # Imported here: git_mirror itself imports this module.
+        from web_ui import git_mirror
+        yield from git_mirror.iter_changed_files(payload, file_filter, budget_filter)
+        return
+    yield from iter_api_changed_files(payload, file_filter, budget_filter)
+
+def iter_api_changed_files(payload, file_filter=None, budget_filter=None):
+    """iter_changed_files served from the REST API."""
+    installation_id = str(payload["installation"]["id"])
+
+    token = get_installation_access_token(installation_id)
+    if not token:
+        return
+
+    for files in iter_changed_file_pages(payload, token):
         # only keep python and java files
         files = [file for file in files if file["filename"].endswith(('.java', '.py'))]
+        if file_filter is not None:
+            files = [file for file in files if file_filter(file)]
+        files = add_missing_patches(payload, token, files)
+        if budget_filter is not None:
+            files = [file for file in files if budget_filter(file)]
         add_content_to_files(token, files)
-        return files
-    else:
-        print("Error retrieving changed files:", response.json())
-        return None
+        yield files
+
+def get_changed_files(payload, file_filter=None):
+    """
+    Retrieve the changed Java and Python files of a PR event with their content.
+    If `file_filter` is given, only files for which file_filter(file) is true
+    are kept, before their content is fetched.
+    """
+    return [file for files in iter_changed_files(payload, file_filter) for file in files]
     
 def post_multiline_comment(url, token, path, start_line, end_line, head_sha, base_sha, comment_body, side="RIGHT"):
     """
@@ -0,0 +1,59 @@
+import re
+
+HUNK_HEADER = re.compile(r'@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+
+class LineMap:
+    """
+    Translate line numbers of a file at an old commit to the same lines at a
+    new commit, using the unified diff patch between the two (the "patch" of
+    a file in GitHub's compare response).
+
+    Lines outside every hunk move by the size difference of the hunks above
+    them; context lines inside a hunk are followed one by one. Lines that
+    were removed or rewritten have no counterpart and map to None.
+    """
+
+    def __init__(self, patch):
+        # (old_start, old_count, new_start, new_count, {old line: new line})
+        self.hunks = []
+        self.known = patch is not None
+        hunk = None
+        old_line = new_line = 0
+        for line in (patch or "").splitlines():
+            match = HUNK_HEADER.match(line)
+            if match:
+                old_start, old_count, new_start, new_count = (
+                    int(group) if group is not None else 1 for group in match.groups()
+                )
+                hunk = {}
+                old_line, new_line = old_start, new_start
+                # For an empty side the header names the line before the change.
+                self.hunks.append((
+                    old_start + (old_count == 0), old_count,
+                    new_start + (new_count == 0), new_count,
+                    hunk
+                ))
+            elif hunk is None or line.startswith("\\"):
+                continue  # file header or "\ No newline at end of file"
+            elif line.startswith("-"):
+                old_line += 1
+            elif line.startswith("+"):
+                new_line += 1
+            else:
+                hunk[old_line] = new_line
+                old_line += 1
+                new_line += 1
+
+    def map_line(self, line):
+        """Return the new line number of old line `line`, or None if it changed."""
+        if not self.known:
+            return None
+        offset = 0
+        for old_start, old_count, new_start, new_count, hunk in self.hunks:
+            if line < old_start:
+                break
+            if line < old_start + old_count:
+                return hunk.get(line)
+            offset = (new_start + new_count) - (old_start + old_count)
+        return line + offset
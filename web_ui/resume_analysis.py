@@ -0,0 +1,82 @@
+"""
+Resume pull request analyses that did not finish.
+
+analyze_pull_request saves every file as soon as it is done and records the
+event in analysis_jobs. A job stays 'expired' when the webhook ran out of
+time (ANALYSIS_DEADLINE_SECONDS), 'failed' when a file raised, and
+'running' when the worker was killed.
+Resuming runs the stored payload again: files saved by the earlier attempt
+are skipped (their blob is already analyzed), so only the rest is done.
+
+An expired job is resumed right away in a background thread of the
+process that answered the webhook. Failed jobs and jobs whose process died
+are only resumed by running this module, e.g. from a periodic job:
+
+    python -m web_ui.resume_analysis              # all expired/failed/stale jobs
+    python -m web_ui.resume_analysis --job 42
+"""
+import argparse
+import threading
+import config
+from database.database import get_resumable_analysis_jobs, count_analysis_job_attempt
+from web_ui.github_event_handler import analyze_pull_request
+
+# A running job not updated for this long is taken to have lost its worker.
+STALE_SECONDS = getattr(config, "ANALYSIS_JOB_STALE_SECONDS", 300)
+MAX_ATTEMPTS = getattr(config, "ANALYSIS_JOB_MAX_ATTEMPTS", 3)
+
+
+def resume_jobs(job_id=None, deadline_seconds=None):
+    """
+    Resume one job, or every resumable job below MAX_ATTEMPTS.
+    Returns a dict with the number of jobs finished, still unfinished and
+    failed.
+    """
+    result = {"done": 0, "expired": 0, "failed": 0}
+    for job in get_resumable_analysis_jobs(STALE_SECONDS, job_id):
+        if job_id is None and job["attempts"] >= MAX_ATTEMPTS:
+            continue
+        print(f"Resuming analysis job {job['id']} ({job['status']}, attempt {job['attempts'] + 1})")
+        count_analysis_job_attempt(job["id"])
+        try:
+            outcome = analyze_pull_request(job["payload"], deadline_seconds)
+        except Exception as e:
+            print(f"Analysis job {job['id']} failed again: {e}")
+            result["failed"] += 1
+            continue
+        result[outcome["status"]] += 1
+    return result
+
+
+def resume_in_background(job_id):
+    """
+    Resume an expired job in a daemon thread, without a deadline, unless a
+    later event has taken it over (or finished it) by the time it starts.
+    """
+    def run():
+        jobs = get_resumable_analysis_jobs(STALE_SECONDS, job_id)
+        if not jobs or jobs[0]["status"] != "expired":
+            return
+        result = resume_jobs(job_id)
+        print(f"Background resume of analysis job {job_id}: {result}")
+
+    thread = threading.Thread(target=run, name=f"resume-analysis-{job_id}", daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resume unfinished pull request analyses.")
+    parser.add_argument("--job", type=int, help="resume only this job")
+    parser.add_argument("--deadline", type=float, default=None,
+                        help="stop each job after this many seconds (default: no limit)")
+    args = parser.parse_args()
+
+    from database.database import init_db
+    init_db()
+    result = resume_jobs(args.job, args.deadline)
+    print(f"Resumed analyses: {result['done']} done, {result['expired']} unfinished, {result['failed']} failed")
+
+
+if __name__ == "__main__":
+    main()
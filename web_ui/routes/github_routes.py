@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify
-from web_ui.github_event_handler import process_installation_event, process_pr_event
+from web_ui.github_event_handler import process_installation_event, process_installation_repositories_event, process_pr_event
 import json
 
 github_bp = Blueprint('github', __name__)
@@ -14,6 +14,8 @@ def github_app_event():
         json.dump(payload, f, indent=4)
     if event_type == "installation":
         return process_installation_event(payload)
+    elif event_type == "installation_repositories":
+        return process_installation_repositories_event(payload)
     elif event_type == "pull_request":
         return process_pr_event(payload)
     elif event_type == "ping":
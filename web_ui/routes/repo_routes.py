@@ -1,12 +1,53 @@
-from flask import Blueprint, json, render_template, request, flash, redirect, url_for
+from flask import Blueprint, json, jsonify, render_template, request, flash, redirect, url_for
+from datetime import date
+import base64
 import sqlite3
-from config import DB_PATH
+from database.connection import get_connection
 import database.installations_repositories as repo_db
 import database.database as database
-from collections import defaultdict
+from ai_content.usage import estimate_cost, max_llm_calls_per_comment
 
 repo_bp = Blueprint('repo_routes', __name__, template_folder='../templates/repository')
 
+MAX_PAGE_SIZE = 200
+
+
+def _encode_cursor(after):
+    """Turn a keyset tuple into an opaque URL-safe cursor string."""
+    if after is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(list(after)).encode()).decode()
+
+
+def _decode_cursor(cursor, size):
+    """Inverse of _encode_cursor; raises ValueError for malformed cursors."""
+    if not cursor:
+        return None
+    try:
+        after = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor.")
+    if not isinstance(after, list) or len(after) != size:
+        raise ValueError("Invalid cursor.")
+    return tuple(after)
+
+
+def _page_args(default_limit, default_fields, cursor_size):
+    """
+    Parse the limit, cursor and fields query parameters shared by the list APIs.
+    Returns (limit, after, fields); raises ValueError on bad input.
+    """
+    try:
+        limit = int(request.args.get("limit", default_limit))
+    except ValueError:
+        raise ValueError("limit must be an integer.")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after = _decode_cursor(request.args.get("cursor"), cursor_size)
+    fields = request.args.get("fields")
+    fields = tuple(f.strip() for f in fields.split(",") if f.strip()) if fields else default_fields
+    return limit, after, fields
+
+
 @repo_bp.route('/r/<repo_id>', methods=['GET'])
 def repo_dashboard(repo_id):
     """
@@ -19,9 +60,9 @@ def repo_dashboard(repo_id):
         return redirect(url_for('main_routes.main_page'))
 
     # 2) Open a DB connection
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = get_connection()
     c = conn.cursor()
+    c.row_factory = sqlite3.Row
 
     # 3) total_prs
     c.execute("""
@@ -31,30 +72,9 @@ def repo_dashboard(repo_id):
     """, (repo_id,))
     total_prs = c.fetchone()[0]
 
-    # 4) total_smells (only active + repair_enabled)
-    c.execute("""
-      SELECT COUNT(*) 
-        FROM comment_smells cs
-        JOIN pull_requests pr ON cs.pr_id = pr.id
-       WHERE pr.repo_internal_id = ?
-         AND cs.is_current = 1
-         AND cs.repair_enabled = 1
-    """, (repo_id,))
-    total_smells = c.fetchone()[0]
-
-    # 5) most_common_smell
-    c.execute("""
-      SELECT cs.smell_type, COUNT(*) AS cnt
-        FROM comment_smells cs
-        JOIN pull_requests pr ON cs.pr_id = pr.id
-       WHERE pr.repo_internal_id = ?
-         AND cs.is_current = 1
-       GROUP BY cs.smell_type
-       ORDER BY cnt DESC
-       LIMIT 1
-    """, (repo_id,))
-    row = c.fetchone()
-    most_common_smell = row['smell_type'] if row else None
+    # 4) total_smells (only active + repair_enabled) and 5) most_common_smell,
+    #    read from the per-day rollups instead of scanning comment_smells
+    total_smells, most_common_smell = database.get_smell_totals(repo_id)
 
     stats = {
         "total_prs": total_prs,
@@ -62,120 +82,129 @@ def repo_dashboard(repo_id):
         "most_common_smell": most_common_smell or "—"
     }
 
-    # 6) PR list (with date from created_at)
-    c.execute("""
-      SELECT pr_number, title, smell_count, created_at, status
-        FROM pull_requests
-       WHERE repo_internal_id = ?
-       ORDER BY created_at DESC
-    """, (repo_id,))
-    pr_list = []
-    for r in c.fetchall():
-        pr_list.append({
-            "pr_number":    r["pr_number"],
-            "title":        r["title"],
-            "smell_count":  r["smell_count"],
-            "date":         r["created_at"][:10],
-            "url":          f"https://github.com/{repo['repo_full_name']}/pull/{r['pr_number']}",
-            "status":       r["status"],
-        })
-
-    # 7) Smell‐reports time series
-    c.execute("""
-      SELECT cs.created_at, cs.smell_type
-        FROM comment_smells cs
-        JOIN pull_requests pr ON cs.pr_id = pr.id
-       WHERE pr.repo_internal_id = ?
-       ORDER BY cs.created_at DESC
-    """, (repo_id,))
-    smell_reports = [
-        {"date": r["created_at"][:10], "smell_type": r["smell_type"]}
-        for r in c.fetchall()
-    ]
-    smell_reports_json = json.dumps(smell_reports)
+    # 6) The PR list is loaded page by page from the pull_requests API
 
-    conn.close()
+    # 7) LLM usage rollups (per setting and per PR)
+    usage_by_setting = database.get_llm_usage_for_repo(repo_id)
+    for u in usage_by_setting:
+        u["cost"] = estimate_cost(u["prompt_tokens"], u["completion_tokens"])
+    usage_by_pr = database.get_llm_usage_by_pr(repo_id)
+    for u in usage_by_pr:
+        u["cost"] = estimate_cost(u["prompt_tokens"], u["completion_tokens"])
+    total_calls = sum(u["calls"] for u in usage_by_setting)
+    llm_usage = {
+        "calls": total_calls,
+        "cache_hit_rate": (sum(u["cache_hits"] for u in usage_by_setting) / total_calls) if total_calls else 0,
+        "tokens": sum(u["prompt_tokens"] + u["completion_tokens"] for u in usage_by_setting),
+        "cost": sum(u["cost"] for u in usage_by_setting),
+        "p95_latency_ms": database.get_llm_latency_percentile(repo_id, 0.95),
+        "by_setting": usage_by_setting,
+        "by_pr": usage_by_pr,
+    }
 
     return render_template(
         "repo_page.html",
         repo=repo,
         stats=stats,
-        pr_list=pr_list,
-        smell_reports_json=smell_reports_json
+        llm_usage=llm_usage
     )
 
+@repo_bp.route('/r/<repo_id>/api/smell-series', methods=['GET'])
+def smell_series(repo_id):
+    """
+    Reported smells per bucket and smell type, for the dashboard chart.
+    Query parameters: bucket=day|week|month (default day) and optional
+    start/end dates (YYYY-MM-DD, inclusive).
+    """
+    if not repo_db.get_repository_by_internal_id(repo_id):
+        return jsonify({"error": "Repository not found."}), 404
+
+    bucket = request.args.get("bucket", "day")
+    if bucket not in database.BUCKET_EXPRESSIONS:
+        return jsonify({"error": "bucket must be one of: day, week, month."}), 400
+    bounds = {}
+    for name in ("start", "end"):
+        value = request.args.get(name) or None
+        if value is not None:
+            try:
+                value = date.fromisoformat(value).isoformat()
+            except ValueError:
+                return jsonify({"error": f"{name} must be a YYYY-MM-DD date."}), 400
+        bounds[name] = value
+
+    return jsonify({
+        "bucket": bucket,
+        "start": bounds["start"],
+        "end": bounds["end"],
+        "series": database.get_smell_series(repo_id, bounds["start"], bounds["end"], bucket),
+    })
+
+@repo_bp.route('/r/<repo_id>/api/pulls', methods=['GET'])
+def pull_requests_api(repo_id):
+    """
+    Keyset-paginated PR list, newest first.
+    Query parameters: limit, cursor (next_cursor of the previous page) and
+    fields (comma-separated subset of PULL_REQUEST_FIELDS).
+    """
+    if not repo_db.get_repository_by_internal_id(repo_id):
+        return jsonify({"error": "Repository not found."}), 404
+    try:
+        limit, after, fields = _page_args(50, database.PULL_REQUEST_FIELDS, 2)
+        rows, next_after = database.get_pull_requests_page(repo_id, after, limit, fields)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"items": rows, "next_cursor": _encode_cursor(next_after)})
+
+@repo_bp.route('/r/<repo_id>/pr/<int:pr_number>/api/smells', methods=['GET'])
+def pr_smells_api(repo_id, pr_number):
+    """
+    Keyset-paginated list of a PR's current smells, ordered by file and line.
+    Query parameters: limit, cursor and fields (comma-separated subset of
+    COMMENT_SMELL_FIELDS; associated_code is omitted unless requested).
+    """
+    pr = database.get_pull_request(repo_id, pr_number)
+    if not pr:
+        return jsonify({"error": f"PR #{pr_number} not found."}), 404
+    try:
+        limit, after, fields = _page_args(100, database.DEFAULT_COMMENT_SMELL_FIELDS, 3)
+        rows, next_after = database.get_comment_smells_page(pr["id"], after, limit, fields)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"items": rows, "next_cursor": _encode_cursor(next_after)})
+
+@repo_bp.route('/r/<repo_id>/pr/<int:pr_number>/api/smells/<int:smell_id>', methods=['GET'])
+def pr_smell_api(repo_id, pr_number, smell_id):
+    """
+    A single smell of a PR; used to fetch associated_code when a row is expanded.
+    Query parameter: fields (defaults to every column).
+    """
+    pr = database.get_pull_request(repo_id, pr_number)
+    if not pr:
+        return jsonify({"error": f"PR #{pr_number} not found."}), 404
+    fields = request.args.get("fields")
+    fields = tuple(f.strip() for f in fields.split(",") if f.strip()) if fields else database.COMMENT_SMELL_FIELDS
+    try:
+        smell = database.get_comment_smell(pr["id"], smell_id, fields)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if smell is None:
+        return jsonify({"error": "Smell not found."}), 404
+    return jsonify(smell)
+
 @repo_bp.route('/r/<repo_id>/pr/<int:pr_number>', methods=['GET'])
 def pr_analysis(repo_id, pr_number):
     """
     PR Analysis Page: detailed breakdown for a specific pull request,
     pulling real comment‐smell data.
     """
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-
     # 1) Find the PR ID & metadata
-    c.execute("""
-      SELECT
-        id,
-        title,
-        smell_count,
-        status,
-        created_at,
-        updated_at
-      FROM pull_requests
-      WHERE repo_internal_id = ?
-      AND pr_number = ?
-    """, (repo_id, pr_number))
-    pr = c.fetchone()
+    pr = database.get_pull_request(repo_id, pr_number)
     if not pr:
         flash(f"PR #{pr_number} not found.", "warning")
-        conn.close()
         return redirect(url_for('repo_routes.repo_dashboard', repo_id=repo_id))
 
-    # 2) Fetch all active comment‐smells for this PR, including the GitHub link
-    c.execute("""
-    SELECT
-        id                    AS comment_id,
-        file_path             AS file,
-        line,
-        smell_type,
-        associated_code       AS code_block,
-        comment_body          AS original,
-        suggestion,
-        status,
-        github_comment_url    AS url
-    FROM comment_smells
-    WHERE pr_id = ?
-        AND is_current = 1
-        AND repair_enabled = 1
-    ORDER BY file_path, line
-    """, (pr["id"],))
-
-    smell_details = []
-    for r in c.fetchall():
-        smell_details.append({
-            "comment_id": r["comment_id"],
-            "file":       r["file"],
-            "line":       r["line"],
-            "smell_type": r["smell_type"],
-            "original":   r["original"],
-            "suggested":  r["suggestion"],
-            "code_block": r["code_block"],
-            "status":     r["status"],
-            "url":        r["url"]
-        })
-
-    # # update file randomly
-    # files = ["folder1/file1.java", "folder1/file2.java", "file3.java", "file4.java", "folder2/file1.java"]
-    # #iterate over the smell_details and update the file randomly
-    # for i in range(len(smell_details)):
-    #     smell_details[i]["file"] = files[i % len(files)]    
-    
-    conn.close()
-    file_groups = defaultdict(list)
-    for s in smell_details:
-        file_groups[s["file"]].append(s)
+    # 2) Comment smells are loaded page by page from the smells API, and each
+    #    code block only when its row is expanded
 
     return render_template(
         "pr_analysis.html",
@@ -187,9 +216,7 @@ def pr_analysis(repo_id, pr_number):
             "created_at":   pr["created_at"],
             "updated_at":   pr["updated_at"],
             "smell_count":  pr["smell_count"],
-            "smell_details": smell_details,
         },
-        file_groups=file_groups,
     )
 
 @repo_bp.route('/r/<repo_id>/settings', methods=['GET', 'POST'])
@@ -204,43 +231,32 @@ def repo_settings(repo_id):
         create_issues = request.form.get('create_issues') == 'on'
         enabled_smells = request.form.getlist('enabled_smells')
         double_iteration  = request.form.get('double_iteration') == 'on'
+        # Per-event budgets; empty (or invalid) means the default
+        max_files = request.form.get('max_files', type=int)
+        max_comments = request.form.get('max_comments', type=int)
+        max_llm_calls = request.form.get('max_llm_calls', type=int)
+        if any(limit is not None and limit < 1 for limit in (max_files, max_comments)):
+            flash("Maximum files and comments must be at least 1.", "danger")
+            return redirect(url_for('repo_routes.repo_settings', repo_id=repo_id))
+        # Below the cost of one comment nothing could ever be analyzed
+        min_llm_calls = max_llm_calls_per_comment(double_iteration)
+        if max_llm_calls is not None and max_llm_calls < min_llm_calls:
+            flash(f"Maximum model calls must be at least {min_llm_calls}"
+                  f"{' with double iteration' if double_iteration else ''}.", "danger")
+            return redirect(url_for('repo_routes.repo_settings', repo_id=repo_id))
+        # One glob per line
+        skip_globs = [g.strip() for g in request.form.get('skip_globs', '').splitlines() if g.strip()]
         
         # Update the settings in the database
-        database.update_repo_settings(repo_id, create_issues, enabled_smells, double_iteration)
+        database.update_repo_settings(repo_id, create_issues, enabled_smells, double_iteration,
+                                      max_files, max_comments, max_llm_calls, skip_globs)
         
         flash("Settings updated.", "success")
         return redirect(url_for('repo_routes.repo_settings', repo_id=repo_id))
     
-    # For GET: load current settings.
-    # Retrieve settings from the database.
-    # If not found, use default dummy settings.
-
-    current_settings = {
-        "create_issues": True,
-        "enabled_smells": ["Misleading", "Obvious", "Commented out code", "Irrelevant", "Task", "Too much info", "Beautification", "Nonlocal info", "Vague"],
-        "double_iteration": False
-    }
-    # Try to fetch settings from the repo_settings table.
-    settings_row = None
-    import sqlite3
-    try:
-        with sqlite3.connect(database.DB_PATH) as conn:
-            c = conn.cursor()
-            c.execute("""
-                SELECT create_issues, enabled_smells, double_iteration
-                FROM repo_settings
-                WHERE repo_internal_id = ?
-            """, (repo_id,))
-            settings_row = c.fetchone()
-    except Exception as e:
-        print("Error fetching repo settings:", e)
-    
-    if settings_row:
-        current_settings['create_issues'] = bool(settings_row[0])
-        try:
-            current_settings['enabled_smells'] = json.loads(settings_row[1])
-        except Exception:
-            current_settings['enabled_smells'] = []
-        current_settings['double_iteration'] = bool(settings_row[2])
+    # For GET: load current settings (defaults if none are stored).
+    current_settings = database.get_repo_settings(repo_id)
     
-    return render_template("repo_settings.html", repo_id=repo_id, settings=current_settings)
\ No newline at end of file
+    return render_template("repo_settings.html", repo_id=repo_id, settings=current_settings,
+                           min_llm_calls=max_llm_calls_per_comment(False),
+                           min_llm_calls_double=max_llm_calls_per_comment(True))
\ No newline at end of file
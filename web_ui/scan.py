@@ -0,0 +1,230 @@
+"""
+Scan every Java and Python file of a local checkout, outside of any pull
+request, to baseline an existing codebase.
+
+    python -m web_ui.scan /path/to/checkout --repo owner/name
+
+The results are stored like those of a pull request, under pr_number 0
+(SCAN_PR_NUMBER) of the repository, so they show up on its dashboard.
+Nothing is posted to GitHub.
+
+- Files are read, and their comments extracted and given context, in a
+  process pool (nirjas and file_utils are CPU bound).
+- Comments go through the model in a thread pool of --ai-concurrency.
+- The results of every --batch-size files are written in one transaction.
+- A rerun skips files whose blob a previous run already saved under the
+  same settings, so an interrupted scan resumes where it stopped, and
+  unchanged comments are carried forward.
+
+Vendored and generated files are skipped like in pull requests.
+"""
+import argparse
+import contextvars
+import hashlib
+import os
+import subprocess
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+import config
+import web_ui.utils as utils
+from database.database import *
+from web_ui.file_utils import add_context_to_comments
+from web_ui.file_filters import DEFAULT_SKIP_GLOBS, path_skip_reason, gitattributes_skip_globs, has_generated_marker
+from web_ui.github_event_handler import analyze_comment, file_analysis_records, reconcile_comments
+from ai_content.usage import usage_context
+
+SCAN_PR_NUMBER = 0
+WORKERS = getattr(config, "SCAN_WORKERS", os.cpu_count() or 1)
+AI_CONCURRENCY = getattr(config, "SCAN_AI_CONCURRENCY", 4)
+BATCH_SIZE = getattr(config, "SCAN_BATCH_SIZE", 200)
+# Directories that are never walked into.
+SKIP_DIRS = {".git", ".hg", ".svn", "__pycache__", ".venv", "venv", ".tox", "node_modules"}
+
+
+def git_blob_sha(data):
+    """The sha git gives a blob with contents `data` (as in the files table)."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def iter_source_files(root):
+    """Yield the paths (relative, with "/") of the Java and Python files under `root`."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(name for name in dirnames if name not in SKIP_DIRS)
+        for name in sorted(filenames):
+            if not name.endswith(('.java', '.py')):
+                continue
+            yield os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, "/")
+
+
+def prepare_file(root, path, analyzed_sha=None):
+    """
+    Process pool worker: read one file and extract its comments with their
+    context. Returns the file dict; file["skip"] says why a file has nothing
+    to analyze ("analyzed", "generated" or "unreadable"). An empty file is
+    analyzed with no comments.
+    """
+    with open(os.path.join(root, path), "rb") as f:
+        data = f.read()
+    file = {"filename": path, "sha": git_blob_sha(data), "status": "scanned"}
+    if file["sha"] == analyzed_sha:
+        file["skip"] = "analyzed"
+        return file
+    file["content"] = data.decode("utf-8", "replace")
+    if not file["content"]:
+        file["comments"] = []
+        return file
+    if has_generated_marker(file["content"]):
+        file["skip"] = "generated"
+        return file
+    comments = utils.extract_comments(file)
+    if comments is None:
+        file["skip"] = "unreadable"
+        return file
+    file["comments_metadata"] = comments["metadata"]
+    file["comments"] = add_context_to_comments(comments, file["content"], file["comments_metadata"]["lang"])
+    return file
+
+
+def _prepare_files(processes, root, paths, analyzed_blobs, window):
+    """Yield prepare_file results in path order, keeping at most `window` files in flight."""
+    pending = deque()
+    for path in paths:
+        pending.append(processes.submit(prepare_file, root, path, analyzed_blobs.get(path)))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _head_commit(root):
+    """The commit checked out at `root`, or "working-tree" if it is not a git checkout."""
+    result = subprocess.run(["git", "-C", root, "rev-parse", "HEAD"], capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else "working-tree"
+
+
+def scan(root, repo_full_name, workers=WORKERS, ai_concurrency=AI_CONCURRENCY, batch_size=BATCH_SIZE):
+    """
+    Scan the checkout at `root` as repository `repo_full_name`, which must be
+    installed. Returns a dict of counts: files analyzed, skipped (analyzed
+    before), filtered (vendored or generated), failed, comments analyzed and
+    carried forward, and the elapsed seconds.
+    """
+    repo_internal_id = get_repository_id_by_full_name(repo_full_name)
+    if repo_internal_id is None:
+        raise ValueError(f"Repository {repo_full_name} is not installed")
+    settings = get_repo_settings(repo_internal_id)
+    commit_sha = _head_commit(root)
+    pr_id = add_or_update_pull_request(
+        repo_internal_id = repo_internal_id,
+        pr_number        = SCAN_PR_NUMBER,
+        title            = "Repository scan",
+        status           = "scan",
+        created_at       = datetime.now(timezone.utc).isoformat()
+    )
+
+    skip_globs = list(DEFAULT_SKIP_GLOBS) + settings["skip_globs"]
+    attribute_globs = []
+    gitattributes = os.path.join(root, ".gitattributes")
+    if os.path.exists(gitattributes):
+        with open(gitattributes, encoding="utf-8", errors="replace") as f:
+            attribute_globs = gitattributes_skip_globs(f.read())
+    analyzed_blobs = get_analyzed_blob_shas(repo_internal_id, SCAN_PR_NUMBER, settings["settings_version"])
+
+    from ai_content.main import get_ai_processor
+    ai_processor = get_ai_processor()
+    stats = {"files": 0, "skipped": 0, "filtered": 0, "failed": 0, "comments": 0, "carried": 0}
+    started = time.monotonic()
+
+    def analyze(context, file, comment_entry):
+        try:
+            context.run(analyze_comment, ai_processor, None, settings, file, comment_entry, False)
+        except Exception as e:
+            print(f"Analyzing a comment of {file['filename']} failed: {e}")
+            file["failed"] = True
+
+    def flush(batch, threads):
+        """Analyze the comments of a batch of files and save it in one transaction."""
+        entries = [(file, comment_entry) for file in batch for comment_entry in file["comments"]]
+        # Each task runs in its own copy of this thread's context, so its model
+        # calls are attributed to the scan (see usage_context).
+        list(threads.map(
+            analyze,
+            [contextvars.copy_context() for _ in entries],
+            [file for file, _ in entries],
+            [comment_entry for _, comment_entry in entries]
+        ))
+        files, smells, carried, vanished = [], [], [], []
+        for file in batch:
+            # A file with a failed comment gets no files record and is scanned again
+            records = file_analysis_records(commit_sha, settings, file, not file.get("failed"))
+            for collected, part in zip((files, smells, carried, vanished), records):
+                collected.extend(part)
+            stats["failed"] += bool(file.get("failed"))
+        add_pr_analysis_results(pr_id, repo_internal_id, files, smells, carried, vanished)
+        stats["files"] += len(batch)
+        stats["comments"] += len(entries)
+        elapsed = time.monotonic() - started
+        print(f"Scanned {stats['files']} files ({stats['files'] / elapsed:.1f}/s), "
+              f"{stats['comments']} comments ({stats['comments'] / elapsed:.1f}/s); "
+              f"{stats['skipped']} already analyzed, {stats['filtered']} vendored/generated")
+
+    def paths():
+        for path in iter_source_files(root):
+            if path_skip_reason(path, skip_globs, attribute_globs):
+                stats["filtered"] += 1
+            else:
+                yield path
+
+    with usage_context(repo_internal_id, SCAN_PR_NUMBER, settings["double_iteration"]), \
+            ProcessPoolExecutor(max_workers=workers) as processes, \
+            ThreadPoolExecutor(max_workers=ai_concurrency, thread_name_prefix="scan-ai") as threads:
+        batch = []
+        for file in _prepare_files(processes, root, paths(), analyzed_blobs, workers * 4):
+            if file.get("skip") == "analyzed":
+                stats["skipped"] += 1
+                continue
+            if file.get("skip"):
+                stats["filtered"] += file["skip"] == "generated"
+                stats["failed"] += file["skip"] == "unreadable"
+                continue
+            file["comments"], file["carried"], file["vanished"] = reconcile_comments(
+                get_current_file_smells(repo_internal_id, SCAN_PR_NUMBER, file["filename"]),
+                file["filename"],
+                file["comments"]
+            )
+            stats["carried"] += len(file["carried"])
+            batch.append(file)
+            if len(batch) >= batch_size:
+                flush(batch, threads)
+                batch = []
+        if batch:
+            flush(batch, threads)
+
+    stats["elapsed"] = time.monotonic() - started
+    add_analysis_run(pr_id, repo_internal_id, commit_sha, settings["settings_version"],
+                     stats["files"] + stats["skipped"] + stats["filtered"], stats["skipped"], stats["filtered"])
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan the comments of a whole local checkout.")
+    parser.add_argument("root", help="path of the checkout")
+    parser.add_argument("--repo", required=True, help="owner/name of the installed repository")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="processes extracting comments")
+    parser.add_argument("--ai-concurrency", type=int, default=AI_CONCURRENCY, help="concurrent model requests")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="files saved per transaction")
+    args = parser.parse_args()
+
+    init_db()
+    stats = scan(args.root, args.repo, args.workers, args.ai_concurrency, args.batch_size)
+    elapsed = max(stats["elapsed"], 1e-9)
+    print(f"Scan done in {elapsed:.0f}s: {stats['files']} files ({stats['files'] / elapsed:.1f}/s), "
+          f"{stats['comments']} comments ({stats['comments'] / elapsed:.1f}/s), "
+          f"{stats['carried']} carried forward, {stats['skipped']} already analyzed, "
+          f"{stats['filtered']} vendored/generated, {stats['failed']} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Startup-time report for the web app.
+
+Usage:
+    python -m web_ui.startup_report [--top N] [--module web_ui.app] [--first-request /]
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter and
+prints the slowest imports by cumulative time, then (optionally) measures the
+latency of the first request served by the app.
+"""
+import argparse
+import re
+import subprocess
+import sys
+import time
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def collect_import_times(module):
+    """
+    Import `module` in a subprocess with -X importtime.
+    Returns a list of dicts with self_us, cumulative_us, depth and name.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    if result.returncode != 0:
+        print(result.stderr.splitlines()[-1] if result.stderr else "import failed")
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            entries.append({
+                "self_us": int(match.group(1)),
+                "cumulative_us": int(match.group(2)),
+                "depth": (len(match.group(3)) - 1) // 2,
+                "name": match.group(4),
+            })
+    return entries
+
+
+def print_import_report(entries, top):
+    roots = [e for e in entries if e["depth"] == 0]
+    total_us = sum(e["cumulative_us"] for e in roots)
+    print(f"Total import time: {total_us / 1000:.1f} ms ({len(entries)} modules)")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for e in sorted(entries, key=lambda e: e["cumulative_us"], reverse=True)[:top]:
+        print(f"{e['cumulative_us'] / 1000:>14.1f} {e['self_us'] / 1000:>9.1f}  {e['name']}")
+
+
+def measure_first_request(module, path):
+    """Import the app in-process and time the first and second GET of `path`."""
+    start = time.perf_counter()
+    app_module = __import__(module, fromlist=["app"])
+    boot_ms = (time.perf_counter() - start) * 1000
+    client = app_module.app.test_client()
+    timings = []
+    for _ in range(2):
+        start = time.perf_counter()
+        response = client.get(path)
+        timings.append(((time.perf_counter() - start) * 1000, response.status_code))
+    print(f"App import: {boot_ms:.1f} ms")
+    print(f"First request {path}: {timings[0][0]:.1f} ms (HTTP {timings[0][1]})")
+    print(f"Second request {path}: {timings[1][0]:.1f} ms (HTTP {timings[1][1]})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report web app startup costs.")
+    parser.add_argument("--module", default="web_ui.app")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--first-request", metavar="PATH", default=None)
+    args = parser.parse_args()
+
+    print_import_report(collect_import_times(args.module), args.top)
+    if args.first_request:
+        measure_first_request(args.module, args.first_request)
+
+
+if __name__ == "__main__":
+    main()
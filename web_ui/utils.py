@@ -1,7 +1,6 @@
 import time
 import jwt
 import requests
-from pyngrok import ngrok
 import config
 import base64
 import subprocess
@@ -13,6 +12,8 @@ from web_ui.github_utils import *
 
 def start_ngrok():
     """Start an ngrok tunnel with a reserved subdomain using pyngrok."""
+    # Development-only dependency: imported here so production workers never load it.
+    from pyngrok import ngrok
     ngrok.set_auth_token(config.NGROK_TOKEN)
     if not ngrok.get_tunnels():
         public_url = ngrok.connect(config.NGROK_PORT, "http", subdomain=config.NGROK_SUBDOMAIN).public_url